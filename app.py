@@ -1,55 +1,31 @@
-import streamlit as st
-from demos import (
-    central_limit_theorem,
-    law_of_large_numbers,
-    confidence_intervals,
-    hypothesis_testing,
-    correlation_regression,
-    anova,
-    probability_distributions,
-    bootstrap_sampling,
-    bayesian_inference,
-    sampling_methods,
-    time_series_analysis
-)
-
-st.sidebar.title("Statistics Demonstrations")
-
-# Sidebar menu for selecting the demonstration
-demo = st.sidebar.selectbox("Choose a demonstration", [
-    "Central Limit Theorem",
-    "Law of Large Numbers",
-    "Confidence Intervals",
-    "Hypothesis Testing",
-    "Correlation and Regression",
-    "ANOVA",
-    "Probability Distributions",
-    "Bootstrap Sampling",
-    "Bayesian Inference",
-    "Sampling Methods",
-    "Time Series Analysis"
-])
-
-# Display the selected demonstration
-if demo == "Central Limit Theorem":
-    central_limit_theorem.show()
-elif demo == "Law of Large Numbers":
-    law_of_large_numbers.show()
-elif demo == "Confidence Intervals":
-    confidence_intervals.show()
-elif demo == "Hypothesis Testing":
-    hypothesis_testing.show()
-elif demo == "Correlation and Regression":
-    correlation_regression.show()
-elif demo == "ANOVA":
-    anova.show()
-elif demo == "Probability Distributions":
-    probability_distributions.show()
-elif demo == "Bootstrap Sampling":
-    bootstrap_sampling.show()
-elif demo == "Bayesian Inference":
-    bayesian_inference.show()
-elif demo == "Sampling Methods":
-    sampling_methods.show()
-elif demo == "Time Series Analysis":
-    time_series_analysis.show()
+import streamlit as st
+from demos.loader import DEMOS, PREWARM_ENABLED, import_times, load_demo, prewarm
+from demos.profiling import profile_input, profiled_run, show_profile
+from demos.session import (backend_input, begin_run, finish_run, progressive_input, show_cache_stats,
+                           show_render_stats, show_stage_stats)
+
+st.sidebar.title("Statistics Demonstrations")
+
+# Sidebar menu for selecting the demonstration
+demo = st.sidebar.selectbox("Choose a demonstration", list(DEMOS))
+backend_input()
+profile_input()
+progressive_input()
+
+# Import only the selected demonstration, then optionally warm the others in the background
+module = load_demo(demo)
+if PREWARM_ENABLED:
+    prewarm()
+
+# Display the selected demonstration
+begin_run()
+with profiled_run(demo) as profile:
+    module.show()
+finish_run()
+show_render_stats()
+show_stage_stats()
+show_cache_stats()
+show_profile(profile)
+
+if DEMOS[demo] in import_times:
+    st.sidebar.caption(f"Demo import time: {import_times[DEMOS[demo]] * 1000:.0f} ms")
@@ -0,0 +1,50 @@
+import argparse
+import time
+
+import numpy as np
+
+from demos.bootstrap_engine import bootstrap_distribution
+
+
+# The per-resample loop that bootstrap_sampling.show used before the engine
+def loop_bootstrap(data, num_resamples):
+    bootstrap_means = []
+    for _ in range(num_resamples):
+        bootstrap_sample = np.random.choice(data, size=data.size, replace=True)
+        bootstrap_means.append(np.mean(bootstrap_sample))
+    return np.array(bootstrap_means)
+
+
+def best_of(fn, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the bootstrap engine with the per-resample loop.")
+    parser.add_argument("--sample-size", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--resamples", type=int, nargs="+", default=[1000, 5000, 100000])
+    parser.add_argument("--loop-limit", type=int, default=100000,
+                        help="skip the loop above this many resamples")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'n':>6} {'resamples':>10} {'loop (s)':>10} {'engine (s)':>11} {'speedup':>8}")
+    for n in args.sample_size:
+        data = rng.normal(size=n)
+        for num_resamples in args.resamples:
+            engine = best_of(lambda: bootstrap_distribution(data, "Mean", num_resamples, rng), args.repeats)
+            if num_resamples <= args.loop_limit:
+                loop = best_of(lambda: loop_bootstrap(data, num_resamples), args.repeats)
+                print(f"{n:>6} {num_resamples:>10} {loop:>10.4f} {engine:>11.4f} {loop / engine:>7.1f}x")
+            else:
+                print(f"{n:>6} {num_resamples:>10} {'-':>10} {engine:>11.4f} {'-':>8}")
+
+
+if __name__ == "__main__":
+    main()
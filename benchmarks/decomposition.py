@@ -0,0 +1,72 @@
+import argparse
+import time
+import warnings
+
+import numpy as np
+from statsmodels.tsa.seasonal import seasonal_decompose
+
+from demos.decomposition_engine import IncrementalDecomposition, decompose
+
+
+def best_of(fn, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def make_series(num_points, period, seed):
+    rng = np.random.default_rng(seed)
+    time_index = np.arange(num_points)
+    return (100 + 50 * time_index / num_points + 10 * np.sin(2 * np.pi * time_index / period)
+            + rng.normal(0, 1, num_points))
+
+
+# Largest absolute difference from the statsmodels components over the defined (non-NaN) points
+def max_error(components, reference):
+    return max(np.nanmax(np.abs(np.asarray(components[name], dtype=np.float64) - getattr(reference, name)))
+               for name in ('trend', 'seasonal', 'resid'))
+
+
+def streamed(values, period, model, append_points):
+    incremental = IncrementalDecomposition(period, model, values.dtype)
+    for offset in range(0, values.size, append_points):
+        incremental.append(values[offset:offset + append_points])
+    return incremental.components()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Accuracy and speed of the vectorised decomposition engine "
+                                                 "against statsmodels' seasonal_decompose.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7])
+    parser.add_argument("--period", type=int, default=12)
+    parser.add_argument("--model", choices=["additive", "multiplicative"], default="additive")
+    parser.add_argument("--append-points", type=int, default=10 ** 5)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'points':>10} {'variant':>22} {'time (ms)':>10} {'speedup':>8} {'max abs error':>14}")
+    for size in args.sizes:
+        values = make_series(size, args.period, args.seed)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            reference_time, reference = best_of(
+                lambda: seasonal_decompose(values, model=args.model, period=args.period), args.repeats)
+        print(f"{size:>10} {'statsmodels':>22} {reference_time * 1000:>10.1f} {1:>7.2f}x {0:>14.1e}")
+        variants = {
+            "cumsum float64": lambda: decompose(values, args.period, args.model, "cumsum"),
+            "fft float64": lambda: decompose(values, args.period, args.model, "fft"),
+            "cumsum float32": lambda: decompose(values.astype(np.float32), args.period, args.model, "cumsum"),
+            "incremental float64": lambda: streamed(values, args.period, args.model, args.append_points),
+        }
+        for name, variant in variants.items():
+            elapsed, components = best_of(variant, args.repeats)
+            print(f"{size:>10} {name:>22} {elapsed * 1000:>10.1f} {reference_time / elapsed:>7.2f}x "
+                  f"{max_error(components, reference):>14.1e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+import argparse
+import ast
+import contextlib
+import gc
+import importlib
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+import types
+
+# Keep the simulations in this process so tracemalloc sees every allocation
+os.environ.setdefault("STATS_APP_WORKERS", "1")
+
+# Widget profiles: sliders at their minimum, at their default, or at their maximum
+SIZES = ("small", "medium", "max")
+
+# Stages reported per run; statistics is the total minus the time inside the wrapped functions
+STAGES = ("sampling", "statistics", "plotting", "total")
+
+# Functions wrapped in each demo module to attribute time to a stage; everything else is statistics
+STAGE_FUNCTIONS = {
+    "sampling": ("cached_sample", "open_population"),
+    "plotting": ("show_figure", "show_histograms"),
+}
+
+# Below these differences a slowdown is treated as noise, whatever the ratio
+MIN_SECONDS_DELTA = 0.005
+MIN_BYTES_DELTA = 1024 ** 2
+
+
+# Stand-in for the streamlit module: every widget returns the value the active profile picks,
+# unless the label has an override; output calls do nothing
+class StubStreamlit(types.ModuleType):
+    def __init__(self):
+        super().__init__("streamlit")
+        self.size = "medium"
+        self.overrides = {}
+        self.session_state = {}
+        self.sidebar = self
+        self.runtime = types.SimpleNamespace(exists=lambda: False)
+
+    def _pick(self, label, low, default, high):
+        if label in self.overrides:
+            return self.overrides[label]
+        if self.size == "small" and low is not None:
+            return low
+        if self.size == "max" and high is not None:
+            return high
+        return default
+
+    def slider(self, label, min_value=None, max_value=None, value=None, *args, **kwargs):
+        value = min_value if value is None else value
+        if isinstance(value, tuple):
+            return self._pick(label, (min_value, min_value), value, (max_value, max_value))
+        return self._pick(label, min_value, value, max_value)
+
+    def select_slider(self, label, options=(), value=None, *args, **kwargs):
+        options = list(options)
+        return self._pick(label, options[0], options[0] if value is None else value, options[-1])
+
+    def selectbox(self, label, options, index=0, *args, **kwargs):
+        options = list(options)
+        return self._pick(label, None, options[index], None)
+
+    radio = selectbox
+
+    def multiselect(self, label, options, default=None, *args, **kwargs):
+        return self._pick(label, None, list(default or []), None)
+
+    def number_input(self, label, min_value=None, max_value=None, value=None, *args, **kwargs):
+        if value is None:
+            value = 0.0 if min_value is None else min_value
+        return self._pick(label, None, value, None)
+
+    def checkbox(self, label, value=False, *args, **kwargs):
+        return self._pick(label, None, value, None)
+
+    @contextlib.contextmanager
+    def spinner(self, *args, **kwargs):
+        yield
+
+    @contextlib.contextmanager
+    def expander(self, *args, **kwargs):
+        yield self
+
+    def __getattr__(self, name):
+        # title, header, write, caption, warning, image, pyplot, altair_chart, ...
+        return lambda *args, **kwargs: None
+
+
+# Seconds per stage for the run in progress; nested calls only count once, in the outer stage
+class StageClock:
+    def __init__(self):
+        self.seconds = {}
+        self.active = None
+
+    def reset(self):
+        self.seconds = {stage: 0.0 for stage in STAGE_FUNCTIONS}
+        self.active = None
+
+    def wrap(self, stage, function):
+        def timed(*args, **kwargs):
+            # cached_sample calls that fit a model are tagged stage_name="statistics" and stay in the remainder
+            if self.active is not None or kwargs.get("stage_name", stage) != stage:
+                return function(*args, **kwargs)
+            self.active = stage
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.seconds[stage] += time.perf_counter() - start
+                self.active = None
+        return timed
+
+
+# Stage kinds of a demo's StageGraph timed under each stage; statistic and decision stages stay in the remainder
+GRAPH_KINDS = {"sample": "sampling", "figure": "plotting"}
+
+
+def instrument(module, clock):
+    from demos.stages import StageGraph
+
+    for stage, names in STAGE_FUNCTIONS.items():
+        for name in names:
+            if hasattr(module, name):
+                setattr(module, name, clock.wrap(stage, getattr(module, name)))
+    for graph in vars(module).values():
+        if isinstance(graph, StageGraph):
+            for step in graph.stages.values():
+                if step.kind in GRAPH_KINDS:
+                    step.compute = clock.wrap(GRAPH_KINDS[step.kind], step.compute)
+
+
+def clear_caches():
+    from demos.cache import sample_cache
+    from demos.figures import figure_cache
+
+    sample_cache.clear()
+    figure_cache.clear()
+    gc.collect()
+
+
+# One cold run of `module.show()`: stage timings, or the tracemalloc peak when `trace_memory` is set
+def run_demo(module, stub, clock, size, trace_memory=False):
+    stub.size = size
+    stub.session_state.clear()
+    clear_caches()
+    clock.reset()
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        module.show()
+    finally:
+        total = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] if trace_memory else None
+        if trace_memory:
+            tracemalloc.stop()
+    stages = dict(clock.seconds)
+    stages["statistics"] = max(0.0, total - sum(stages.values()))
+    stages["total"] = total
+    return stages, peak
+
+
+def measure(demos, sizes, repeats, trace_memory, overrides):
+    stub = StubStreamlit()
+    stub.overrides = overrides
+    sys.modules["streamlit"] = stub
+    from demos.loader import DEMOS
+
+    clock = StageClock()
+    results = []
+    for name in demos:
+        module = importlib.import_module(DEMOS[name])
+        instrument(module, clock)
+        for size in sizes:
+            runs = [run_demo(module, stub, clock, size)[0] for _ in range(repeats)]
+            stages = {stage: min(run[stage] for run in runs) for stage in runs[0]}
+            peak = run_demo(module, stub, clock, size, trace_memory=True)[1] if trace_memory else None
+            results.append({"demo": name, "size": size, "seconds": stages, "peak_bytes": peak})
+            print(f"{name:>28} {size:>7} " + " ".join(f"{stages[stage] * 1000:>10.1f}" for stage in STAGES)
+                  + (f" {peak / 1024 ** 2:>9.1f}" if peak is not None else ""), flush=True)
+    return results
+
+
+# Entries of `current` slower or larger than `baseline` by more than `threshold` (a fraction)
+def regressions(baseline, current, threshold):
+    previous = {(entry["demo"], entry["size"]): entry for entry in baseline["results"]}
+    found = []
+    for entry in current["results"]:
+        old = previous.get((entry["demo"], entry["size"]))
+        if old is None:
+            continue
+        pairs = [(stage, old["seconds"][stage], entry["seconds"][stage], MIN_SECONDS_DELTA) for stage in STAGES]
+        if old["peak_bytes"] is not None and entry["peak_bytes"] is not None:
+            pairs.append(("peak_bytes", old["peak_bytes"], entry["peak_bytes"], MIN_BYTES_DELTA))
+        for metric, before, after, min_delta in pairs:
+            if after - before > min_delta and after > before * (1 + threshold):
+                found.append((entry["demo"], entry["size"], metric, before, after))
+    return found
+
+
+def environment():
+    import numpy
+    import scipy
+
+    return {
+        "python": platform.python_version(),
+        "numpy": numpy.__version__,
+        "scipy": scipy.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "workers": os.environ["STATS_APP_WORKERS"],
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def parse_override(text):
+    label, _, value = text.partition("=")
+    try:
+        return label, ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        return label, value
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time the sampling, statistics and plotting stages of every demo with a stubbed streamlit, "
+                    "record peak memory with tracemalloc, and compare against a previous run.")
+    parser.add_argument("--demos", nargs="+", help="demo labels (default: all)")
+    parser.add_argument("--sizes", nargs="+", choices=SIZES, default=list(SIZES))
+    parser.add_argument("--repeats", type=int, default=1, help="timed cold runs per demo and size (best is kept)")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc run")
+    parser.add_argument("--set", action="append", default=[], metavar="LABEL=VALUE",
+                        help="pin a widget by its label, e.g. --set 'Mode:=Power analysis'")
+    parser.add_argument("--output", default="demo_benchmarks.json")
+    parser.add_argument("--baseline", help="earlier JSON results to compare against")
+    parser.add_argument("--load", help="compare this JSON file instead of running the suite")
+    parser.add_argument("--threshold", type=float, default=0.2, help="relative slowdown flagged as a regression")
+    args = parser.parse_args()
+
+    if args.load:
+        with open(args.load) as handle:
+            current = json.load(handle)
+    else:
+        from demos.loader import DEMOS
+
+        demos = args.demos or list(DEMOS)
+        print(f"{'demo':>28} {'size':>7} " + " ".join(f"{stage + ' ms':>10}" for stage in STAGES)
+              + ("" if args.no_memory else f" {'peak MB':>9}"))
+        results = measure(demos, args.sizes, args.repeats, not args.no_memory,
+                          dict(parse_override(text) for text in args.set))
+        current = {"environment": environment(), "overrides": args.set, "results": results}
+        with open(args.output, "w") as handle:
+            json.dump(current, handle, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as handle:
+            baseline = json.load(handle)
+        found = regressions(baseline, current, args.threshold)
+        for demo, size, metric, before, after in found:
+            unit = (lambda value: f"{value / 1024 ** 2:.1f} MB") if metric == "peak_bytes" else \
+                (lambda value: f"{value * 1000:.1f} ms")
+            print(f"REGRESSION {demo} [{size}] {metric}: {unit(before)} -> {unit(after)} "
+                  f"({after / before - 1:+.0%})")
+        print(f"{len(found)} regression(s) above {args.threshold:.0%} against {args.baseline}")
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import argparse
+import os
+import time
+
+import numpy as np
+
+from demos.distributions import get_distribution
+from demos.executor import get_pool, simulate_bootstrap, simulate_sample_means
+
+
+def best_of(fn, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def fingerprint(result):
+    if isinstance(result, tuple):
+        return tuple(fingerprint(item) for item in result)
+    return result.moments.state(), result.histogram.fine_counts.tobytes()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scaling of the chunked Monte Carlo executor across worker counts.")
+    parser.add_argument("--workers", type=int, nargs="+",
+                        default=sorted({1, 2, 4, os.cpu_count() or 1}))
+    parser.add_argument("--sample-size", type=int, default=1000)
+    parser.add_argument("--num-samples", type=int, default=20000)
+    parser.add_argument("--bootstrap-n", type=int, default=1000)
+    parser.add_argument("--resamples", type=int, default=100000)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    dist = get_distribution("Exponential")
+    data = dist.rvs(np.random.default_rng(args.seed), args.bootstrap_n)
+    jobs = {
+        "clt": lambda workers: simulate_sample_means(dist, args.sample_size, args.num_samples, args.seed,
+                                                     workers=workers),
+        "bootstrap": lambda workers: simulate_bootstrap(data, "Median", args.resamples, args.seed, workers=workers),
+    }
+
+    print(f"{'job':>10} {'workers':>8} {'time (s)':>9} {'speedup':>8} {'identical':>10}")
+    for name, job in jobs.items():
+        baseline_time, baseline = best_of(lambda: job(1), args.repeats)
+        for workers in args.workers:
+            if workers > 1:
+                # Start the pool outside the timed runs
+                get_pool(workers)
+                job(workers)
+            elapsed, result = best_of(lambda: job(workers), args.repeats)
+            identical = fingerprint(result) == fingerprint(baseline)
+            print(f"{name:>10} {workers:>8} {elapsed:>9.3f} {baseline_time / elapsed:>7.2f}x {str(identical):>10}")
+
+
+if __name__ == "__main__":
+    main()
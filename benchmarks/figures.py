@@ -0,0 +1,46 @@
+import argparse
+import io
+import time
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+
+from demos.figures import DPI, MAX_WIDTH_PX, HistogramPanel, _altair_panel, _draw_panel
+
+
+def matplotlib_cost(panel):
+    start = time.process_time()
+    fig, ax = plt.subplots(figsize=(10, 6))
+    _draw_panel(panel, ax)
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", bbox_inches="tight", dpi=min(DPI, 0.95 * MAX_WIDTH_PX / fig.get_figwidth()))
+    plt.close(fig)
+    return time.process_time() - start, len(buffer.getvalue())
+
+
+def altair_cost(panel):
+    start = time.process_time()
+    payload = _altair_panel(panel).to_json()
+    return time.process_time() - start, len(payload)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Server CPU and payload size per histogram for each plot backend.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10 ** 3, 10 ** 5, 10 ** 7])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    # Keep one-off import costs out of the first measurement
+    altair_cost(HistogramPanel(rng.normal(size=10), "warm-up"))
+    print(f"{'points':>10} {'backend':>11} {'cpu (ms)':>9} {'payload (KB)':>13}")
+    for size in args.sizes:
+        panel = HistogramPanel(rng.exponential(size=size), "Exponential", kde=True)
+        for backend, measure in (("Matplotlib", matplotlib_cost), ("Altair", altair_cost)):
+            cpu, payload = measure(panel)
+            print(f"{size:>10} {backend:>11} {cpu * 1000:>9.1f} {payload / 1024:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
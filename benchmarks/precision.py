@@ -0,0 +1,69 @@
+import argparse
+import time
+import tracemalloc
+
+from demos.distributions import get_distribution
+from demos.executor import simulate_sample_means, simulate_sample_sums
+from demos.running_mean_engine import cumulative_means
+
+DISTRIBUTIONS = {
+    "Uniform": {'low': 0, 'high': 10},
+    "Exponential": {'rate': 1.0},
+    "Binomial": {'n': 10, 'p': 0.5},
+}
+
+
+def best_of(fn, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def peak_bytes(fn):
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time and peak memory of the compact precision mode against float64. "
+                    "Its accuracy bounds are checked by tests/test_precision.py.")
+    parser.add_argument("--sample-size", type=int, default=1000)
+    parser.add_argument("--num-samples", type=int, default=10000)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    total = args.sample_size * args.num_samples
+
+    jobs = {
+        "clt": lambda dist, precision: simulate_sample_means(dist, args.sample_size, args.num_samples, args.seed,
+                                                             workers=1, precision=precision),
+        "lln": lambda dist, precision: cumulative_means(
+            simulate_sample_sums(dist, args.sample_size, args.num_samples, args.seed, workers=1,
+                                 precision=precision), args.sample_size),
+    }
+    print(f"{total:,} draws per run")
+    print(f"{'job':>5} {'distribution':>12} {'precision':>9} {'time (s)':>9} {'speedup':>8} {'peak MB':>8}")
+    for name, job in jobs.items():
+        for dist_name, params in DISTRIBUTIONS.items():
+            dist = get_distribution(dist_name, **params)
+            baseline = None
+            for precision in ("float64", "compact"):
+                # The first run fills the scratch buffer pool, as the first rerun of a session would
+                job(dist, precision)
+                elapsed, _ = best_of(lambda: job(dist, precision), args.repeats)
+                peak = peak_bytes(lambda: job(dist, precision))
+                baseline = elapsed if baseline is None else baseline
+                print(f"{name:>5} {dist_name:>12} {precision:>9} {elapsed:>9.3f} {baseline / elapsed:>7.2f}x "
+                      f"{peak / 1024 ** 2:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
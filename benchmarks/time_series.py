@@ -0,0 +1,50 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from demos.time_series_analysis import INTERVAL_REPETITIONS, MAX_FORECAST_PERIODS, fit_model
+
+
+def best_of(fn, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def make_series(num_periods, period, seed):
+    rng = np.random.default_rng(seed)
+    time_index = np.arange(num_periods)
+    data = 0.1 * time_index + 10 * np.sin(2 * np.pi * time_index / period) + rng.normal(0, 1, num_periods)
+    return pd.Series(data, index=pd.date_range(start='1/1/2000', periods=num_periods, freq='ME'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency of a Holt-Winters fit versus a forecast from the cached fit.")
+    parser.add_argument("--periods", type=int, default=500)
+    parser.add_argument("--season", type=int, default=12)
+    parser.add_argument("--horizons", type=int, nargs="+", default=[10, 24, MAX_FORECAST_PERIODS])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    series = make_series(args.periods, args.season, args.seed)
+    elapsed, model = best_of(lambda: fit_model(series, "add", args.season, np.random.default_rng(args.seed)),
+                             args.repeats)
+    fit = model['fit']
+    print(f"{args.periods} periods, season {args.season}, {INTERVAL_REPETITIONS} interval paths")
+    print(f"{'stage':>28} {'time (ms)':>10}")
+    print(f"{'fit + interval (uncached)':>28} {elapsed * 1000:>10.1f}")
+    print(f"{'  of which fit':>28} {model['fit_seconds'] * 1000:>10.1f}")
+    print(f"{'  of which interval':>28} {model['interval_seconds'] * 1000:>10.1f}")
+    for horizon in args.horizons:
+        elapsed, _ = best_of(lambda: fit.forecast(horizon), args.repeats)
+        print(f"{f'forecast({horizon}) from cache':>28} {elapsed * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
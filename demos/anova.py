@@ -1,56 +1,220 @@
-import streamlit as st
-import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-from scipy.stats import f_oneway
-
-def show():
-    st.title("ANOVA (Analysis of Variance) Demonstration")
-    st.sidebar.title("Settings")
-
-    # User inputs from the sidebar
-    num_groups = st.sidebar.slider("Number of groups:", min_value=2, max_value=10, value=3)
-    sample_size = st.sidebar.slider("Sample size per group (n):", min_value=5, max_value=100, value=30)
-    dist_type = st.sidebar.selectbox("Choose the distribution for sample data:", ("Normal", "Uniform"))
-
-    # Parameters for the original distribution
-    if dist_type == "Normal":
-        mean_values = [st.sidebar.number_input(f"Group {i+1} - mean:", value=0.0) for i in range(num_groups)]
-        std_dev_values = [st.sidebar.number_input(f"Group {i+1} - standard deviation:", value=1.0) for i in range(num_groups)]
-    elif dist_type == "Uniform":
-        low_values = [st.sidebar.number_input(f"Group {i+1} - lower bound:", value=0.0) for i in range(num_groups)]
-        high_values = [st.sidebar.number_input(f"Group {i+1} - upper bound:", value=1.0) for i in range(num_groups)]
-
-    # Function to generate the original distribution
-    def generate_distribution(dist_type, size, params):
-        if dist_type == "Normal":
-            return np.random.normal(params['mean'], params['std_dev'], size)
-        elif dist_type == "Uniform":
-            return np.random.uniform(params['low'], params['high'], size)
-
-    # Generate sample data for each group
-    data = []
-    for i in range(num_groups):
-        if dist_type == "Normal":
-            params = {'mean': mean_values[i], 'std_dev': std_dev_values[i]}
-        elif dist_type == "Uniform":
-            params = {'low': low_values[i], 'high': high_values[i]}
-        group_data = generate_distribution(dist_type, sample_size, params)
-        data.append(group_data)
-
-    # Perform ANOVA test
-    f_stat, p_value = f_oneway(*data)
-
-    # Plotting
-    fig, ax = plt.subplots(figsize=(10, 6))
-    for i, group_data in enumerate(data):
-        sns.histplot(group_data, bins=15, kde=True, label=f'Group {i+1}', ax=ax, stat="density", alpha=0.6)
-    ax.set_title("ANOVA Test: Distribution of Groups")
-    ax.legend()
-
-    st.pyplot(fig)
-
-    # Display results
-    st.write(f"ANOVA F-statistic: {f_stat:.4f}")
-    st.write(f"P-value: {p_value:.4f}")
-    st.write(f"Decision: {'Reject' if p_value < 0.05 else 'Fail to Reject'} the null hypothesis at alpha = 0.05")
+import streamlit as st
+import numpy as np
+import matplotlib.pyplot as plt
+from scipy.stats import f
+from demos.anova_engine import f_statistic, group_quantiles, pack_groups, simulate_null_f
+from demos.cache import seed_input
+from demos.distributions import get_distribution
+from demos.figures import render_png, show_stage_figure
+from demos.rendering import histplot
+from demos.stages import Stage, StageGraph
+
+# Above this many groups the per-group KDEs are replaced by quantile summaries
+MAX_KDE_GROUPS = 10
+# Above this many groups the box plots are replaced by a quantile band
+MAX_BOX_GROUPS = 50
+# Cap on draws for the simulated null distribution (replicates x total observations)
+MAX_NULL_DRAWS = 20_000_000
+
+def show():
+    st.title("ANOVA (Analysis of Variance) Demonstration")
+    st.sidebar.title("Settings")
+
+    # User inputs from the sidebar
+    mode = st.sidebar.selectbox("Mode:", ("Custom groups", "Simulated design"))
+    if mode == "Custom groups":
+        num_groups = st.sidebar.slider("Number of groups:", min_value=2, max_value=10, value=3)
+        sample_size = st.sidebar.slider("Sample size per group (n):", min_value=5, max_value=100, value=30)
+    elif mode == "Simulated design":
+        num_groups = st.sidebar.slider("Number of groups:", min_value=2, max_value=5000, value=200)
+        min_size, max_size = st.sidebar.slider("Group size range (n):", min_value=2, max_value=1000, value=(10, 50))
+    dist_type = st.sidebar.selectbox("Choose the distribution for sample data:", ("Normal", "Uniform"))
+
+    # Parameters for the original distribution
+    if mode == "Custom groups":
+        if dist_type == "Normal":
+            mean_values = [st.sidebar.number_input(f"Group {i+1} - mean:", value=0.0) for i in range(num_groups)]
+            std_dev_values = [st.sidebar.number_input(f"Group {i+1} - standard deviation:", value=1.0) for i in range(num_groups)]
+        elif dist_type == "Uniform":
+            low_values = [st.sidebar.number_input(f"Group {i+1} - lower bound:", value=0.0) for i in range(num_groups)]
+            high_values = [st.sidebar.number_input(f"Group {i+1} - upper bound:", value=1.0) for i in range(num_groups)]
+    elif mode == "Simulated design":
+        spread = st.sidebar.number_input("Standard deviation of the true group means:", min_value=0.0, value=0.0)
+        std_dev = st.sidebar.number_input("Within-group standard deviation:", min_value=0.01, value=1.0)
+    num_replicates = st.sidebar.select_slider("Null F replicates:", options=[0, 1000, 10000, 100000], value=1000)
+    seed = seed_input()
+
+    if mode == "Custom groups":
+        # Distribution of each group from the shared registry
+        group_dists = []
+        for i in range(num_groups):
+            if dist_type == "Normal":
+                group_dists.append(get_distribution(dist_type, mean=mean_values[i], std_dev=std_dev_values[i]))
+            elif dist_type == "Uniform":
+                group_dists.append(get_distribution(dist_type, low=low_values[i], high=high_values[i]))
+        run = GROUP_STAGES.run(group_inputs(group_dists, sample_size, num_replicates, seed))
+    elif mode == "Simulated design":
+        # Zero-mean noise with the requested standard deviation
+        if dist_type == "Normal":
+            noise = get_distribution(dist_type, mean=0.0, std_dev=std_dev)
+        elif dist_type == "Uniform":
+            half_width = std_dev * np.sqrt(3)
+            noise = get_distribution(dist_type, low=-half_width, high=half_width)
+        run = DESIGN_STAGES.run(design_inputs(noise, num_groups, min_size, max_size, spread, num_replicates, seed))
+    result = anova_result(run)
+
+    offsets, f_null = result['offsets'], result['f_null']
+    f_stat, p_value = result['f_stat'], result['p_value']
+    if f_null is not None and f_null.size < num_replicates:
+        st.caption(f"Null simulation limited to {f_null.size:,} replicates for {offsets[-1]:,} observations.")
+
+    # Plotting
+    show_stage_figure("anova", run)
+
+    # Display results
+    st.write(f"Groups: {offsets.size - 1:,}, total observations: {offsets[-1]:,}")
+    st.write(f"ANOVA F-statistic: {f_stat:.4f}")
+    st.write(f"P-value: {p_value:.4f}")
+    st.write(f"Decision: {'Reject' if result['reject'] else 'Fail to Reject'} the null hypothesis at alpha = 0.05")
+    if f_null is not None:
+        st.write(f"Simulated p-value: {result['simulated_p_value']:.4f} "
+                 f"({f_null.size:,} replicates); simulated rejection rate at alpha = 0.05: "
+                 f"{result['simulated_rejection_rate']:.4f}")
+
+
+# Draws from each of `group_dists`, stored flat with group offsets
+def draw_groups(group_dists, sample_size, rng):
+    return pack_groups([dist.rvs(rng, sample_size) for dist in group_dists])
+
+
+def draw_design(noise, num_groups, min_size, max_size, spread, rng):
+    return simulate_design(noise, num_groups, min_size, max_size, spread, rng)
+
+
+def anova_statistic(sample):
+    f_stat, p_value, df_between, df_within = f_statistic(*sample)
+    return {'f_stat': f_stat, 'p_value': p_value, 'df_between': df_between, 'df_within': df_within}
+
+
+# Simulated null F distribution for the same group sizes when `num_replicates` is set; F is
+# location/scale invariant, so a standard member of the family suffices
+def null_distribution(family, num_replicates, sample, rng):
+    if not num_replicates:
+        return None
+    offsets = sample[1]
+    replicates = min(num_replicates, max(1, MAX_NULL_DRAWS // int(offsets[-1])))
+    return simulate_null_f(get_distribution(family), offsets, replicates, rng)
+
+
+def decide(statistic, null):
+    decision = {'reject': bool(statistic['p_value'] < 0.05)}
+    if null is not None:
+        critical = f.ppf(0.95, statistic['df_between'], statistic['df_within'])
+        decision.update(simulated_p_value=np.mean(null >= statistic['f_stat']),
+                        simulated_rejection_rate=np.mean(null > critical))
+    return decision
+
+
+def plot_anova(sample, statistic, null):
+    values, offsets = sample
+    f_stat, df_between, df_within = statistic['f_stat'], statistic['df_between'], statistic['df_within']
+    fig, axes = plt.subplots(1, 2 if null is not None else 1, figsize=(14 if null is not None else 10, 6),
+                             squeeze=False)
+    plot_groups(axes[0, 0], values, offsets)
+    if null is not None:
+        ax = axes[0, 1]
+        upper = np.quantile(null, 0.999)
+        ax.hist(null, bins=60, range=(0, upper), density=True, alpha=0.6, color='g', edgecolor='black',
+                label='Simulated null F')
+        grid = np.linspace(0, upper, 400)
+        ax.plot(grid, f.pdf(grid, df_between, df_within), 'r-', label=f'F({df_between}, {df_within})')
+        ax.axvline(f_stat, color='b', linestyle='--', label=f'Observed F: {f_stat:.2f}')
+        ax.set_xlim(0, max(upper, f_stat * 1.05))
+        ax.set_title("Null Distribution of the F-statistic")
+        ax.legend()
+    return render_png(fig)
+
+
+def anova_stages(demo, sample):
+    return StageGraph(demo, [
+        sample,
+        Stage("statistic", anova_statistic, after=("sample",)),
+        Stage("null", null_distribution, kind="sample", reads=("family", "num_replicates"), after=("sample",),
+              stream="anova.null"),
+        Stage("decision", decide, after=("statistic", "null")),
+        Stage("figure", plot_anova, after=("sample", "statistic", "null")),
+    ])
+
+
+# Groups -> F test and simulated null F -> decision -> figure, for either way of drawing the groups
+GROUP_STAGES = anova_stages("anova", Stage("sample", draw_groups, reads=("group_dists", "sample_size"),
+                                           stream="anova"))
+DESIGN_STAGES = anova_stages("anova.design", Stage(
+    "sample", draw_design, reads=("noise", "num_groups", "min_size", "max_size", "spread"), stream="anova.design"))
+
+
+def group_inputs(group_dists, sample_size, num_replicates, seed):
+    return {'group_dists': group_dists, 'sample_size': sample_size, 'family': group_dists[0].name,
+            'num_replicates': num_replicates, 'seed': seed}
+
+
+def design_inputs(noise, num_groups, min_size, max_size, spread, num_replicates, seed):
+    return {'noise': noise, 'num_groups': num_groups, 'min_size': min_size, 'max_size': max_size, 'spread': spread,
+            'family': noise.name, 'num_replicates': num_replicates, 'seed': seed}
+
+
+def anova_result(run):
+    values, offsets = run['sample']
+    return dict(run['statistic'], values=values, offsets=offsets, f_null=run['null'], **run['decision'])
+
+
+# One-way ANOVA on `sample_size` draws from each of `group_dists`
+def compute(group_dists, sample_size, num_replicates, seed):
+    return anova_result(GROUP_STAGES.run(group_inputs(group_dists, sample_size, num_replicates, seed),
+                                         targets=("decision",)))
+
+
+# One-way ANOVA on a simulated design of many unequal groups around scattered true means
+def compute_design(noise, num_groups, min_size, max_size, spread, num_replicates, seed):
+    inputs = design_inputs(noise, num_groups, min_size, max_size, spread, num_replicates, seed)
+    return anova_result(DESIGN_STAGES.run(inputs, targets=("decision",)))
+
+
+# Unequal group sizes and normally scattered true means around zero, plus noise
+def simulate_design(noise, num_groups, min_size, max_size, spread, rng):
+    sizes = rng.integers(min_size, max_size + 1, size=num_groups)
+    offsets = np.concatenate([[0], np.cumsum(sizes)])
+    group_means = rng.normal(0.0, spread, size=num_groups)
+    values = noise.rvs(rng, offsets[-1]) + np.repeat(group_means, sizes)
+    return values, offsets
+
+
+# Per-group KDEs for a few groups, box plots or a quantile band sorted by median for many
+def plot_groups(ax, values, offsets):
+    num_groups = offsets.size - 1
+    if num_groups <= MAX_KDE_GROUPS:
+        for i in range(num_groups):
+            histplot(values[offsets[i]:offsets[i + 1]], ax, bins=15, kde=True, stat="density", color=f'C{i}',
+                     alpha=0.6, label=f'Group {i+1}')
+        ax.set_title("ANOVA Test: Distribution of Groups")
+        ax.legend()
+        return
+
+    quantiles = group_quantiles(values, offsets)
+    if num_groups <= MAX_BOX_GROUPS:
+        stats = [{'label': str(i + 1), 'whislo': low, 'q1': q1, 'med': median, 'q3': q3, 'whishi': high}
+                 for i, (low, q1, median, q3, high) in enumerate(quantiles)]
+        ax.bxp(stats, showfliers=False)
+        ax.set_xlabel("Group")
+        ax.set_title("ANOVA Test: Group Quantiles (min-max whiskers)")
+        return
+
+    order = np.argsort(quantiles[:, 2])
+    ranks = np.arange(1, num_groups + 1)
+    low, q1, median, q3, high = quantiles[order].T
+    ax.fill_between(ranks, low, high, color='C0', alpha=0.2, label='Min-max')
+    ax.fill_between(ranks, q1, q3, color='C0', alpha=0.5, label='Interquartile range')
+    ax.plot(ranks, median, color='C1', label='Median')
+    ax.set_xlabel("Group (sorted by median)")
+    ax.set_title(f"ANOVA Test: Quantiles of {num_groups:,} Groups")
+    ax.legend()
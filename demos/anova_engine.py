@@ -0,0 +1,67 @@
+import numpy as np
+from scipy.stats import f
+
+# Working-set size for one block of null replicates
+DEFAULT_MEMORY_BUDGET = 64 * 1024 ** 2
+
+
+# Flat storage for groups of unequal size: values[offsets[i]:offsets[i + 1]] is group i
+def pack_groups(groups):
+    sizes = np.array([len(group) for group in groups])
+    offsets = np.concatenate([[0], np.cumsum(sizes)])
+    return np.concatenate(groups).astype(np.float64), offsets
+
+
+def group_sizes(offsets):
+    return np.diff(offsets)
+
+
+# One-way ANOVA sums of squares with grouped reductions along the last axis.
+# `values` may be 1-D (one design) or 2-D (replicates x observations) sharing the same offsets.
+def sums_of_squares(values, offsets):
+    starts = offsets[:-1]
+    sizes = np.diff(offsets)
+    total = offsets[-1]
+    group_sums = np.add.reduceat(values, starts, axis=-1)
+    group_means = group_sums / sizes
+    grand_mean = group_sums.sum(axis=-1, keepdims=True) / total
+
+    ss_between = np.sum(sizes * (group_means - grand_mean) ** 2, axis=-1)
+    # Centre on the group means before squaring to avoid cancellation
+    deviations = values - np.repeat(group_means, sizes, axis=-1)
+    ss_within = np.add.reduceat(deviations ** 2, starts, axis=-1).sum(axis=-1)
+    return ss_between, ss_within
+
+
+def f_statistic(values, offsets):
+    num_groups = offsets.size - 1
+    total = offsets[-1]
+    ss_between, ss_within = sums_of_squares(values, offsets)
+    df_between, df_within = num_groups - 1, total - num_groups
+    f_stat = (ss_between / df_between) / (ss_within / df_within)
+    return f_stat, f.sf(f_stat, df_between, df_within), df_between, df_within
+
+
+# Null F distribution for the same group sizes, every group drawn from `dist`
+def simulate_null_f(dist, offsets, num_replicates, rng, memory_budget=DEFAULT_MEMORY_BUDGET):
+    total = offsets[-1]
+    f_stats = np.empty(num_replicates)
+    # Draws, deviations and their squares are alive at the same time
+    rows = max(1, int(memory_budget // (3 * total * np.dtype(np.float64).itemsize)))
+    for start in range(0, num_replicates, rows):
+        stop = min(start + rows, num_replicates)
+        f_stats[start:stop] = f_statistic(dist.rvs(rng, (stop - start, total)), offsets)[0]
+    return f_stats
+
+
+# Per-group quantiles from one global sort, interpolated linearly like np.quantile
+def group_quantiles(values, offsets, quantiles=(0.0, 0.25, 0.5, 0.75, 1.0)):
+    sizes = np.diff(offsets)
+    labels = np.repeat(np.arange(sizes.size), sizes)
+    ordered = values[np.lexsort((values, labels))]
+
+    positions = offsets[:-1, None] + np.asarray(quantiles)[None, :] * (sizes[:, None] - 1)
+    lower = np.floor(positions).astype(np.intp)
+    upper = np.minimum(lower + 1, offsets[1:, None] - 1)
+    weight = positions - lower
+    return ordered[lower] * (1 - weight) + ordered[upper] * weight
@@ -1,55 +1,248 @@
-import streamlit as st
-import numpy as np
-import matplotlib.pyplot as plt
-from scipy.stats import norm
-
-def show():
-    st.title("Bayesian Inference Demonstration")
-    st.sidebar.title("Settings")
-
-    # User inputs from the sidebar
-    prior_mean = st.sidebar.number_input("Prior mean (μ₀):", value=0.0)
-    prior_std_dev = st.sidebar.number_input("Prior standard deviation (σ₀):", value=1.0)
-    likelihood_mean = st.sidebar.number_input("Likelihood mean (μₗ):", value=0.0)
-    likelihood_std_dev = st.sidebar.number_input("Likelihood standard deviation (σₗ):", value=1.0)
-    num_samples = st.sidebar.slider("Number of samples:", min_value=10, max_value=1000, value=100)
-
-    # Generate sample data from likelihood
-    sample_data = np.random.normal(likelihood_mean, likelihood_std_dev, num_samples)
-    sample_mean = np.mean(sample_data)
-    sample_var = np.var(sample_data)
-    sample_std_dev = np.std(sample_data)
-
-    # Compute posterior parameters
-    prior_var = prior_std_dev ** 2
-    likelihood_var = likelihood_std_dev ** 2
-    posterior_mean = (prior_var * sample_mean + num_samples * likelihood_var * prior_mean) / (num_samples * likelihood_var + prior_var)
-    posterior_std_dev = np.sqrt((prior_var * likelihood_var) / (num_samples * likelihood_var + prior_var))
-
-    # Plotting
-    x = np.linspace(
-        min(prior_mean - 3 * prior_std_dev, sample_mean - 3 * sample_std_dev),
-        max(prior_mean + 3 * prior_std_dev, sample_mean + 3 * sample_std_dev),
-        1000
-    )
-    prior_pdf = norm.pdf(x, prior_mean, prior_std_dev)
-    likelihood_pdf = norm.pdf(x, sample_mean, sample_std_dev / np.sqrt(num_samples))
-    posterior_pdf = norm.pdf(x, posterior_mean, posterior_std_dev)
-
-    fig, ax = plt.subplots(figsize=(10, 6))
-    ax.plot(x, prior_pdf, 'b-', label=f'Prior: μ₀={prior_mean}, σ₀={prior_std_dev}')
-    ax.plot(x, likelihood_pdf, 'g--', label=f'Likelihood: μₗ={sample_mean:.2f}, σₗ={sample_std_dev/np.sqrt(num_samples):.2f}')
-    ax.plot(x, posterior_pdf, 'r-', label=f'Posterior: μ={posterior_mean:.2f}, σ={posterior_std_dev:.2f}')
-    ax.fill_between(x, 0, prior_pdf, color='b', alpha=0.1)
-    ax.fill_between(x, 0, likelihood_pdf, color='g', alpha=0.1)
-    ax.fill_between(x, 0, posterior_pdf, color='r', alpha=0.1)
-    ax.set_title("Bayesian Inference")
-    ax.legend()
-
-    st.pyplot(fig)
-
-    # Display results
-    st.write(f"Sample Mean: {sample_mean:.2f}")
-    st.write(f"Sample Standard Deviation: {sample_std_dev:.2f}")
-    st.write(f"Posterior Mean: {posterior_mean:.2f}")
-    st.write(f"Posterior Standard Deviation: {posterior_std_dev:.2f}")
+import streamlit as st
+import numpy as np
+import matplotlib.pyplot as plt
+from demos.cache import cached_sample, sample_cache, sample_key, seed_input
+from demos.distributions import get_distribution
+from demos.figures import render_png, show_figure, show_stage_figure
+from demos.mcmc_engine import NormalMeanPosterior, sample_chains, update_chains
+from demos.moments import Moments
+from demos.rendering import histplot
+from demos.stages import Stage, StageGraph
+
+# Steps of the short update that carries the chains past each batch before the one shown
+CARRY_WARMUP = 20
+CARRY_DRAWS = 10
+
+
+def show():
+    st.title("Bayesian Inference Demonstration")
+    st.sidebar.title("Settings")
+
+    # User inputs from the sidebar
+    mode = st.sidebar.selectbox("Mode:", ("Conjugate update", "MCMC", "Sequential MCMC"))
+    prior_family = "Normal"
+    if mode != "Conjugate update":
+        prior_family = st.sidebar.selectbox("Prior family:", ("Normal", "Laplace", "Student-t", "Normal Mixture"))
+    prior_mean = st.sidebar.number_input("Prior mean (μ₀):", value=0.0)
+    prior_std_dev = st.sidebar.number_input("Prior standard deviation (σ₀):", value=1.0)
+    prior_df = 3.0
+    separation, weight = 2.0, 0.5
+    if prior_family == "Student-t":
+        prior_df = st.sidebar.number_input("Prior degrees of freedom (ν):", min_value=0.5, value=3.0)
+    elif prior_family == "Normal Mixture":
+        separation = st.sidebar.number_input("Distance between the mixture components:", min_value=0.0, value=2.0)
+        weight = st.sidebar.slider("Weight of the lower component:", min_value=0.05, max_value=0.95, value=0.5)
+    likelihood_mean = st.sidebar.number_input("Likelihood mean (μₗ):", value=0.0)
+    likelihood_std_dev = st.sidebar.number_input("Likelihood standard deviation (σₗ):", value=1.0)
+    num_samples = st.sidebar.slider("Number of samples:", min_value=10, max_value=1000, value=100)
+    if mode != "Conjugate update":
+        num_chains = st.sidebar.select_slider("Number of chains:", options=[16, 64, 256, 1024], value=256)
+        num_draws = st.sidebar.select_slider("Draws per chain:", options=[500, 1000, 2000, 5000], value=1000)
+    if mode == "Sequential MCMC":
+        batch_size = st.sidebar.slider("Batch size:", min_value=1, max_value=100, value=10)
+        num_batches = st.sidebar.slider("Batches observed:", min_value=1, max_value=-(-num_samples // batch_size),
+                                        value=1)
+    seed = seed_input()
+
+    if mode != "Conjugate update":
+        prior = make_prior(prior_family, prior_mean, prior_std_dev, prior_df, separation, weight)
+        if mode == "MCMC":
+            result = compute_mcmc(prior, likelihood_mean, likelihood_std_dev, num_samples, num_chains, num_draws, seed)
+        elif mode == "Sequential MCMC":
+            result = compute_sequential(prior, likelihood_mean, likelihood_std_dev, num_samples, batch_size,
+                                        num_batches, num_chains, num_draws, seed)
+        conjugate_posterior = None
+        if prior_family == "Normal":
+            conjugate_posterior = conjugate_update(prior_mean, prior_std_dev, likelihood_std_dev,
+                                                   result['data_moments'])
+        show_mcmc(result, prior, prior_family, likelihood_std_dev, conjugate_posterior)
+        return
+
+    run = CONJUGATE_STAGES.run(conjugate_inputs(prior_mean, prior_std_dev, likelihood_mean, likelihood_std_dev,
+                                                num_samples, seed))
+    result = conjugate_result(run)
+    sample_mean, sample_std_dev = result['sample_mean'], result['sample_std_dev']
+    posterior_mean, posterior_std_dev = result['posterior_mean'], result['posterior_std_dev']
+
+    # Plotting
+    show_stage_figure("bayesian_inference", run)
+
+    # Display results
+    st.write(f"Sample Mean: {sample_mean:.2f}")
+    st.write(f"Sample Standard Deviation: {sample_std_dev:.2f}")
+    st.write(f"Posterior Mean: {posterior_mean:.2f}")
+    st.write(f"Posterior Standard Deviation: {posterior_std_dev:.2f}")
+
+
+# Data drawn from the likelihood, shared by every mode so they condition on the same observations
+def sample_likelihood(likelihood_mean, likelihood_std_dev, num_samples, seed):
+    likelihood = get_distribution("Normal", mean=likelihood_mean, std_dev=likelihood_std_dev)
+    sample_data = cached_sample("bayesian_inference", (likelihood.key, num_samples), seed,
+                                lambda rng: likelihood.rvs(rng, num_samples))
+    return sample_data, (likelihood.key, num_samples)
+
+
+def draw_likelihood(likelihood_mean, likelihood_std_dev, num_samples, rng):
+    return get_distribution("Normal", mean=likelihood_mean, std_dev=likelihood_std_dev).rvs(rng, num_samples)
+
+
+# Normal prior, Normal likelihood with known standard deviation: closed-form posterior of the mean
+def posterior_update(prior_mean, prior_std_dev, likelihood_std_dev, sample):
+    moments = Moments.from_array(sample)
+    posterior = conjugate_update(prior_mean, prior_std_dev, likelihood_std_dev, moments)
+    return {'sample_mean': moments.mean, 'sample_std_dev': moments.std(), 'posterior_mean': posterior.mean,
+            'posterior_std_dev': posterior.std}
+
+
+def plot_update(prior_mean, prior_std_dev, num_samples, statistic):
+    sample_mean, sample_std_dev = statistic['sample_mean'], statistic['sample_std_dev']
+    posterior_mean, posterior_std_dev = statistic['posterior_mean'], statistic['posterior_std_dev']
+    x = np.linspace(
+        min(prior_mean - 3 * prior_std_dev, sample_mean - 3 * sample_std_dev),
+        max(prior_mean + 3 * prior_std_dev, sample_mean + 3 * sample_std_dev),
+        1000
+    )
+    prior_pdf = get_distribution("Normal", mean=prior_mean, std_dev=prior_std_dev).pdf(x)
+    likelihood_pdf = get_distribution("Normal", mean=sample_mean, std_dev=sample_std_dev / np.sqrt(num_samples)).pdf(x)
+    posterior_pdf = get_distribution("Normal", mean=posterior_mean, std_dev=posterior_std_dev).pdf(x)
+
+    fig, ax = plt.subplots(figsize=(10, 6))
+    ax.plot(x, prior_pdf, 'b-', label=f'Prior: μ₀={prior_mean}, σ₀={prior_std_dev}')
+    ax.plot(x, likelihood_pdf, 'g--', label=f'Likelihood: μₗ={sample_mean:.2f}, σₗ={sample_std_dev/np.sqrt(num_samples):.2f}')
+    ax.plot(x, posterior_pdf, 'r-', label=f'Posterior: μ={posterior_mean:.2f}, σ={posterior_std_dev:.2f}')
+    ax.fill_between(x, 0, prior_pdf, color='b', alpha=0.1)
+    ax.fill_between(x, 0, likelihood_pdf, color='g', alpha=0.1)
+    ax.fill_between(x, 0, posterior_pdf, color='r', alpha=0.1)
+    ax.set_title("Bayesian Inference")
+    ax.legend()
+    return render_png(fig)
+
+
+# Data -> conjugate posterior -> figure; the prior only reaches the posterior and the figure, so
+# moving it keeps the observations. The stream matches sample_likelihood, so the MCMC modes
+# condition on the same data.
+CONJUGATE_STAGES = StageGraph("bayesian_inference", [
+    Stage("sample", draw_likelihood, reads=("likelihood_mean", "likelihood_std_dev", "num_samples"),
+          stream="bayesian_inference"),
+    Stage("statistic", posterior_update, reads=("prior_mean", "prior_std_dev", "likelihood_std_dev"),
+          after=("sample",)),
+    Stage("figure", plot_update, reads=("prior_mean", "prior_std_dev", "num_samples"), after=("statistic",)),
+])
+
+
+def conjugate_inputs(prior_mean, prior_std_dev, likelihood_mean, likelihood_std_dev, num_samples, seed):
+    return {'prior_mean': prior_mean, 'prior_std_dev': prior_std_dev, 'likelihood_mean': likelihood_mean,
+            'likelihood_std_dev': likelihood_std_dev, 'num_samples': num_samples, 'seed': seed}
+
+
+def conjugate_result(run):
+    return dict(run['statistic'], sample_data=run['sample'])
+
+
+def compute(prior_mean, prior_std_dev, likelihood_mean, likelihood_std_dev, num_samples, seed):
+    inputs = conjugate_inputs(prior_mean, prior_std_dev, likelihood_mean, likelihood_std_dev, num_samples, seed)
+    return conjugate_result(CONJUGATE_STAGES.run(inputs, targets=("statistic",)))
+
+
+# Posterior of the likelihood mean under any registry prior, from vectorised Metropolis chains
+def compute_mcmc(prior, likelihood_mean, likelihood_std_dev, num_samples, num_chains, num_draws, seed):
+    sample_data, data_key = sample_likelihood(likelihood_mean, likelihood_std_dev, num_samples, seed)
+    moments = Moments.from_array(sample_data)
+    posterior = NormalMeanPosterior(prior, likelihood_std_dev, moments)
+    return cached_sample("bayesian_inference.mcmc", (data_key, prior.key, num_chains, num_draws), seed,
+                         lambda rng: dict(sample_chains(posterior, num_chains, num_draws, rng), data_moments=moments))
+
+
+# Posterior after the first `num_batches` batches of the data, updated one batch at a time
+def compute_sequential(prior, likelihood_mean, likelihood_std_dev, num_samples, batch_size, num_batches, num_chains,
+                       num_draws, seed):
+    sample_data, data_key = sample_likelihood(likelihood_mean, likelihood_std_dev, num_samples, seed)
+    return sequential_posterior(sample_data, data_key, prior, likelihood_std_dev, batch_size, num_batches, num_chains,
+                                num_draws, seed)
+
+
+# Closed-form Normal-Normal update for the mean given the data summary
+def conjugate_update(prior_mean, prior_std_dev, likelihood_std_dev, data_moments):
+    prior_var = prior_std_dev ** 2
+    likelihood_var = likelihood_std_dev ** 2
+    count = data_moments.count
+    posterior_mean = (prior_var * count * data_moments.mean + likelihood_var * prior_mean) / (count * prior_var + likelihood_var)
+    posterior_std_dev = np.sqrt((prior_var * likelihood_var) / (count * prior_var + likelihood_var))
+    return get_distribution("Normal", mean=posterior_mean, std_dev=posterior_std_dev)
+
+
+# Prior from the registry, parameterised so that μ₀ and σ₀ keep their meaning where they can
+def make_prior(family, mean, std_dev, df=3.0, separation=2.0, weight=0.5):
+    if family == "Normal":
+        return get_distribution("Normal", mean=mean, std_dev=std_dev)
+    if family == "Laplace":
+        return get_distribution("Laplace", mean=mean, scale=std_dev / np.sqrt(2))
+    if family == "Student-t":
+        return get_distribution("Student-t", df=df, loc=mean, scale=std_dev)
+    if family == "Normal Mixture":
+        return get_distribution("Normal Mixture", mean1=mean - separation / 2, mean2=mean + separation / 2,
+                                std_dev=std_dev, weight=weight)
+    raise ValueError(f"Unknown prior family: {family!r}")
+
+
+# Posterior after `num_batches` batches. The chain state is carried from batch to batch by short
+# cached updates, starting from the newest one already stored, so observing one more batch costs
+# one carry update plus the full run of `num_draws` that is shown
+def sequential_posterior(sample_data, data_key, prior, likelihood_std_dev, batch_size, num_batches, num_chains,
+                         num_draws, seed):
+    carry_params = (data_key, prior.key, likelihood_std_dev, batch_size, num_chains)
+
+    def batch(index):
+        return sample_data[(index - 1) * batch_size:index * batch_size]
+
+    carry, first = None, 1
+    for index in range(num_batches - 1, 0, -1):
+        # Membership checks are not counted as lookups, so the search adds no misses to the store's stats
+        key = sample_key(f"bayesian_inference.sequential.carry.{index}", carry_params, seed)
+        carry = sample_cache.get(key) if key in sample_cache else None
+        if carry is not None:
+            first = index + 1
+            break
+    for index in range(first, num_batches):
+        carry = cached_sample(
+            f"bayesian_inference.sequential.carry.{index}", carry_params, seed,
+            lambda rng: update_chains(carry, batch(index), prior, likelihood_std_dev, num_chains, CARRY_DRAWS, rng,
+                                      CARRY_WARMUP))
+    return cached_sample(
+        f"bayesian_inference.sequential.{num_batches}", carry_params + (num_draws,), seed,
+        lambda rng: update_chains(carry, batch(num_batches), prior, likelihood_std_dev, num_chains, num_draws, rng))
+
+
+# Posterior of the likelihood mean under a non-conjugate prior, sampled with vectorised chains
+def show_mcmc(result, prior, prior_family, likelihood_std_dev, conjugate_posterior):
+    histogram, moments, data_moments = result['histogram'], result['moments'], result['data_moments']
+    count = data_moments.count
+    lower, upper = histogram.quantile([0.025, 0.975])
+
+    edges = histogram.binned()[1]
+    x = np.linspace(min(prior.ppf(0.005), edges[0]), max(prior.ppf(0.995), edges[-1]), 1000)
+    prior_pdf = prior.pdf(x)
+    likelihood_pdf = get_distribution("Normal", mean=data_moments.mean,
+                                      std_dev=likelihood_std_dev / np.sqrt(count)).pdf(x)
+
+    def plot():
+        fig, ax = plt.subplots(figsize=(10, 6))
+        ax.plot(x, prior_pdf, 'b-', label=f'Prior: {prior_family}')
+        ax.plot(x, likelihood_pdf, 'g--', label=f'Likelihood: μₗ={data_moments.mean:.2f}, n={count}')
+        histplot(histogram, ax, stat='density', color='r', alpha=0.4, label='Posterior (MCMC draws)')
+        if conjugate_posterior is not None:
+            ax.plot(x, conjugate_posterior.pdf(x), 'k:', label='Posterior (closed form)')
+        ax.fill_between(x, 0, prior_pdf, color='b', alpha=0.1)
+        ax.set_title("Bayesian Inference with MCMC")
+        ax.legend()
+        return fig
+
+    show_figure("bayesian_inference.mcmc", plot, histogram, prior.key, count, data_moments.mean)
+
+    # Display results
+    st.write(f"Observations conditioned on: {count}")
+    st.write(f"Posterior Mean: {moments.mean:.2f}")
+    st.write(f"Posterior Standard Deviation: {moments.std():.2f}")
+    st.write(f"95% Credible Interval: [{lower:.2f}, {upper:.2f}]")
+    st.write(f"Split R-hat: {result['r_hat']:.3f}, effective sample size: {result['ess']:,.0f} "
+             f"of {moments.count:,} draws, acceptance rate: {result['acceptance']:.2f}")
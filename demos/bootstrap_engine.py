@@ -0,0 +1,125 @@
+import numpy as np
+from scipy.stats import norm, trim_mean
+from demos.rendering import Histogram
+
+# Default working-set size for one chunk of resamples (indices + gathered values)
+DEFAULT_MEMORY_BUDGET = 64 * 1024 ** 2
+
+
+# Reducers computing one statistic per row of a 2-D array of resamples
+def _mean(values, axis):
+    return np.mean(values, axis=axis)
+
+
+def _median(values, axis):
+    return np.median(values, axis=axis)
+
+
+def _trimmed_mean(values, axis):
+    return trim_mean(values, 0.1, axis=axis)
+
+
+def _std(values, axis):
+    return np.std(values, axis=axis, ddof=1)
+
+
+REDUCERS = {
+    "Mean": _mean,
+    "Median": _median,
+    "Trimmed Mean (10%)": _trimmed_mean,
+    "Standard Deviation": _std,
+}
+
+
+def get_reducer(reducer):
+    if callable(reducer):
+        return reducer
+    try:
+        return REDUCERS[reducer]
+    except KeyError:
+        raise ValueError(f"Unknown reducer: {reducer!r}") from None
+
+
+# Number of rows of length n that fit in the memory budget
+def _chunk_rows(n, memory_budget):
+    bytes_per_row = n * (np.dtype(np.intp).itemsize + np.dtype(np.float64).itemsize)
+    return max(1, int(memory_budget // bytes_per_row))
+
+
+# Draw resample indices as (chunk, n) matrices and reduce each row to one statistic
+def bootstrap_distribution(data, reducer="Mean", num_resamples=1000, rng=None,
+                           memory_budget=DEFAULT_MEMORY_BUDGET):
+    data = np.asarray(data, dtype=np.float64)
+    reducer = get_reducer(reducer)
+    rng = np.random.default_rng() if rng is None else rng
+    n = data.size
+
+    stats = np.empty(num_resamples, dtype=np.float64)
+    chunk = _chunk_rows(n, memory_budget)
+    for start in range(0, num_resamples, chunk):
+        stop = min(start + chunk, num_resamples)
+        indices = rng.integers(0, n, size=(stop - start, n))
+        stats[start:stop] = reducer(data[indices], axis=1)
+    return stats
+
+
+# Leave-one-out statistics, built from (chunk, n - 1) index matrices
+def jackknife_distribution(data, reducer="Mean", memory_budget=DEFAULT_MEMORY_BUDGET):
+    data = np.asarray(data, dtype=np.float64)
+    reducer = get_reducer(reducer)
+    n = data.size
+
+    stats = np.empty(n, dtype=np.float64)
+    chunk = _chunk_rows(n, memory_budget)
+    base = np.arange(n - 1)
+    for start in range(0, n, chunk):
+        stop = min(start + chunk, n)
+        left_out = np.arange(start, stop)[:, None]
+        # Row i skips index i by shifting every index at or after it up by one
+        indices = base + (base >= left_out)
+        stats[start:stop] = reducer(data[indices], axis=1)
+    return stats
+
+
+# Interval helpers accept the raw statistics or a Histogram of them
+def _quantile(bootstrap_stats, q):
+    if isinstance(bootstrap_stats, Histogram):
+        return bootstrap_stats.quantile(q)
+    return np.quantile(bootstrap_stats, q)
+
+
+def _share_below(bootstrap_stats, value):
+    if isinstance(bootstrap_stats, Histogram):
+        return bootstrap_stats.cdf(value)
+    return np.mean(bootstrap_stats < value) + 0.5 * np.mean(bootstrap_stats == value)
+
+
+def percentile_interval(bootstrap_stats, confidence_level=0.95):
+    alpha = 1 - confidence_level
+    lower, upper = _quantile(bootstrap_stats, [alpha / 2, 1 - alpha / 2])
+    return lower, upper
+
+
+# Bias-corrected and accelerated interval (Efron, 1987)
+def bca_interval(data, bootstrap_stats, reducer="Mean", confidence_level=0.95,
+                 memory_budget=DEFAULT_MEMORY_BUDGET):
+    reducer = get_reducer(reducer)
+    data = np.asarray(data, dtype=np.float64)
+    theta_hat = reducer(data[None, :], axis=1)[0]
+
+    # Bias correction from the share of bootstrap statistics below the estimate
+    size = bootstrap_stats.total if isinstance(bootstrap_stats, Histogram) else bootstrap_stats.size
+    below = np.clip(_share_below(bootstrap_stats, theta_hat), 1 / (size + 1), 1 - 1 / (size + 1))
+    z0 = norm.ppf(below)
+
+    # Acceleration from the skewness of the jackknife statistics
+    jackknife_stats = jackknife_distribution(data, reducer, memory_budget)
+    deviations = jackknife_stats.mean() - jackknife_stats
+    denominator = 6 * np.sum(deviations ** 2) ** 1.5
+    acceleration = np.sum(deviations ** 3) / denominator if denominator > 0 else 0.0
+
+    alpha = 1 - confidence_level
+    z = norm.ppf([alpha / 2, 1 - alpha / 2])
+    adjusted = norm.cdf(z0 + (z0 + z) / (1 - acceleration * (z0 + z)))
+    lower, upper = _quantile(bootstrap_stats, adjusted)
+    return lower, upper
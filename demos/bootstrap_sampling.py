@@ -1,62 +1,140 @@
-import streamlit as st
-import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-
-
-def show():
-    st.title("Bootstrap Sampling Demonstration")
-    st.sidebar.title("Settings")
-
-    # User inputs from the sidebar
-    dist_type = st.sidebar.selectbox("Choose the distribution:", ("Normal", "Exponential", "Uniform"))
-    sample_size = st.sidebar.slider("Sample size (n):", min_value=10, max_value=1000, value=100)
-    num_bootstrap_samples = st.sidebar.slider("Number of bootstrap samples:", min_value=100, max_value=5000, value=1000)
-
-    # Parameters for the original distribution
-    if dist_type == "Normal":
-        mean = st.sidebar.number_input("Mean:", value=0.0)
-        std_dev = st.sidebar.number_input("Standard Deviation:", value=1.0)
-    elif dist_type == "Exponential":
-        rate = st.sidebar.number_input("Rate (lambda):", value=1.0)
-    elif dist_type == "Uniform":
-        low = st.sidebar.number_input("Lower bound:", value=0.0)
-        high = st.sidebar.number_input("Upper bound:", value=1.0)
-
-    # Function to generate the original distribution
-    def generate_distribution(dist_type, size):
-        if dist_type == "Normal":
-            return np.random.normal(mean, std_dev, size)
-        elif dist_type == "Exponential":
-            return np.random.exponential(1 / rate, size)
-        elif dist_type == "Uniform":
-            return np.random.uniform(low, high, size)
-
-    # Generate sample data
-    original_sample = generate_distribution(dist_type, sample_size)
-
-    # Perform bootstrap sampling
-    bootstrap_means = []
-    for _ in range(num_bootstrap_samples):
-        bootstrap_sample = np.random.choice(original_sample, size=sample_size, replace=True)
-        bootstrap_means.append(np.mean(bootstrap_sample))
-
-    # Plotting
-    fig, ax = plt.subplots(figsize=(10, 6))
-    sns.histplot(bootstrap_means, bins=30, kde=True, ax=ax, edgecolor='black')
-    ax.axvline(np.mean(original_sample), color='r', linestyle='--',
-               label=f'Original Sample Mean: {np.mean(original_sample):.2f}')
-    ax.axvline(np.mean(bootstrap_means), color='g', linestyle='-',
-               label=f'Bootstrap Mean: {np.mean(bootstrap_means):.2f}')
-    ax.set_title("Bootstrap Sampling Distribution")
-    ax.legend()
-
-    st.pyplot(fig)
-
-    # Display summary statistics
-    st.write("Original Sample Summary Statistics:")
-    st.write(f"Mean: {np.mean(original_sample):.2f}")
-    st.write(f"Standard Deviation: {np.std(original_sample):.2f}")
-    st.write("Bootstrap Sample Summary Statistics:")
-    st.write(f"Mean of Bootstrap Means: {np.mean(bootstrap_means):.2f}")
-    st.write(f"Standard Deviation of Bootstrap Means: {np.std(bootstrap_means):.2f}")
+import streamlit as st
+from demos.cache import seed_input
+from demos.distributions import get_distribution
+from demos.executor import bootstrap_plan, simulate_bootstrap, stream_chunks
+from demos.figures import HistogramPanel, plot_backend, render_histograms, show_stage_figure
+from demos.moments import Moments
+from demos.bootstrap_engine import REDUCERS, percentile_interval, bca_interval
+from demos.progressive import stream_stage
+from demos.stages import Stage, StageGraph
+
+
+def show():
+    st.title("Bootstrap Sampling Demonstration")
+    st.sidebar.title("Settings")
+
+    # User inputs from the sidebar
+    dist_type = st.sidebar.selectbox("Choose the distribution:", ("Normal", "Exponential", "Uniform"))
+    sample_size = st.sidebar.slider("Sample size (n):", min_value=10, max_value=1000, value=100)
+    num_bootstrap_samples = st.sidebar.select_slider("Number of bootstrap samples:",
+                                                     options=[100, 500, 1000, 5000, 10000, 100000, 1000000],
+                                                     value=1000)
+    statistic = st.sidebar.selectbox("Statistic:", tuple(REDUCERS))
+    confidence_level = st.sidebar.slider("Confidence level (%):", min_value=80, max_value=99, value=95)
+
+    # Parameters for the original distribution
+    if dist_type == "Normal":
+        mean = st.sidebar.number_input("Mean:", value=0.0)
+        std_dev = st.sidebar.number_input("Standard Deviation:", value=1.0)
+        params = {'mean': mean, 'std_dev': std_dev}
+    elif dist_type == "Exponential":
+        rate = st.sidebar.number_input("Rate (lambda):", value=1.0)
+        params = {'rate': rate}
+    elif dist_type == "Uniform":
+        low = st.sidebar.number_input("Lower bound:", value=0.0)
+        high = st.sidebar.number_input("Upper bound:", value=1.0)
+        params = {'low': low, 'high': high}
+    seed = seed_input()
+
+    # Original distribution from the shared registry
+    dist = get_distribution(dist_type, **params)
+
+    inputs = bootstrap_inputs(dist, sample_size, num_bootstrap_samples, statistic, confidence_level, seed,
+                              plot_backend())
+
+    # The sample and its statistic come first; with progressive rendering the resampled statistics
+    # then fill in as the chunks come back
+    first = BOOTSTRAP_STAGES.run(inputs, targets=("estimate",))
+    placeholder = st.empty()
+
+    def plot_partial(bootstrap):
+        intervals = bootstrap_intervals(statistic, confidence_level, first['sample'], bootstrap)
+        return plot_bootstrap(statistic, confidence_level, inputs['backend'], bootstrap, first['estimate'], intervals)
+
+    stream_stage(BOOTSTRAP_STAGES, inputs, "bootstrap", placeholder, plot_partial, previous=first)
+    run = BOOTSTRAP_STAGES.run(inputs, previous=first)
+    result = bootstrap_result(run)
+    original_stat = result['original_stat']
+    bootstrap_moments = result['bootstrap'].moments
+    percentile_ci, bca_ci = result['percentile_interval'], result['bca_interval']
+    sample_moments = result['sample_moments']
+
+    # Plotting
+    show_stage_figure("bootstrap_sampling", run, container=placeholder)
+
+    # Display summary statistics
+    st.write("Original Sample Summary Statistics:")
+    st.write(f"Mean: {sample_moments.mean:.2f}")
+    st.write(f"Standard Deviation: {sample_moments.std():.2f}")
+    st.write(f"{statistic}: {original_stat:.2f}")
+    st.write("Bootstrap Sample Summary Statistics:")
+    st.write(f"Mean of Bootstrap Statistics: {bootstrap_moments.mean:.2f}")
+    st.write(f"Standard Deviation of Bootstrap Statistics: {bootstrap_moments.std():.2f}")
+    st.write(f"{confidence_level}% Percentile Interval: [{percentile_ci[0]:.2f}, {percentile_ci[1]:.2f}]")
+    st.write(f"{confidence_level}% BCa Interval: [{bca_ci[0]:.2f}, {bca_ci[1]:.2f}]")
+
+
+def draw_sample(dist, sample_size, rng):
+    return dist.rvs(rng, sample_size)
+
+
+# Resampled statistics come back from the worker chunks as a histogram plus moments
+def resample(statistic_type, num_bootstrap_samples, sample, rng):
+    return simulate_bootstrap(sample, REDUCERS[statistic_type], num_bootstrap_samples, rng.bit_generator.seed_seq)
+
+
+def resample_chunks(statistic_type, num_bootstrap_samples, sample, rng):
+    yield from stream_chunks(*bootstrap_plan(sample, REDUCERS[statistic_type], num_bootstrap_samples,
+                                             rng.bit_generator.seed_seq))
+
+
+def estimate_statistic(statistic_type, sample):
+    return {'original_stat': REDUCERS[statistic_type](sample[None, :], axis=1)[0],
+            'sample_moments': Moments.from_array(sample)}
+
+
+# Confidence intervals for the statistic, read off the fine histogram
+def bootstrap_intervals(statistic_type, confidence_level, sample, bootstrap):
+    level = confidence_level / 100
+    return {'percentile_interval': percentile_interval(bootstrap.histogram, level),
+            'bca_interval': bca_interval(sample, bootstrap.histogram, REDUCERS[statistic_type], level)}
+
+
+def plot_bootstrap(statistic_type, confidence_level, backend, bootstrap, estimate, intervals):
+    original_stat, bootstrap_mean = estimate['original_stat'], bootstrap.moments.mean
+    bca_ci = intervals['bca_interval']
+    return render_histograms([HistogramPanel(
+        bootstrap.histogram, f"Bootstrap Sampling Distribution of the {statistic_type}", bins=30, kde=True,
+        edgecolor='black',
+        vlines=[(original_stat, f'Original Sample {statistic_type}: {original_stat:.2f}', 'r', '--'),
+                (bootstrap_mean, f'Bootstrap Mean: {bootstrap_mean:.2f}', 'g', '-')],
+        span=(bca_ci[0], bca_ci[1], f'{confidence_level}% BCa Interval', 'orange'),
+    )], backend)
+
+
+# Sample -> resampled statistics -> intervals -> figure; the confidence level only reaches the
+# intervals and the figure, so moving it reuses the resamples
+BOOTSTRAP_STAGES = StageGraph("bootstrap_sampling", [
+    Stage("sample", draw_sample, reads=("dist", "sample_size"), stream="bootstrap_sampling"),
+    Stage("bootstrap", resample, kind="sample", reads=("statistic_type", "num_bootstrap_samples"), after=("sample",),
+          stream="bootstrap_sampling.resamples", chunks=resample_chunks),
+    Stage("estimate", estimate_statistic, kind="statistic", reads=("statistic_type",), after=("sample",)),
+    Stage("intervals", bootstrap_intervals, kind="decision", reads=("statistic_type", "confidence_level"),
+          after=("sample", "bootstrap")),
+    Stage("figure", plot_bootstrap, reads=("statistic_type", "confidence_level", "backend"),
+          after=("bootstrap", "estimate", "intervals")),
+])
+
+
+def bootstrap_inputs(dist, sample_size, num_bootstrap_samples, statistic, confidence_level, seed, backend=None):
+    return {'dist': dist, 'sample_size': sample_size, 'num_bootstrap_samples': num_bootstrap_samples,
+            'statistic_type': statistic, 'confidence_level': confidence_level, 'seed': seed, 'backend': backend}
+
+
+def bootstrap_result(run):
+    return dict(run['estimate'], sample=run['sample'], bootstrap=run['bootstrap'], **run['intervals'])
+
+
+def compute(dist, sample_size, num_bootstrap_samples, statistic, confidence_level, seed):
+    inputs = bootstrap_inputs(dist, sample_size, num_bootstrap_samples, statistic, confidence_level, seed)
+    return bootstrap_result(BOOTSTRAP_STAGES.run(inputs, targets=("estimate", "intervals")))
@@ -0,0 +1,331 @@
+import atexit
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import types
+from collections import OrderedDict
+
+import numpy as np
+import streamlit as st
+from demos.distributions import session_seed, stream
+from demos.profiling import note_values, stage
+
+# Byte budget shared by every session of the process, overridable from the environment
+DEFAULT_MAX_BYTES = int(os.environ.get("STATS_APP_CACHE_BYTES", 512 * 1024 ** 2))
+
+# Disk budget for arrays evicted from memory; 0 drops them instead of spilling
+DEFAULT_SPILL_BYTES = int(os.environ.get("STATS_APP_SPILL_BYTES", 4 * 1024 ** 3))
+
+# Each process spills into its own directory under this one, removed on exit
+SPILL_DIR = os.environ.get("STATS_APP_SPILL_DIR", os.path.join(tempfile.gettempdir(), "stats_app_spill"))
+
+# Smaller evicted arrays are cheaper to regenerate than to write out
+MIN_SPILL_BYTES = 1024 ** 2
+
+_MISSING = object()
+
+
+# Approximate memory held by a cached value: arrays, PNG bytes, scalars, containers of them, and
+# whatever an object such as a model fit or a chart holds in its attributes. Walked iteratively,
+# each object counted once, so fits that refer back to their model are not double counted.
+def value_nbytes(value):
+    total = 0
+    seen = set()
+    pending = [value]
+    while pending:
+        item = pending.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        if isinstance(item, np.ndarray):
+            total += item.nbytes
+        elif isinstance(item, (bytes, bytearray)):
+            total += len(item)
+        elif isinstance(item, (tuple, list, set, frozenset)):
+            total += sys.getsizeof(item)
+            pending.extend(item)
+        elif isinstance(item, dict):
+            total += sys.getsizeof(item)
+            pending.extend(item.values())
+        elif isinstance(item, (type, types.ModuleType, types.FunctionType, types.MethodType)):
+            # Shared by every value; not held by this one
+            continue
+        else:
+            total += sys.getsizeof(item)
+            pending.extend(getattr(item, '__dict__', {}).values())
+            for cls in type(item).__mro__:
+                slots = cls.__dict__.get('__slots__', ())
+                for name in (slots,) if isinstance(slots, str) else slots:
+                    pending.append(getattr(item, name, None))
+    return total
+
+
+# Turn nested parameter dicts/lists into a hashable key
+def freeze_key(value):
+    if isinstance(value, dict):
+        return tuple(sorted((name, freeze_key(item)) for name, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze_key(item) for item in value)
+    if isinstance(value, np.ndarray):
+        return tuple(value.tolist())
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+# Cached arrays are shared between reruns and sessions, so hand them out read-only
+def _make_read_only(value):
+    if isinstance(value, np.ndarray):
+        value.setflags(write=False)
+    elif isinstance(value, (tuple, list)):
+        for item in value:
+            _make_read_only(item)
+    elif isinstance(value, dict):
+        for item in value.values():
+            _make_read_only(item)
+    return value
+
+
+# Arrays, or tuples/lists of arrays, that can be written to .npy files and mapped back in
+def _spillable(value):
+    if isinstance(value, np.ndarray):
+        return value.dtype != object
+    if isinstance(value, (tuple, list)):
+        return bool(value) and all(isinstance(item, np.ndarray) and item.dtype != object for item in value)
+    return False
+
+
+# Spill and population files that could not be deleted yet: Windows refuses to unlink a file a
+# session still has memory-mapped. They are retried on every later removal and once more at exit.
+_stale_files = set()
+_stale_lock = threading.Lock()
+
+
+# Arrays still mapped by a session stay readable after their file is unlinked (elsewhere than Windows).
+# Returns the paths still waiting to be deleted.
+def remove_files(path_lists):
+    with _stale_lock:
+        paths = list(_stale_files)
+        _stale_files.clear()
+    for group in path_lists:
+        paths.extend(group)
+    failed = []
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError:
+            failed.append(path)
+    with _stale_lock:
+        _stale_files.update(failed)
+        return set(_stale_files)
+
+
+atexit.register(remove_files, [])
+
+
+# File name stem of a cached value: a hash of its key, i.e. of its parameters and seed
+def key_digest(key):
+    return hashlib.blake2b(repr(key).encode(), digest_size=16).hexdigest()
+
+
+# Byte-budgeted LRU cache shared by every session of the process. With a `spill_bytes` budget,
+# large arrays evicted from memory are written to .npy files and served memory-mapped on later
+# hits, so the page cache rather than the heap holds them. Sessions that miss the same key at
+# the same time wait for one computation instead of each computing their own copy.
+class ResultCache:
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, spill_bytes=0):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.spill_bytes = spill_bytes
+        self.spilled_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.spills = 0
+        self.spill_hits = 0
+        self._entries = OrderedDict()
+        # key -> (memory-mapped value, paths, size)
+        self._spilled = OrderedDict()
+        self._pending = {}
+        self._spill_dir = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries) + len(self._spilled)
+
+    def __contains__(self, key):
+        return key in self._entries or key in self._spilled
+
+    # Caller holds the lock
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            return entry[0]
+        spilled = self._spilled.get(key)
+        if spilled is not None:
+            self._spilled.move_to_end(key)
+            self.spill_hits += 1
+            return spilled[0]
+        return _MISSING
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._lookup(key)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        size = value_nbytes(value)
+        removed = []
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= self._entries.pop(key)[1]
+            if key in self._spilled:
+                _, paths, spilled_size = self._spilled.pop(key)
+                self.spilled_bytes -= spilled_size
+                removed.append(paths)
+            # Values larger than the whole budget are returned but never stored
+            evicted = []
+            if size <= self.max_bytes:
+                while self._entries and self.current_bytes + size > self.max_bytes:
+                    evicted_key, (evicted_value, evicted_size) = self._entries.popitem(last=False)
+                    self.current_bytes -= evicted_size
+                    self.evictions += 1
+                    evicted.append((evicted_key, evicted_value, evicted_size))
+                self._entries[key] = (value, size)
+                self.current_bytes += size
+        remove_files(removed)
+        # Written outside the lock; a lookup in the meantime misses and recomputes
+        for evicted_key, evicted_value, evicted_size in evicted:
+            self._spill(evicted_key, evicted_value, evicted_size)
+        return value
+
+    def _spill(self, key, value, size):
+        if size < MIN_SPILL_BYTES or size > self.spill_bytes or not _spillable(value):
+            return
+        with self._lock:
+            # Brought back into memory by a put while this was being evicted
+            if key in self._entries or key in self._spilled:
+                return
+            if self._spill_dir is None:
+                os.makedirs(SPILL_DIR, exist_ok=True)
+                self._spill_dir = tempfile.mkdtemp(prefix=f"{os.getpid()}-", dir=SPILL_DIR)
+                atexit.register(shutil.rmtree, self._spill_dir, True)
+            spill_dir = self._spill_dir
+        items = [value] if isinstance(value, np.ndarray) else list(value)
+        stem = os.path.join(spill_dir, key_digest(key))
+        paths = []
+        try:
+            for index, item in enumerate(items):
+                path = f"{stem}-{index}.npy"
+                temporary = f"{path}.{threading.get_ident()}.tmp"
+                with open(temporary, "wb") as handle:
+                    np.save(handle, item)
+                os.replace(temporary, path)
+                paths.append(path)
+        except OSError:
+            # Out of scratch space: the value is dropped as it would be without spilling
+            remove_files([paths, [temporary]])
+            return
+        mapped = [np.load(path, mmap_mode="r") for path in paths]
+        mapped = mapped[0] if isinstance(value, np.ndarray) else type(value)(mapped)
+
+        removed = []
+        with self._lock:
+            if key in self._entries or key in self._spilled:
+                # Back in memory meanwhile, or spilled to these same files by another session
+                if key not in self._spilled:
+                    removed.append(paths)
+            else:
+                while self._spilled and self.spilled_bytes + size > self.spill_bytes:
+                    _, (_, old_paths, old_size) = self._spilled.popitem(last=False)
+                    self.spilled_bytes -= old_size
+                    removed.append(old_paths)
+                self._spilled[key] = (mapped, paths, size)
+                self.spilled_bytes += size
+                self.spills += 1
+        remove_files(removed)
+
+    def get_or_compute(self, key, compute):
+        while True:
+            with self._lock:
+                value = self._lookup(key)
+                if value is not _MISSING:
+                    self.hits += 1
+                    return value
+                pending = self._pending.get(key)
+                if pending is None:
+                    self.misses += 1
+                    pending = self._pending[key] = threading.Event()
+                    break
+            # Another session is computing this value; take its result (or retry if it failed)
+            pending.wait()
+        try:
+            value = self.put(key, _make_read_only(compute()))
+        finally:
+            with self._lock:
+                del self._pending[key]
+            pending.set()
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+            removed = [paths for _, paths, _ in self._spilled.values()]
+            self._spilled.clear()
+            self.spilled_bytes = 0
+        remove_files(removed)
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "spilled_entries": len(self._spilled),
+            "spilled_bytes": self.spilled_bytes,
+            "spill_bytes": self.spill_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "spills": self.spills,
+            "spill_hits": self.spill_hits,
+        }
+
+
+sample_cache = ResultCache(spill_bytes=DEFAULT_SPILL_BYTES)
+
+# Rendered figures get a budget of their own next to the sample cache, so charts never push samples out
+figure_cache = ResultCache(int(os.environ.get("STATS_APP_FIGURE_CACHE_BYTES", 64 * 1024 ** 2)))
+
+
+def seed_input():
+    return int(st.sidebar.number_input("Random seed:", min_value=0, value=session_seed(), step=1))
+
+
+# Store key of a cached_sample value, for checking what is already stored
+def sample_key(name, params, seed):
+    return name, freeze_key(params), seed
+
+
+# Run `generate(rng)` once per (name, params, seed) and serve reruns from the cache; a miss is
+# profiled as `stage_name`, which is "statistics" for cached model fits rather than draws
+def cached_sample(name, params, seed, generate, stage_name="sampling"):
+    key = sample_key(name, params, seed)
+
+    def compute():
+        with stage(stage_name):
+            return generate(stream(name, seed))
+
+    value = sample_cache.get_or_compute(key, compute)
+    note_values(value)
+    return value
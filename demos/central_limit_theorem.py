@@ -1,58 +1,93 @@
-import streamlit as st
-import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-from scipy.stats import norm
-
-def show():
-    st.title("Central Limit Theorem Demonstration")
-    st.sidebar.title("Settings")
-
-    # User inputs from the sidebar
-    dist_type = st.sidebar.selectbox("Choose the original distribution:", ("Uniform", "Exponential", "Binomial"))
-    sample_size = st.sidebar.slider("Sample size (n):", min_value=1, max_value=1000, value=30)
-    num_samples = st.sidebar.slider("Number of samples:", min_value=1, max_value=10000, value=1000)
-
-    # Parameters for the original distribution
-    if dist_type == "Uniform":
-        low = st.sidebar.number_input("Uniform distribution - lower bound:", value=0)
-        high = st.sidebar.number_input("Uniform distribution - upper bound:", value=10)
-    elif dist_type == "Exponential":
-        rate = st.sidebar.number_input("Exponential distribution - rate (lambda):", value=1.0)
-    elif dist_type == "Binomial":
-        n = st.sidebar.number_input("Binomial distribution - number of trials:", value=10)
-        p = st.sidebar.number_input("Binomial distribution - probability of success:", value=0.5)
-
-    # Function to generate the original distribution
-    def generate_distribution(dist_type, size):
-        if dist_type == "Uniform":
-            return np.random.uniform(low, high, size)
-        elif dist_type == "Exponential":
-            return np.random.exponential(1/rate, size)
-        elif dist_type == "Binomial":
-            return np.random.binomial(n, p, size)
-
-    # Generate samples and compute sample means
-    original_data = generate_distribution(dist_type, sample_size * num_samples)
-    samples = original_data.reshape((num_samples, sample_size))
-    sample_means = samples.mean(axis=1)
-
-    # Plotting
-    fig, axes = plt.subplots(1, 2, figsize=(14, 6))
-
-    # Original distribution
-    sns.histplot(original_data, kde=True, ax=axes[0], bins=30)
-    axes[0].set_title(f"Original {dist_type} Distribution")
-
-    # Sample means distribution
-    sns.histplot(sample_means, kde=True, ax=axes[1], bins=30, stat='density')
-
-    # Scale the normal curve to the sample means distribution
-    mean = np.mean(sample_means)
-    std = np.std(sample_means)
-    x = np.linspace(min(sample_means), max(sample_means), 100)
-    y = norm.pdf(x, mean, std)
-    axes[1].plot(x, y, 'r-', lw=2)
-    axes[1].set_title("Distribution of Sample Means")
-
-    st.pyplot(fig)
+import streamlit as st
+import numpy as np
+from scipy.stats import norm
+from demos.cache import seed_input
+from demos.distributions import get_distribution
+from demos.executor import PRECISIONS, sample_means_plan, simulate_sample_means, stream_chunks
+from demos.figures import HistogramPanel, plot_backend, render_histograms, show_stage_figure
+from demos.progressive import stream_stage
+from demos.stages import Stage, StageGraph
+
+def show():
+    st.title("Central Limit Theorem Demonstration")
+    st.sidebar.title("Settings")
+
+    # User inputs from the sidebar
+    dist_type = st.sidebar.selectbox("Choose the original distribution:", ("Uniform", "Exponential", "Binomial"))
+    sample_size = st.sidebar.slider("Sample size (n):", min_value=1, max_value=1000, value=30)
+    num_samples = st.sidebar.slider("Number of samples:", min_value=1, max_value=10000, value=1000)
+    # compact draws float32, or the smallest integer type that holds Binomial counts
+    precision = st.sidebar.selectbox("Precision:", PRECISIONS)
+
+    # Parameters for the original distribution
+    if dist_type == "Uniform":
+        low = st.sidebar.number_input("Uniform distribution - lower bound:", value=0)
+        high = st.sidebar.number_input("Uniform distribution - upper bound:", value=10)
+        params = {'low': low, 'high': high}
+    elif dist_type == "Exponential":
+        rate = st.sidebar.number_input("Exponential distribution - rate (lambda):", value=1.0)
+        params = {'rate': rate}
+    elif dist_type == "Binomial":
+        n = st.sidebar.number_input("Binomial distribution - number of trials:", value=10)
+        p = st.sidebar.number_input("Binomial distribution - probability of success:", value=0.5)
+        params = {'n': n, 'p': p}
+    seed = seed_input()
+
+    # Original distribution from the shared registry
+    dist = get_distribution(dist_type, **params)
+
+    inputs = clt_inputs(dist, sample_size, num_samples, seed, plot_backend(), precision)
+
+    # Plotting; with progressive rendering the histograms fill in as the chunks come back
+    placeholder = st.empty()
+    stream_stage(CLT_STAGES, inputs, "sample", placeholder,
+                 lambda sample: plot_distributions(dist, inputs['backend'], sample, normal_curve(sample)))
+    run = CLT_STAGES.run(inputs)
+    show_stage_figure("central_limit_theorem", run, container=placeholder)
+
+
+# Generate samples in parallel chunks, keeping only histograms and moments of the draws and means
+def simulate(dist, sample_size, num_samples, precision, rng):
+    return simulate_sample_means(dist, sample_size, num_samples, rng.bit_generator.seed_seq, precision=precision)
+
+
+def simulate_chunks(dist, sample_size, num_samples, precision, rng):
+    yield from stream_chunks(*sample_means_plan(dist, sample_size, num_samples, rng.bit_generator.seed_seq,
+                                                precision=precision))
+
+
+# Normal curve scaled to the sample means distribution
+def normal_curve(sample):
+    moments = sample[1].moments
+    x = np.linspace(moments.min, moments.max, 100)
+    return {'x': x, 'y': norm.pdf(x, moments.mean, moments.std())}
+
+
+def plot_distributions(dist, backend, sample, statistic):
+    original_data, sample_means = sample
+    return render_histograms([
+        # Original distribution
+        HistogramPanel(original_data.histogram, f"Original {dist.name} Distribution", bins=30, kde=True),
+        # Sample means distribution
+        HistogramPanel(sample_means.histogram, "Distribution of Sample Means", bins=30, kde=True, stat='density',
+                       curves=[(statistic['x'], statistic['y'], None, 'r', 'line')]),
+    ], backend, figsize=(14, 6))
+
+
+CLT_STAGES = StageGraph("central_limit_theorem", [
+    Stage("sample", simulate, reads=("dist", "sample_size", "num_samples", "precision"),
+          stream="central_limit_theorem", chunks=simulate_chunks),
+    Stage("statistic", normal_curve, after=("sample",)),
+    Stage("figure", plot_distributions, reads=("dist", "backend"), after=("sample", "statistic")),
+])
+
+
+def clt_inputs(dist, sample_size, num_samples, seed, backend=None, precision="float64"):
+    return {'dist': dist, 'sample_size': sample_size, 'num_samples': num_samples, 'seed': seed, 'backend': backend,
+            'precision': precision}
+
+
+def compute(dist, sample_size, num_samples, seed, precision="float64"):
+    inputs = clt_inputs(dist, sample_size, num_samples, seed, precision=precision)
+    draws, means = CLT_STAGES.run(inputs, targets=("sample",))['sample']
+    return {'draws': draws, 'means': means}
@@ -1,62 +1,160 @@
-import streamlit as st
-import numpy as np
-import matplotlib.pyplot as plt
-from scipy.stats import norm, t
-
-def show():
-    st.title("Confidence Intervals Demonstration")
-    st.sidebar.title("Settings")
-
-    # User inputs from the sidebar
-    dist_type = st.sidebar.selectbox("Choose the original distribution:", ("Normal", "Exponential"))
-    sample_size = st.sidebar.slider("Sample size (n):", min_value=1, max_value=1000, value=30)
-    confidence_level = st.sidebar.slider("Confidence level (%):", min_value=80, max_value=99, value=95)
-
-    # Parameters for the original distribution
-    if dist_type == "Normal":
-        mean = st.sidebar.number_input("Normal distribution - mean:", value=0.0)
-        std_dev = st.sidebar.number_input("Normal distribution - standard deviation:", value=1.0)
-    elif dist_type == "Exponential":
-        rate = st.sidebar.number_input("Exponential distribution - rate (lambda):", value=1.0)
-
-    # Function to generate the original distribution
-    def generate_distribution(dist_type, size):
-        if dist_type == "Normal":
-            return np.random.normal(mean, std_dev, size)
-        elif dist_type == "Exponential":
-            return np.random.exponential(1/rate, size)
-
-    # Generate sample data
-    data = generate_distribution(dist_type, sample_size)
-    sample_mean = np.mean(data)
-    sample_std = np.std(data, ddof=1)
-    alpha = 1 - confidence_level / 100
-
-    # Calculate confidence interval
-    if dist_type == "Normal" and sample_size > 30:
-        # Use Z-distribution for large samples
-        z_score = norm.ppf(1 - alpha / 2)
-        margin_of_error = z_score * (sample_std / np.sqrt(sample_size))
-    else:
-        # Use t-distribution for small samples
-        t_score = t.ppf(1 - alpha / 2, df=sample_size - 1)
-        margin_of_error = t_score * (sample_std / np.sqrt(sample_size))
-
-    ci_lower = sample_mean - margin_of_error
-    ci_upper = sample_mean + margin_of_error
-
-    # Plotting
-    fig, ax = plt.subplots(figsize=(10, 6))
-    ax.hist(data, bins=30, alpha=0.6, color='g', edgecolor='black')
-    ax.axvline(ci_lower, color='r', linestyle='--', label=f'CI Lower: {ci_lower:.2f}')
-    ax.axvline(ci_upper, color='r', linestyle='--', label=f'CI Upper: {ci_upper:.2f}')
-    ax.axvline(sample_mean, color='b', linestyle='-', label=f'Sample Mean: {sample_mean:.2f}')
-    ax.set_title(f"Confidence Interval ({confidence_level}%) for {dist_type} Distribution")
-    ax.legend()
-
-    st.pyplot(fig)
-
-    # Display results
-    st.write(f"Sample Mean: {sample_mean:.2f}")
-    st.write(f"Sample Standard Deviation: {sample_std:.2f}")
-    st.write(f"Confidence Interval: [{ci_lower:.2f}, {ci_upper:.2f}]")
+import streamlit as st
+import numpy as np
+import matplotlib.pyplot as plt
+from demos.cache import cached_sample, seed_input
+from demos.coverage_engine import WIDTH_QUANTILES, coverage_grid, critical_value
+from demos.distributions import get_distribution
+from demos.figures import render_png, show_figure, show_stage_figure
+from demos.moments import Moments
+from demos.stages import Stage, StageGraph
+
+def show():
+    st.title("Confidence Intervals Demonstration")
+    st.sidebar.title("Settings")
+
+    # User inputs from the sidebar
+    mode = st.sidebar.selectbox("Mode:", ("Single interval", "Coverage simulation"))
+    dist_type = st.sidebar.selectbox("Choose the original distribution:", ("Normal", "Exponential"))
+    if mode == "Single interval":
+        sample_size = st.sidebar.slider("Sample size (n):", min_value=1, max_value=1000, value=30)
+    elif mode == "Coverage simulation":
+        sample_sizes = st.sidebar.multiselect("Sample sizes (n):", [2, 5, 10, 20, 30, 50, 100, 300, 1000],
+                                              default=[5, 10, 30, 100, 1000])
+        num_replicates = st.sidebar.select_slider("Number of replicate samples:",
+                                                  options=[10000, 100000, 1000000], value=100000)
+    confidence_level = st.sidebar.slider("Confidence level (%):", min_value=80, max_value=99, value=95)
+
+    # Parameters for the original distribution
+    if dist_type == "Normal":
+        mean = st.sidebar.number_input("Normal distribution - mean:", value=0.0)
+        std_dev = st.sidebar.number_input("Normal distribution - standard deviation:", value=1.0)
+        params = {'mean': mean, 'std_dev': std_dev}
+    elif dist_type == "Exponential":
+        rate = st.sidebar.number_input("Exponential distribution - rate (lambda):", value=1.0)
+        params = {'rate': rate}
+    seed = seed_input()
+
+    # Original distribution from the shared registry
+    dist = get_distribution(dist_type, **params)
+
+    if mode == "Coverage simulation":
+        show_coverage(dist, sorted(sample_sizes), num_replicates, confidence_level, seed)
+        return
+
+    run = INTERVAL_STAGES.run(interval_inputs(dist, sample_size, confidence_level, seed))
+    result = interval_result(run)
+    sample_mean, sample_std = result['mean'], result['std']
+    ci_lower, ci_upper = result['lower'], result['upper']
+
+    # Plotting
+    show_stage_figure("confidence_intervals", run)
+
+    # Display results
+    st.write(f"Sample Mean: {sample_mean:.2f}")
+    st.write(f"Sample Standard Deviation: {sample_std:.2f}")
+    st.write(f"Confidence Interval: [{ci_lower:.2f}, {ci_upper:.2f}]")
+
+
+def draw_sample(dist, sample_size, rng):
+    return dist.rvs(rng, sample_size)
+
+
+def sample_statistics(sample):
+    moments = Moments.from_array(sample)
+    return {'mean': moments.mean, 'std': moments.std(ddof=1)}
+
+
+# Confidence interval, using the Z-distribution for large Normal samples and t otherwise
+def confidence_interval(dist, sample_size, confidence_level, statistic):
+    score = critical_value(sample_size, confidence_level / 100, use_z=dist.name == "Normal" and sample_size > 30)
+    margin_of_error = score * (statistic['std'] / np.sqrt(sample_size))
+    return {'lower': statistic['mean'] - margin_of_error, 'upper': statistic['mean'] + margin_of_error}
+
+
+def plot_interval(dist, confidence_level, sample, statistic, interval):
+    sample_mean, ci_lower, ci_upper = statistic['mean'], interval['lower'], interval['upper']
+    fig, ax = plt.subplots(figsize=(10, 6))
+    ax.hist(sample, bins=30, alpha=0.6, color='g', edgecolor='black')
+    ax.axvline(ci_lower, color='r', linestyle='--', label=f'CI Lower: {ci_lower:.2f}')
+    ax.axvline(ci_upper, color='r', linestyle='--', label=f'CI Upper: {ci_upper:.2f}')
+    ax.axvline(sample_mean, color='b', linestyle='-', label=f'Sample Mean: {sample_mean:.2f}')
+    ax.set_title(f"Confidence Interval ({confidence_level}%) for {dist.name} Distribution")
+    ax.legend()
+    return render_png(fig)
+
+
+# Sample -> mean and standard deviation -> interval -> figure; the confidence level only reaches
+# the interval and the figure, so moving it keeps the sample and its moments
+INTERVAL_STAGES = StageGraph("confidence_intervals", [
+    Stage("sample", draw_sample, reads=("dist", "sample_size"), stream="confidence_intervals"),
+    Stage("statistic", sample_statistics, after=("sample",)),
+    Stage("interval", confidence_interval, kind="decision", reads=("dist", "sample_size", "confidence_level"),
+          after=("statistic",)),
+    Stage("figure", plot_interval, reads=("dist", "confidence_level"), after=("sample", "statistic", "interval")),
+])
+
+
+def interval_inputs(dist, sample_size, confidence_level, seed):
+    return {'dist': dist, 'sample_size': sample_size, 'confidence_level': confidence_level, 'seed': seed}
+
+
+def interval_result(run):
+    return dict(run['statistic'], data=run['sample'], **run['interval'])
+
+
+def compute(dist, sample_size, confidence_level, seed):
+    run = INTERVAL_STAGES.run(interval_inputs(dist, sample_size, confidence_level, seed), targets=("interval",))
+    return interval_result(run)
+
+
+# Coverage, standard error and interval widths per sample size, from replicate samples
+def compute_coverage(dist, sample_sizes, num_replicates, confidence_level, seed):
+    sample_sizes = sorted(sample_sizes)
+    z_above = 30 if dist.name == "Normal" else None
+    results = cached_sample(
+        "confidence_intervals.coverage", (dist.key, sample_sizes, num_replicates, confidence_level), seed,
+        lambda rng: coverage_grid(dist, sample_sizes, num_replicates, confidence_level / 100, rng, z_above))
+    return {'results': results}
+
+
+# Empirical coverage of the nominal interval across many replicate samples per sample size
+def show_coverage(dist, sample_sizes, num_replicates, confidence_level, seed):
+    if not sample_sizes:
+        st.write("Select at least one sample size.")
+        return
+
+    results = compute_coverage(dist, sample_sizes, num_replicates, confidence_level, seed)['results']
+
+    # Plotting
+    def plot():
+        fig, axes = plt.subplots(1, 2, figsize=(14, 6))
+        coverages = [result['coverage'] * 100 for result in results]
+        errors = [1.96 * result['standard_error'] * 100 for result in results]
+        axes[0].errorbar(sample_sizes, coverages, yerr=errors, fmt='o-', capsize=4, label='Empirical Coverage')
+        axes[0].axhline(confidence_level, color='r', linestyle='--', label=f'Nominal Level: {confidence_level}%')
+        axes[0].set_xscale('log')
+        axes[0].set_xlabel("Sample Size (n)")
+        axes[0].set_ylabel("Coverage (%)")
+        axes[0].set_title(f"Coverage of {confidence_level}% Intervals for the {dist.name} Mean")
+        axes[0].legend()
+
+        # Box plots drawn from the precomputed width quantiles
+        low, q1, median, q3, high = range(len(WIDTH_QUANTILES))
+        stats = [{'label': str(result['sample_size']), 'whislo': result['width_quantiles'][low],
+                  'q1': result['width_quantiles'][q1], 'med': result['width_quantiles'][median],
+                  'q3': result['width_quantiles'][q3], 'whishi': result['width_quantiles'][high],
+                  'mean': result['mean_width']} for result in results]
+        axes[1].bxp(stats, showfliers=False, showmeans=True)
+        axes[1].set_yscale('log')
+        axes[1].set_xlabel("Sample Size (n)")
+        axes[1].set_ylabel("Interval Width")
+        axes[1].set_title("Interval Width Distribution (1st-99th percentile whiskers)")
+        return fig
+
+    show_figure("confidence_intervals.coverage", plot, results, confidence_level, dist.key)
+
+    # Display results
+    st.write(f"Replicate samples per sample size: {num_replicates:,}")
+    for result in results:
+        st.write(f"n = {result['sample_size']}: coverage {result['coverage'] * 100:.2f}% "
+                 f"(± {1.96 * result['standard_error'] * 100:.2f}), mean width {result['mean_width']:.3f}")
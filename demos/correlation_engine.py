@@ -0,0 +1,105 @@
+import os
+import numpy as np
+from scipy.stats import rankdata
+
+# Working-set size for one block of permuted or resampled rows, overridable from the environment
+DEFAULT_MEMORY_BUDGET = int(os.environ.get("STATS_APP_RESAMPLE_BYTES", 64 * 1024 ** 2))
+
+
+# Centre and scale so that the dot product of two standardized vectors is Pearson's r.
+# Spearman's rho is Pearson's r on the ranks, so the ranking happens here, once.
+def standardize(values, method="Pearson"):
+    values = np.asarray(values, dtype=np.float64)
+    if method == "Spearman":
+        values = rankdata(values)
+    elif method != "Pearson":
+        raise ValueError(f"Unknown correlation method: {method!r}")
+    centred = values - values.mean()
+    return centred / np.sqrt(np.dot(centred, centred))
+
+
+def _block_rows(sample_size, bytes_per_value, memory_budget):
+    return max(1, int(memory_budget // (sample_size * bytes_per_value)))
+
+
+# Correlations of x against row-wise shuffles of y. Each block is a (permutations x n) matrix,
+# so every permuted statistic is one row of a matrix-vector product.
+def permutation_distribution(x, y, method, num_permutations, rng, memory_budget=DEFAULT_MEMORY_BUDGET):
+    zx, zy = standardize(x, method), standardize(y, method)
+    stats = np.empty(num_permutations)
+    rows = _block_rows(zy.size, zy.itemsize, memory_budget)
+    for start in range(0, num_permutations, rows):
+        stop = min(start + rows, num_permutations)
+        block = np.tile(zy, (stop - start, 1))
+        rng.permuted(block, axis=1, out=block)
+        stats[start:stop] = block @ zx
+    return stats
+
+
+# Ascending order of `values`, and where each run of tied values starts in it
+def _value_order(values):
+    order = np.argsort(values, kind='stable')
+    sorted_values = values[order]
+    starts = np.flatnonzero(np.r_[True, sorted_values[1:] != sorted_values[:-1]])
+    return order, starts
+
+
+# Average ranks within each resample, from the `counts` of every original value in it, columns in
+# ascending order of value. A run of tied values drawn `count` times after `before` smaller draws
+# ranks before + (count + 1) / 2, as rankdata ranks each copy. Also returns the sum of squared
+# deviations of those ranks about their mean, (N^3 - sum count^3) / 12 for N draws.
+def _resample_ranks(counts, starts):
+    tied = starts.size < counts.shape[1]
+    groups = np.add.reduceat(counts, starts, axis=1) if tied else counts
+    ranks = np.cumsum(groups, axis=1) - (groups - 1) / 2
+    if tied:
+        ranks = np.repeat(ranks, np.diff(np.r_[starts, counts.shape[1]]), axis=1)
+    draws = counts.shape[1]
+    return ranks, (draws ** 3 - np.einsum('ij,ij,ij->i', groups, groups, groups)) / 12
+
+
+# Correlations of resampled (x, y) pairs. Spearman re-ranks every resample, through how often each
+# original pair is drawn rather than a sort per row; rho is then Pearson's r of those ranks with
+# the counts as weights.
+def bootstrap_distribution(x, y, method, num_resamples, rng, memory_budget=DEFAULT_MEMORY_BUDGET):
+    x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+    sample_size = x.size
+    stats = np.empty(num_resamples)
+    if method == "Spearman":
+        order_x, starts_x = _value_order(x)
+        order_y, starts_y = _value_order(y)
+        position_x, position_y = np.empty_like(order_x), np.empty_like(order_y)
+        position_x[order_x] = position_y[order_y] = np.arange(sample_size)
+        # Columns in y order taken from columns in x order, and back
+        x_to_y, y_to_x = position_x[order_y], position_y[order_x]
+        mean_rank = (sample_size + 1) / 2
+        # Indices and their x positions, the counts in both orders and the ranks
+        rows = _block_rows(sample_size, 10 * x.itemsize, memory_budget)
+        for start in range(0, num_resamples, rows):
+            stop = min(start + rows, num_resamples)
+            indices = rng.integers(0, sample_size, size=(stop - start, sample_size))
+            cells = position_x[indices] + sample_size * np.arange(stop - start)[:, None]
+            counts_x = np.bincount(cells.ravel(), minlength=cells.size).reshape(cells.shape).astype(np.float64)
+            ranks_x, squares_x = _resample_ranks(counts_x, starts_x)
+            ranks_y, squares_y = _resample_ranks(np.take(counts_x, x_to_y, axis=1), starts_y)
+            products = np.einsum('ij,ij,ij->i', counts_x, ranks_x, np.take(ranks_y, y_to_x, axis=1))
+            stats[start:stop] = (products - sample_size * mean_rank ** 2) / np.sqrt(squares_x * squares_y)
+        return stats
+    zx, zy = standardize(x, method), standardize(y, method)
+    # Indices plus the two gathered rows and their product
+    rows = _block_rows(sample_size, 4 * zx.itemsize, memory_budget)
+    for start in range(0, num_resamples, rows):
+        stop = min(start + rows, num_resamples)
+        indices = rng.integers(0, sample_size, size=(stop - start, sample_size))
+        resampled_x, resampled_y = zx[indices], zy[indices]
+        mean_x, mean_y = resampled_x.mean(axis=1), resampled_y.mean(axis=1)
+        covariance = np.einsum('ij,ij->i', resampled_x, resampled_y) / sample_size - mean_x * mean_y
+        var_x = np.einsum('ij,ij->i', resampled_x, resampled_x) / sample_size - mean_x ** 2
+        var_y = np.einsum('ij,ij->i', resampled_y, resampled_y) / sample_size - mean_y ** 2
+        stats[start:stop] = covariance / np.sqrt(var_x * var_y)
+    return stats
+
+
+# Two-sided Monte Carlo p-value, counting the observed statistic as one of the permutations
+def permutation_p_value(observed, stats):
+    return (1 + np.count_nonzero(np.abs(stats) >= abs(observed) - 1e-12)) / (1 + stats.size)
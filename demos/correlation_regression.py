@@ -1,70 +1,255 @@
-import streamlit as st
-import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-from scipy.stats import pearsonr, spearmanr, linregress
-
-def show():
-    st.title("Correlation and Regression Demonstration")
-    st.sidebar.title("Settings")
-
-    # User inputs from the sidebar
-    dist_type = st.sidebar.selectbox("Choose the distribution for sample data:", ("Normal", "Uniform"))
-    sample_size = st.sidebar.slider("Sample size (n):", min_value=10, max_value=1000, value=100)
-    correlation_type = st.sidebar.selectbox("Choose the type of correlation:", ("Pearson", "Spearman"))
-
-    # Parameters for the original distribution
-    if dist_type == "Normal":
-        mean_x = st.sidebar.number_input("Normal distribution for X - mean:", value=0.0)
-        std_dev_x = st.sidebar.number_input("Normal distribution for X - standard deviation:", value=1.0)
-        mean_y = st.sidebar.number_input("Normal distribution for Y - mean:", value=0.0)
-        std_dev_y = st.sidebar.number_input("Normal distribution for Y - standard deviation:", value=1.0)
-    elif dist_type == "Uniform":
-        low_x = st.sidebar.number_input("Uniform distribution for X - lower bound:", value=0.0)
-        high_x = st.sidebar.number_input("Uniform distribution for X - upper bound:", value=1.0)
-        low_y = st.sidebar.number_input("Uniform distribution for Y - lower bound:", value=0.0)
-        high_y = st.sidebar.number_input("Uniform distribution for Y - upper bound:", value=1.0)
-
-    # Function to generate the original distribution
-    def generate_distribution(dist_type, size, params):
-        if dist_type == "Normal":
-            return np.random.normal(params['mean'], params['std_dev'], size)
-        elif dist_type == "Uniform":
-            return np.random.uniform(params['low'], params['high'], size)
-
-    # Generate sample data
-    if dist_type == "Normal":
-        params_x = {'mean': mean_x, 'std_dev': std_dev_x}
-        params_y = {'mean': mean_y, 'std_dev': std_dev_y}
-    elif dist_type == "Uniform":
-        params_x = {'low': low_x, 'high': high_x}
-        params_y = {'low': low_y, 'high': high_y}
-
-    x = generate_distribution(dist_type, sample_size, params_x)
-    y = generate_distribution(dist_type, sample_size, params_y)
-
-    # Compute correlation
-    if correlation_type == "Pearson":
-        corr, p_value = pearsonr(x, y)
-    elif correlation_type == "Spearman":
-        corr, p_value = spearmanr(x, y)
-
-    # Perform linear regression
-    slope, intercept, r_value, p_value_reg, std_err = linregress(x, y)
-
-    # Plotting
-    fig, ax = plt.subplots(figsize=(10, 6))
-    sns.scatterplot(x=x, y=y, ax=ax)
-    ax.plot(x, intercept + slope * x, 'r', label=f'Linear Regression: y = {intercept:.2f} + {slope:.2f}x')
-    ax.set_title(f"Scatter Plot with {correlation_type} Correlation and Linear Regression")
-    ax.legend()
-
-    st.pyplot(fig)
-
-    # Display results
-    st.write(f"{correlation_type} Correlation Coefficient: {corr:.4f}")
-    st.write(f"P-value: {p_value:.4f}")
-    st.write(f"Linear Regression: y = {intercept:.2f} + {slope:.2f}x")
-    st.write(f"R-squared: {r_value**2:.4f}")
-    st.write(f"Regression P-value: {p_value_reg:.4f}")
-    st.write(f"Standard Error: {std_err:.4f}")
+import os
+
+import streamlit as st
+import numpy as np
+import matplotlib.pyplot as plt
+import seaborn as sns
+from scipy.stats import pearsonr, spearmanr, linregress
+from demos.cache import seed_input
+from demos.correlation_engine import permutation_p_value
+from demos.distributions import get_distribution
+from demos.executor import correlation_bootstrap_plan, permutation_plan, run_chunks, stream_chunks
+from demos.figures import render_png, show_stage_figure
+from demos.progressive import progressive_enabled, stream_stage
+from demos.stages import Stage, StageGraph
+
+# Cap on resampled values per test (permutations or bootstrap resamples x sample size), which keeps
+# each test to about a second at the largest samples; overridable from the environment
+MAX_RESAMPLED_VALUES = int(os.environ.get("STATS_APP_MAX_RESAMPLED_VALUES", 20_000_000))
+
+# With progressive rendering the tests run as background jobs that draw their histograms as they go,
+# so the cap allows 10^5 permutations or resamples at the largest sample size
+MAX_PROGRESSIVE_RESAMPLED_VALUES = int(os.environ.get("STATS_APP_MAX_PROGRESSIVE_RESAMPLED_VALUES", 10 ** 9))
+
+# Permutation and bootstrap counts offered in the sidebar, where the sample size allows them
+RESAMPLE_COUNTS = (1000, 10000, 100000)
+
+
+def show():
+    st.title("Correlation and Regression Demonstration")
+    st.sidebar.title("Settings")
+
+    # User inputs from the sidebar
+    mode = st.sidebar.selectbox("Mode:", ("Asymptotic inference", "Resampling inference"))
+    dist_type = st.sidebar.selectbox("Choose the distribution for sample data:", ("Normal", "Uniform"))
+    sample_size = st.sidebar.slider("Sample size (n):", min_value=10, max_value=10000, value=100)
+    correlation_type = st.sidebar.selectbox("Choose the type of correlation:", ("Pearson", "Spearman"))
+    if mode == "Resampling inference":
+        options = resample_options(sample_size, MAX_PROGRESSIVE_RESAMPLED_VALUES if progressive_enabled()
+                                   else MAX_RESAMPLED_VALUES)
+        num_permutations = st.sidebar.select_slider("Number of permutations:", options=options,
+                                                    value=min(10000, options[-1]))
+        num_resamples = st.sidebar.select_slider("Number of bootstrap resamples:", options=options,
+                                                 value=min(10000, options[-1]))
+        confidence_level = st.sidebar.slider("Bootstrap confidence level (%):", min_value=80, max_value=99, value=95)
+
+    # Parameters for the original distribution
+    if dist_type == "Normal":
+        mean_x = st.sidebar.number_input("Normal distribution for X - mean:", value=0.0)
+        std_dev_x = st.sidebar.number_input("Normal distribution for X - standard deviation:", value=1.0)
+        mean_y = st.sidebar.number_input("Normal distribution for Y - mean:", value=0.0)
+        std_dev_y = st.sidebar.number_input("Normal distribution for Y - standard deviation:", value=1.0)
+    elif dist_type == "Uniform":
+        low_x = st.sidebar.number_input("Uniform distribution for X - lower bound:", value=0.0)
+        high_x = st.sidebar.number_input("Uniform distribution for X - upper bound:", value=1.0)
+        low_y = st.sidebar.number_input("Uniform distribution for Y - lower bound:", value=0.0)
+        high_y = st.sidebar.number_input("Uniform distribution for Y - upper bound:", value=1.0)
+    seed = seed_input()
+
+    # Generate sample data
+    if dist_type == "Normal":
+        params_x = {'mean': mean_x, 'std_dev': std_dev_x}
+        params_y = {'mean': mean_y, 'std_dev': std_dev_y}
+    elif dist_type == "Uniform":
+        params_x = {'low': low_x, 'high': high_x}
+        params_y = {'low': low_y, 'high': high_y}
+
+    dist_x = get_distribution(dist_type, **params_x)
+    dist_y = get_distribution(dist_type, **params_y)
+    inputs = correlation_inputs(dist_x, dist_y, sample_size, correlation_type, seed)
+    run = CORRELATION_STAGES.run(inputs, targets=("statistic", "figure"))
+    result = correlation_result(run)
+    corr, p_value = result['corr'], result['p_value']
+    slope, intercept, r_value = result['slope'], result['intercept'], result['r_value']
+    p_value_reg, std_err = result['regression_p_value'], result['std_err']
+
+    # Plotting
+    show_stage_figure("correlation_regression", run)
+
+    # Display results
+    st.write(f"{correlation_type} Correlation Coefficient: {corr:.4f}")
+    st.write(f"P-value: {p_value:.4f}")
+    st.write(f"Linear Regression: y = {intercept:.2f} + {slope:.2f}x")
+    st.write(f"R-squared: {r_value**2:.4f}")
+    st.write(f"Regression P-value: {p_value_reg:.4f}")
+    st.write(f"Standard Error: {std_err:.4f}")
+
+    if mode == "Resampling inference":
+        inputs.update(num_permutations=num_permutations, num_resamples=num_resamples,
+                      confidence_level=confidence_level)
+        show_resampling(inputs, run)
+
+
+# Counts whose resampled values fit MAX_RESAMPLED_VALUES at this sample size; when not even the
+# smallest does, the largest count that fits
+def resample_options(sample_size, max_values=MAX_RESAMPLED_VALUES):
+    options = [count for count in RESAMPLE_COUNTS if count * sample_size <= max_values]
+    return options or [max(1, max_values // sample_size)]
+
+
+def draw_x(dist_x, sample_size, rng):
+    return dist_x.rvs(rng, sample_size)
+
+
+def draw_y(dist_y, sample_size, rng):
+    return dist_y.rvs(rng, sample_size)
+
+
+def correlate(correlation_type, x, y):
+    # Compute correlation
+    if correlation_type == "Pearson":
+        corr, p_value = pearsonr(x, y)
+    elif correlation_type == "Spearman":
+        corr, p_value = spearmanr(x, y)
+    else:
+        raise ValueError(f"Unknown correlation type: {correlation_type!r}")
+
+    # Perform linear regression
+    slope, intercept, r_value, p_value_reg, std_err = linregress(x, y)
+    return {'corr': corr, 'p_value': p_value, 'slope': slope, 'intercept': intercept, 'r_value': r_value,
+            'regression_p_value': p_value_reg, 'std_err': std_err}
+
+
+def plot_scatter(correlation_type, x, y, statistic):
+    slope, intercept = statistic['slope'], statistic['intercept']
+    fig, ax = plt.subplots(figsize=(10, 6))
+    sns.scatterplot(x=x, y=y, ax=ax)
+    ax.plot(x, intercept + slope * x, 'r', label=f'Linear Regression: y = {intercept:.2f} + {slope:.2f}x')
+    ax.set_title(f"Scatter Plot with {correlation_type} Correlation and Linear Regression")
+    ax.legend()
+    return render_png(fig)
+
+
+# Permutation null distribution and bootstrap distribution of the coefficient, in executor chunks
+def permute(correlation_type, num_permutations, x, y, rng):
+    return run_chunks(*permutation_plan(x, y, correlation_type, num_permutations, rng.bit_generator.seed_seq)).stats
+
+
+def permute_chunks(correlation_type, num_permutations, x, y, rng):
+    for done, total, merged in stream_chunks(*permutation_plan(x, y, correlation_type, num_permutations,
+                                                               rng.bit_generator.seed_seq)):
+        yield done, total, merged.stats
+
+
+def resample(correlation_type, num_resamples, x, y, rng):
+    return run_chunks(*correlation_bootstrap_plan(x, y, correlation_type, num_resamples,
+                                                  rng.bit_generator.seed_seq)).stats
+
+
+def resample_chunks(correlation_type, num_resamples, x, y, rng):
+    for done, total, merged in stream_chunks(*correlation_bootstrap_plan(x, y, correlation_type, num_resamples,
+                                                                         rng.bit_generator.seed_seq)):
+        yield done, total, merged.stats
+
+
+def resampling_statistics(confidence_level, statistic, permutation, bootstrap):
+    tail = (100 - confidence_level) / 200
+    ci_lower, ci_upper = np.quantile(bootstrap, [tail, 1 - tail])
+    return {'ci_lower': ci_lower, 'ci_upper': ci_upper,
+            'permutation_p_value': permutation_p_value(statistic['corr'], permutation)}
+
+
+# Both resampling histograms; a test still running is drawn from its statistics so far, the
+# bootstrap panel left empty until its turn, and the interval marked once it is known
+def resampling_figure(corr, permuted, resampled, interval=None):
+    fig, axes = plt.subplots(1, 2, figsize=(14, 6))
+    axes[0].hist(permuted, bins=50, alpha=0.6, color='g', edgecolor='black')
+    axes[0].axvline(corr, color='r', linestyle='--', label=f'Observed: {corr:.4f}')
+    axes[0].axvline(-corr, color='r', linestyle=':', label=f'Mirrored: {-corr:.4f}')
+    axes[0].set_title(f"Permutation Distribution ({permuted.size:,} permutations)")
+    axes[0].legend()
+
+    if resampled is None:
+        axes[1].set_title("Bootstrap Distribution")
+        return fig
+    axes[1].hist(resampled, bins=50, alpha=0.6, color='b', edgecolor='black')
+    axes[1].set_title(f"Bootstrap Distribution ({resampled.size:,} resamples)")
+    if interval is not None:
+        axes[1].axvline(interval['ci_lower'], color='r', linestyle='--', label=f"CI Lower: {interval['ci_lower']:.4f}")
+        axes[1].axvline(interval['ci_upper'], color='r', linestyle='--', label=f"CI Upper: {interval['ci_upper']:.4f}")
+        axes[1].legend()
+    return fig
+
+
+def plot_resampling(statistic, permutation, bootstrap, resampling):
+    return render_png(resampling_figure(statistic['corr'], permutation, bootstrap, resampling))
+
+
+CORRELATION_STAGES = StageGraph("correlation_regression", [
+    Stage("x", draw_x, kind="sample", reads=("dist_x", "sample_size"), stream="correlation_regression.x"),
+    Stage("y", draw_y, kind="sample", reads=("dist_y", "sample_size"), stream="correlation_regression.y"),
+    Stage("statistic", correlate, reads=("correlation_type",), after=("x", "y")),
+    Stage("figure", plot_scatter, reads=("correlation_type",), after=("x", "y", "statistic")),
+    Stage("permutation", permute, kind="sample", reads=("correlation_type", "num_permutations"), after=("x", "y"),
+          stream="correlation_regression.permutation", chunks=permute_chunks),
+    Stage("bootstrap", resample, kind="sample", reads=("correlation_type", "num_resamples"), after=("x", "y"),
+          stream="correlation_regression.bootstrap", chunks=resample_chunks),
+    Stage("resampling", resampling_statistics, kind="statistic", reads=("confidence_level",),
+          after=("statistic", "permutation", "bootstrap")),
+    Stage("resampling_figure", plot_resampling, kind="figure",
+          after=("statistic", "permutation", "bootstrap", "resampling")),
+])
+
+RESAMPLING_TARGETS = ("statistic", "permutation", "bootstrap", "resampling")
+
+
+def correlation_inputs(dist_x, dist_y, sample_size, correlation_type, seed, num_permutations=None,
+                       num_resamples=None, confidence_level=None):
+    return {'dist_x': dist_x, 'dist_y': dist_y, 'sample_size': sample_size, 'correlation_type': correlation_type,
+            'seed': seed, 'num_permutations': num_permutations, 'num_resamples': num_resamples,
+            'confidence_level': confidence_level}
+
+
+def correlation_result(run):
+    return dict(run['statistic'], x=run['x'], y=run['y'])
+
+
+def compute(dist_x, dist_y, sample_size, correlation_type, seed):
+    run = CORRELATION_STAGES.run(correlation_inputs(dist_x, dist_y, sample_size, correlation_type, seed),
+                                 targets=("statistic",))
+    return correlation_result(run)
+
+
+# Permutation null distribution and bootstrap interval for the correlation coefficient, on top of
+# the asymptotic results for the same data
+def compute_resampling(dist_x, dist_y, sample_size, correlation_type, num_permutations, num_resamples,
+                       confidence_level, seed):
+    run = CORRELATION_STAGES.run(correlation_inputs(dist_x, dist_y, sample_size, correlation_type, seed,
+                                                    num_permutations, num_resamples, confidence_level),
+                                 targets=RESAMPLING_TARGETS)
+    return resampling_result(run)
+
+
+def resampling_result(run):
+    return dict(correlation_result(run), permuted=run['permutation'], resampled=run['bootstrap'],
+                **run['resampling'])
+
+
+def show_resampling(inputs, run):
+    corr = run['statistic']['corr']
+
+    # Plotting; with progressive rendering the histograms fill in as the chunks come back
+    placeholder = st.empty()
+    stream_stage(CORRELATION_STAGES, inputs, "permutation", placeholder,
+                 lambda permuted: render_png(resampling_figure(corr, permuted, None)), previous=run)
+    run = CORRELATION_STAGES.run(inputs, targets=("permutation",), previous=run)
+    stream_stage(CORRELATION_STAGES, inputs, "bootstrap", placeholder,
+                 lambda resampled: render_png(resampling_figure(corr, run['permutation'], resampled)), previous=run)
+    run = CORRELATION_STAGES.run(inputs, targets=RESAMPLING_TARGETS + ("resampling_figure",), previous=run)
+    result = resampling_result(run)
+    show_stage_figure("correlation_regression.resampling", run, "resampling_figure", container=placeholder)
+
+    # Display results
+    st.write(f"Permutation P-value: {result['permutation_p_value']:.4f}")
+    st.write(f"Bootstrap {inputs['confidence_level']}% Confidence Interval: "
+             f"[{result['ci_lower']:.4f}, {result['ci_upper']:.4f}]")
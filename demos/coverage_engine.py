@@ -0,0 +1,54 @@
+import numpy as np
+from scipy.stats import norm, t
+
+# Working-set size for one (replicates, n) block of draws
+DEFAULT_MEMORY_BUDGET = 64 * 1024 ** 2
+
+# Quantiles kept from each interval-width distribution (whiskers, quartiles, median)
+WIDTH_QUANTILES = (0.01, 0.25, 0.5, 0.75, 0.99)
+
+
+# One ppf lookup per configuration, shared by every replicate
+def critical_value(sample_size, confidence_level, use_z=False):
+    alpha = 1 - confidence_level
+    if use_z:
+        return norm.ppf(1 - alpha / 2)
+    return t.ppf(1 - alpha / 2, df=sample_size - 1)
+
+
+# Coverage and width of the mean interval over `num_replicates` samples of size n, drawn as 2-D blocks
+def simulate_coverage(dist, sample_size, num_replicates, confidence_level, rng, use_z=False,
+                      memory_budget=DEFAULT_MEMORY_BUDGET):
+    score = critical_value(sample_size, confidence_level, use_z)
+    widths = np.empty(num_replicates, dtype=np.float64)
+    covered = 0
+
+    # Each row holds the draws plus a same-sized temporary for the deviations
+    rows = max(1, int(memory_budget // (2 * sample_size * np.dtype(np.float64).itemsize)))
+    for start in range(0, num_replicates, rows):
+        stop = min(start + rows, num_replicates)
+        samples = dist.rvs(rng, (stop - start, sample_size))
+        means = samples.mean(axis=1)
+        stds = samples.std(axis=1, ddof=1)
+        margins = score * stds / np.sqrt(sample_size)
+        covered += np.count_nonzero(np.abs(means - dist.mean) <= margins)
+        widths[start:stop] = 2 * margins
+
+    coverage = covered / num_replicates
+    return {
+        'sample_size': sample_size,
+        'coverage': coverage,
+        'standard_error': np.sqrt(coverage * (1 - coverage) / num_replicates),
+        'mean_width': widths.mean(),
+        'width_quantiles': np.quantile(widths, WIDTH_QUANTILES),
+    }
+
+
+# Coverage across a grid of sample sizes; z is used above `z_above` when given, t otherwise
+def coverage_grid(dist, sample_sizes, num_replicates, confidence_level, rng, z_above=None,
+                  memory_budget=DEFAULT_MEMORY_BUDGET):
+    return [
+        simulate_coverage(dist, n, num_replicates, confidence_level, rng,
+                          use_z=z_above is not None and n > z_above, memory_budget=memory_budget)
+        for n in sample_sizes
+    ]
@@ -0,0 +1,201 @@
+import numpy as np
+from scipy.signal import oaconvolve
+
+# Moving-average centres per cumulative-sum block
+BLOCK_CENTERS = 2 ** 16
+
+# Smallest number of slots an incremental buffer starts with; capacity doubles when full
+MIN_CAPACITY = 1024
+
+
+# Centred moving-average weights used by statsmodels' seasonal_decompose: a plain mean over an
+# odd period, a 2 x period average (half weights at both ends) over an even one
+def trend_filter(period):
+    if period % 2 == 0:
+        weights = np.ones(period + 1)
+        weights[[0, -1]] = 0.5
+    else:
+        weights = np.ones(period)
+    return weights / period
+
+
+# Centred moving averages of every full window in `values` from a float64 running sum. Window sums
+# are differences of two shifted slices of it; centring on the first value keeps it small.
+def _window_means(values, period):
+    offset = float(values[0])
+    shifted = np.subtract(values, offset, dtype=np.float64)
+    sums = np.empty(values.size + 1)
+    sums[0] = 0.0
+    np.cumsum(shifted, out=sums[1:])
+    if period % 2 == 0:
+        window = sums[period:values.size] - sums[1:values.size - period + 1]
+        window += 0.5 * (shifted[:values.size - period] + shifted[period:])
+    else:
+        window = sums[period:] - sums[:values.size - period + 1]
+    window /= period
+    window += offset
+    return window
+
+
+# Centred moving average of `values`, NaN for the half-window at both ends like statsmodels.
+# "cumsum" runs the running sum over blocks of BLOCK_CENTERS windows that overlap by one window,
+# which keeps the temporaries in cache and the rounding error independent of the series length.
+# "fft" is an overlap-add convolution: slower, but accurate to a few ulps.
+def centered_moving_average(values, period, method="cumsum"):
+    values = np.asarray(values)
+    half = period // 2
+    trend = np.full(values.shape, np.nan, dtype=values.dtype)
+    num_centers = values.size - 2 * half
+    if num_centers <= 0:
+        return trend
+    if method == "cumsum":
+        for begin in range(0, num_centers, BLOCK_CENTERS):
+            end = min(begin + BLOCK_CENTERS, num_centers)
+            trend[half + begin:half + end] = _window_means(values[begin:end + 2 * half], period)
+    elif method == "fft":
+        trend[half:values.size - half] = oaconvolve(values.astype(np.float64), trend_filter(period), mode='valid')
+    else:
+        raise ValueError(f"Unknown moving-average method: {method!r}")
+    return trend
+
+
+def detrend(values, trend, model):
+    if model == "additive":
+        return values - trend
+    if model == "multiplicative":
+        return values / trend
+    raise ValueError(f"Unknown decomposition model: {model!r}")
+
+
+# Add the column sums and counts of the finite values in `block` (cycles x phases) to the
+# per-phase totals from `first_phase` on; the NaN mask is only built when a column sum is not finite
+def _add_cycles(sums, counts, block, first_phase):
+    if block.size == 0:
+        return
+    total = block.sum(axis=0, dtype=np.float64)
+    count = block.shape[0]
+    if not np.isfinite(total).all():
+        finite = np.isfinite(block)
+        total = np.where(finite, block, 0.0).sum(axis=0, dtype=np.float64)
+        count = finite.sum(axis=0)
+    sums[first_phase:first_phase + block.shape[1]] += total
+    counts[first_phase:first_phase + block.shape[1]] += count
+
+
+# Per-phase sums and counts of the finite values in `segment`, whose first value sits at index
+# `start` of the series; phase is the index modulo `period`. The whole cycles in the middle are a
+# reshaped (cycles, period) view, so the reduction is one strided sum down the cycle axis.
+def phase_sums(segment, start, period):
+    segment = np.asarray(segment)
+    sums = np.zeros(period)
+    counts = np.zeros(period, dtype=np.int64)
+    first_phase = start % period
+    lead = min(-start % period, segment.size)
+    _add_cycles(sums, counts, segment[:lead].reshape(1, -1), first_phase)
+    cycles = (segment.size - lead) // period
+    body_end = lead + cycles * period
+    _add_cycles(sums, counts, segment[lead:body_end].reshape(cycles, period), 0)
+    _add_cycles(sums, counts, segment[body_end:].reshape(1, -1), 0)
+    return sums, counts
+
+
+# Seasonal indices from per-phase sums: the phase means, centred to average 0 (additive) or 1
+def seasonal_indices(sums, counts, model):
+    averages = sums / np.maximum(counts, 1)
+    if model == "additive":
+        return averages - averages.mean()
+    return averages / averages.mean()
+
+
+def seasonal_component(indices, num_values, dtype=np.float64):
+    cycles = -(-num_values // indices.size)
+    return np.tile(indices.astype(dtype), cycles)[:num_values]
+
+
+# Classical decomposition of a plain NumPy buffer, matching seasonal_decompose(two_sided=True).
+# float32 input stays float32 in the outputs; accumulations run in float64.
+def decompose(values, period, model="additive", method="cumsum"):
+    values = np.asarray(values)
+    if not np.issubdtype(values.dtype, np.floating):
+        values = values.astype(np.float64)
+    if values.size < 2 * period:
+        raise ValueError(f"Need at least two full periods ({2 * period} values), got {values.size}")
+    trend = centered_moving_average(values, period, method)
+    detrended = detrend(values, trend, model)
+    half = period // 2
+    sums, counts = phase_sums(detrended[half:values.size - half], half, period)
+    indices = seasonal_indices(sums, counts, model)
+    seasonal = seasonal_component(indices, values.size, values.dtype)
+    return {
+        'trend': trend,
+        'seasonal': seasonal,
+        'resid': detrend(detrended, seasonal, model),
+        'seasonal_indices': indices,
+    }
+
+
+# Decomposition that grows as points are appended. Each append computes the moving average only
+# for the centres that became complete, and folds their detrended values into the per-phase sums,
+# so the cost is O(points appended + period) however long the series already is.
+class IncrementalDecomposition:
+    __slots__ = ('period', 'model', 'size', 'values', 'trend', 'sums', 'counts')
+
+    def __init__(self, period, model="additive", dtype=np.float64):
+        if model not in ("additive", "multiplicative"):
+            raise ValueError(f"Unknown decomposition model: {model!r}")
+        self.period = period
+        self.model = model
+        self.size = 0
+        self.values = np.empty(max(MIN_CAPACITY, 2 * period), dtype=dtype)
+        self.trend = np.full(self.values.size, np.nan, dtype=dtype)
+        self.sums = np.zeros(period)
+        self.counts = np.zeros(period, dtype=np.int64)
+
+    def _reserve(self, size):
+        if size <= self.values.size:
+            return
+        capacity = max(size, 2 * self.values.size)
+        values = np.empty(capacity, dtype=self.values.dtype)
+        values[:self.size] = self.values[:self.size]
+        trend = np.full(capacity, np.nan, dtype=self.trend.dtype)
+        trend[:self.size] = self.trend[:self.size]
+        self.values, self.trend = values, trend
+
+    def append(self, new_values):
+        new_values = np.asarray(new_values, dtype=self.values.dtype).ravel()
+        half = self.period // 2
+        old_size, size = self.size, self.size + new_values.size
+        self._reserve(size)
+        self.values[old_size:size] = new_values
+        self.size = size
+
+        # Centres from (old_size - half) to (size - half) now have a full window on both sides;
+        # the window around them reaches back at most `half` values before the first new centre
+        first = max(half, old_size - half)
+        stop = size - half
+        if stop > first:
+            window = self.values[first - half:stop + half]
+            trend = centered_moving_average(window, self.period)[half:window.size - half]
+            self.trend[first:stop] = trend
+            detrended = detrend(self.values[first:stop], trend, self.model)
+            sums, counts = phase_sums(detrended, first, self.period)
+            self.sums += sums
+            self.counts += counts
+        return self
+
+    def seasonal_indices(self):
+        return seasonal_indices(self.sums, self.counts, self.model)
+
+    # Full components of the series so far; the residual depends on the current seasonal
+    # indices, so it is derived here rather than stored
+    def components(self):
+        values = self.values[:self.size]
+        trend = self.trend[:self.size]
+        indices = self.seasonal_indices()
+        seasonal = seasonal_component(indices, self.size, values.dtype)
+        return {
+            'trend': trend,
+            'seasonal': seasonal,
+            'resid': detrend(detrend(values, trend, self.model), seasonal, self.model),
+            'seasonal_indices': indices,
+        }
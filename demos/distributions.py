@@ -0,0 +1,421 @@
+import os
+import secrets
+import zlib
+
+import numpy as np
+import streamlit as st
+from scipy import stats
+from scipy.special import gammaln, xlogy
+from streamlit import runtime
+
+# Seed used when there is no Streamlit session to hold one
+HEADLESS_SEED = int(os.environ.get("STATS_APP_SEED", 0))
+
+# Draws generated at a time by families whose numpy generator cannot write into `out`
+RVS_BLOCK_SIZE = 1 << 16
+
+
+# Loader's saddle-point terms for binomial and Poisson masses ("Fast and accurate computation of
+# binomial probabilities", 2000). They avoid the cancellation in differences of log-factorials,
+# which at n or lambda around 1e12 leaves only a few correct digits.
+
+# log(x!) minus its Stirling approximation; a series above 15, exact below
+def _stirlerr(x):
+    x = np.asarray(x, dtype=np.float64)
+    small = x <= 15
+    exact = np.where(small, x, 1.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        direct = gammaln(exact + 1) - (exact + 0.5) * np.log(exact) + exact - 0.5 * np.log(2 * np.pi)
+    inverse_square = 1 / np.where(small, 16.0, x) ** 2
+    series = (1 / 12 - (1 / 360 - (1 / 1260 - (1 / 1680 - inverse_square / 1188) * inverse_square)
+                        * inverse_square) * inverse_square) / np.where(small, 16.0, x)
+    return np.where(small, direct, series)
+
+
+# Deviance term x log(x / mean) + mean - x, by series when x is close to the mean
+def _bd0(x, mean):
+    x = np.asarray(x, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        direct = xlogy(x, x / mean) + mean - x
+        v = (x - mean) / (x + mean)
+    near = np.abs(x - mean) < 0.1 * (x + mean)
+    v = np.where(near, v, 0.0)
+    total = (x - mean) * v
+    term = 2 * x * v
+    for j in range(1, 30):
+        term = term * v * v
+        total = total + term / (2 * j + 1)
+    return np.where(near, total, direct)
+
+
+class Distribution:
+    name = None
+    discrete = False
+
+    def __init__(self, **params):
+        self.params = params
+
+    def __repr__(self):
+        args = ", ".join(f"{name}={value!r}" for name, value in self.params.items())
+        return f"{type(self).__name__}({args})"
+
+    # Hashable identity used in cache keys
+    @property
+    def key(self):
+        return (self.name, tuple(sorted(self.params.items())))
+
+    # Dtype of draws in the compact precision mode
+    compact_dtype = np.dtype(np.float32)
+
+    # Batched draws; `size` may be an int or a shape such as (num_samples, sample_size)
+    def rvs(self, rng, size):
+        raise NotImplementedError
+
+    # Draws written into the preallocated `out`, in its dtype
+    def rvs_into(self, rng, out):
+        out[...] = self.rvs(rng, out.shape)
+        return out
+
+    def frozen(self):
+        raise NotImplementedError
+
+    @property
+    def mean(self):
+        raise NotImplementedError
+
+    @property
+    def var(self):
+        raise NotImplementedError
+
+    @property
+    def std(self):
+        return np.sqrt(self.var)
+
+    def pdf(self, x):
+        return self.frozen().pdf(x)
+
+    def pmf(self, x):
+        return self.frozen().pmf(x)
+
+    def logpdf(self, x):
+        return self.frozen().logpdf(x)
+
+    def logpmf(self, x):
+        return self.frozen().logpmf(x)
+
+    # pmf for discrete families, pdf otherwise, evaluated over a whole grid at once. Masses go
+    # through log space, where huge n or lambda cannot overflow the binomial coefficient or factorial.
+    def density(self, x):
+        return np.exp(self.logpmf(x)) if self.discrete else self.pdf(x)
+
+    def ppf(self, q):
+        return self.frozen().ppf(q)
+
+    # Exact mean, variance, skewness and excess kurtosis
+    def exact_moments(self):
+        return tuple(float(value) for value in self.frozen().stats(moments='mvsk'))
+
+    # Evaluation grid spanning all but `tail` of the probability mass on each side. Discrete
+    # supports wider than `num_points` values are thinned to `num_points` evenly spaced integers.
+    def grid(self, num_points=200, tail=1e-3):
+        lower, upper = self.ppf([tail, 1 - tail])
+        if self.discrete:
+            if upper - lower + 1 <= num_points:
+                return np.arange(lower, upper + 1)
+            return np.unique(np.round(np.linspace(lower, upper, num_points)))
+        return np.linspace(lower, upper, num_points)
+
+
+class Normal(Distribution):
+    name = "Normal"
+
+    def __init__(self, mean=0.0, std_dev=1.0):
+        super().__init__(mean=mean, std_dev=std_dev)
+
+    def rvs(self, rng, size):
+        return rng.normal(self.params['mean'], self.params['std_dev'], size)
+
+    # Generated in the buffer's own precision, then scaled in place
+    def rvs_into(self, rng, out):
+        rng.standard_normal(out=out, dtype=out.dtype)
+        out *= self.params['std_dev']
+        out += self.params['mean']
+        return out
+
+    def frozen(self):
+        return stats.norm(self.params['mean'], self.params['std_dev'])
+
+    # Closed form, skipping the cost of freezing a scipy distribution on every MCMC step
+    def logpdf(self, x):
+        z = (x - self.params['mean']) / self.params['std_dev']
+        return -0.5 * z * z - np.log(self.params['std_dev']) - 0.5 * np.log(2 * np.pi)
+
+    @property
+    def mean(self):
+        return self.params['mean']
+
+    @property
+    def var(self):
+        return self.params['std_dev'] ** 2
+
+
+class Uniform(Distribution):
+    name = "Uniform"
+
+    def __init__(self, low=0.0, high=1.0):
+        super().__init__(low=low, high=high)
+
+    def rvs(self, rng, size):
+        return rng.uniform(self.params['low'], self.params['high'], size)
+
+    def rvs_into(self, rng, out):
+        rng.random(out=out, dtype=out.dtype)
+        out *= self.params['high'] - self.params['low']
+        out += self.params['low']
+        return out
+
+    def frozen(self):
+        return stats.uniform(self.params['low'], self.params['high'] - self.params['low'])
+
+    @property
+    def mean(self):
+        return (self.params['low'] + self.params['high']) / 2
+
+    @property
+    def var(self):
+        return (self.params['high'] - self.params['low']) ** 2 / 12
+
+
+class Exponential(Distribution):
+    name = "Exponential"
+
+    def __init__(self, rate=1.0):
+        super().__init__(rate=rate)
+
+    def rvs(self, rng, size):
+        return rng.exponential(1 / self.params['rate'], size)
+
+    def rvs_into(self, rng, out):
+        rng.standard_exponential(out=out, dtype=out.dtype)
+        out *= 1 / self.params['rate']
+        return out
+
+    def frozen(self):
+        return stats.expon(scale=1 / self.params['rate'])
+
+    @property
+    def mean(self):
+        return 1 / self.params['rate']
+
+    @property
+    def var(self):
+        return 1 / self.params['rate'] ** 2
+
+
+class Binomial(Distribution):
+    name = "Binomial"
+    discrete = True
+
+    def __init__(self, n=10, p=0.5):
+        super().__init__(n=n, p=p)
+
+    # Counts never exceed n, so the smallest unsigned integer holding n stores them exactly
+    @property
+    def compact_dtype(self):
+        return np.min_scalar_type(int(self.params['n']))
+
+    def rvs(self, rng, size):
+        return rng.binomial(self.params['n'], self.params['p'], size)
+
+    # numpy returns int64 counts, so they are drawn a block at a time into the narrow buffer
+    def rvs_into(self, rng, out):
+        flat = out.reshape(-1)
+        for start in range(0, flat.size, RVS_BLOCK_SIZE):
+            block = flat[start:start + RVS_BLOCK_SIZE]
+            block[...] = rng.binomial(self.params['n'], self.params['p'], block.size)
+        return out
+
+    def frozen(self):
+        return stats.binom(self.params['n'], self.params['p'])
+
+    def logpmf(self, x):
+        n, p = float(self.params['n']), float(self.params['p'])
+        x = np.asarray(x, dtype=np.float64)
+        inside = (x >= 0) & (x <= n) & (x == np.floor(x))
+        interior = np.where(inside & (x > 0) & (x < n), x, 1.0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            log_mass = (_stirlerr(n) - _stirlerr(interior) - _stirlerr(n - interior)
+                        - _bd0(interior, n * p) - _bd0(n - interior, n * (1 - p))
+                        + 0.5 * np.log(n / (2 * np.pi * interior * (n - interior))))
+            log_mass = np.where(x == 0, n * np.log1p(-p), np.where(x == n, n * np.log(p), log_mass))
+        return np.where(inside, log_mass, -np.inf)
+
+    @property
+    def mean(self):
+        return self.params['n'] * self.params['p']
+
+    @property
+    def var(self):
+        return self.params['n'] * self.params['p'] * (1 - self.params['p'])
+
+
+class Poisson(Distribution):
+    name = "Poisson"
+    discrete = True
+
+    def __init__(self, lam=3.0):
+        super().__init__(lam=lam)
+
+    def rvs(self, rng, size):
+        return rng.poisson(self.params['lam'], size)
+
+    def frozen(self):
+        return stats.poisson(self.params['lam'])
+
+    def logpmf(self, x):
+        lam = float(self.params['lam'])
+        x = np.asarray(x, dtype=np.float64)
+        inside = (x >= 0) & (x == np.floor(x))
+        positive = np.where(inside & (x > 0), x, 1.0)
+        with np.errstate(divide='ignore'):
+            log_mass = -_stirlerr(positive) - _bd0(positive, lam) - 0.5 * np.log(2 * np.pi * positive)
+        log_mass = np.where(x == 0, -lam, log_mass)
+        return np.where(inside, log_mass, -np.inf)
+
+    @property
+    def mean(self):
+        return self.params['lam']
+
+    @property
+    def var(self):
+        return self.params['lam']
+
+
+class Laplace(Distribution):
+    name = "Laplace"
+
+    def __init__(self, mean=0.0, scale=1.0):
+        super().__init__(mean=mean, scale=scale)
+
+    def rvs(self, rng, size):
+        return rng.laplace(self.params['mean'], self.params['scale'], size)
+
+    def frozen(self):
+        return stats.laplace(self.params['mean'], self.params['scale'])
+
+    def logpdf(self, x):
+        return -np.abs(x - self.params['mean']) / self.params['scale'] - np.log(2 * self.params['scale'])
+
+    @property
+    def mean(self):
+        return self.params['mean']
+
+    @property
+    def var(self):
+        return 2 * self.params['scale'] ** 2
+
+
+class StudentT(Distribution):
+    name = "Student-t"
+
+    def __init__(self, df=3.0, loc=0.0, scale=1.0):
+        super().__init__(df=df, loc=loc, scale=scale)
+
+    def rvs(self, rng, size):
+        return self.params['loc'] + self.params['scale'] * rng.standard_t(self.params['df'], size)
+
+    def frozen(self):
+        return stats.t(self.params['df'], self.params['loc'], self.params['scale'])
+
+    def logpdf(self, x):
+        df, scale = self.params['df'], self.params['scale']
+        z = (x - self.params['loc']) / scale
+        constant = gammaln((df + 1) / 2) - gammaln(df / 2) - 0.5 * np.log(df * np.pi) - np.log(scale)
+        return constant - (df + 1) / 2 * np.log1p(z * z / df)
+
+    @property
+    def mean(self):
+        return self.params['loc'] if self.params['df'] > 1 else np.nan
+
+    @property
+    def var(self):
+        df = self.params['df']
+        return self.params['scale'] ** 2 * df / (df - 2) if df > 2 else np.inf
+
+
+# Two normal components with a shared standard deviation; `weight` goes to the first
+class NormalMixture(Distribution):
+    name = "Normal Mixture"
+
+    def __init__(self, mean1=-1.0, mean2=1.0, std_dev=1.0, weight=0.5):
+        super().__init__(mean1=mean1, mean2=mean2, std_dev=std_dev, weight=weight)
+
+    def _components(self):
+        return (stats.norm(self.params['mean1'], self.params['std_dev']),
+                stats.norm(self.params['mean2'], self.params['std_dev']))
+
+    def rvs(self, rng, size):
+        first = rng.random(size) < self.params['weight']
+        means = np.where(first, self.params['mean1'], self.params['mean2'])
+        return means + self.params['std_dev'] * rng.standard_normal(size)
+
+    def pdf(self, x):
+        first, second = self._components()
+        weight = self.params['weight']
+        return weight * first.pdf(x) + (1 - weight) * second.pdf(x)
+
+    def logpdf(self, x):
+        first = Normal(self.params['mean1'], self.params['std_dev'])
+        second = Normal(self.params['mean2'], self.params['std_dev'])
+        weight = self.params['weight']
+        return np.logaddexp(np.log(weight) + first.logpdf(x), np.log1p(-weight) + second.logpdf(x))
+
+    def cdf(self, x):
+        first, second = self._components()
+        weight = self.params['weight']
+        return weight * first.cdf(x) + (1 - weight) * second.cdf(x)
+
+    # No closed form; invert the cdf on a grid covering both components
+    def ppf(self, q):
+        low = min(self.params['mean1'], self.params['mean2']) - 10 * self.params['std_dev']
+        high = max(self.params['mean1'], self.params['mean2']) + 10 * self.params['std_dev']
+        x = np.linspace(low, high, 4001)
+        return np.interp(q, self.cdf(x), x)
+
+    @property
+    def mean(self):
+        weight = self.params['weight']
+        return weight * self.params['mean1'] + (1 - weight) * self.params['mean2']
+
+    @property
+    def var(self):
+        weight = self.params['weight']
+        spread = (self.params['mean1'] - self.params['mean2']) ** 2
+        return self.params['std_dev'] ** 2 + weight * (1 - weight) * spread
+
+
+DISTRIBUTIONS = {cls.name: cls for cls in (Normal, Uniform, Exponential, Binomial, Poisson, Laplace, StudentT,
+                                           NormalMixture)}
+
+
+def get_distribution(name, **params):
+    try:
+        cls = DISTRIBUTIONS[name]
+    except KeyError:
+        raise ValueError(f"Unknown distribution: {name!r}") from None
+    return cls(**params)
+
+
+# Seed drawn once per browser session so reruns are reproducible but sessions differ. Scripts
+# and batch jobs have no session, so they get a fixed seed (STATS_APP_SEED, default 0) instead.
+def session_seed():
+    if not runtime.exists():
+        return HEADLESS_SEED
+    if "session_seed" not in st.session_state:
+        st.session_state["session_seed"] = secrets.randbits(31)
+    return st.session_state["session_seed"]
+
+
+# Independent PCG64 stream for one named draw; the same (name, seed) always replays the same values
+def stream(name, seed):
+    return np.random.Generator(np.random.PCG64(np.random.SeedSequence([seed, zlib.crc32(name.encode())])))
@@ -0,0 +1,307 @@
+import contextlib
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from demos.bootstrap_engine import bootstrap_distribution
+from demos.correlation_engine import bootstrap_distribution as correlation_bootstrap, permutation_distribution
+from demos.moments import Moments
+from demos.rendering import Histogram
+from demos.running_mean_engine import sample_sums
+
+# Worker processes for the shared pool, overridable from the environment; 1 runs in-process
+DEFAULT_WORKERS = int(os.environ.get("STATS_APP_WORKERS", os.cpu_count() or 1))
+
+# Draws per chunk. Chunking depends only on the problem size, never on the worker count,
+# so each chunk sees the same child seed and the merged result is bit-identical.
+DEFAULT_CHUNK_DRAWS = 2 ** 20
+
+# "compact" draws float32 (or the smallest integer type that fits) into reused buffers
+PRECISIONS = ("float64", "compact")
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+# Long-lived pool; spawned workers stay safe next to the Streamlit server's threads
+def get_pool(workers):
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+            _pool_workers = workers
+        return _pool
+
+
+def chunk_sizes(total, chunk_units):
+    return [min(chunk_units, total - start) for start in range(0, total, chunk_units)]
+
+
+def _merge(left, right):
+    if isinstance(left, tuple):
+        return tuple(_merge(a, b) for a, b in zip(left, right))
+    return left.merge(right)
+
+
+# Run `task(units, seed_sequence)` over fixed-size chunks of `total` units and merge the partial
+# aggregates in chunk order, yielding (chunks done, number of chunks, merged so far) after each.
+# `seed` is a SeedSequence (or an int) spawned once per chunk. The merged value is updated in
+# place by later chunks. Closing the generator early cancels the chunks not yet started.
+def stream_chunks(task, total, chunk_units, seed, workers=None):
+    workers = DEFAULT_WORKERS if workers is None else workers
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    sizes = chunk_sizes(total, max(1, chunk_units))
+    seeds = seed.spawn(len(sizes))
+    futures = []
+    if workers <= 1 or len(sizes) == 1:
+        # Lazy, so nothing past the current chunk is computed
+        partials = map(task, sizes, seeds)
+    else:
+        pool = get_pool(workers)
+        futures = [pool.submit(task, size, chunk_seed) for size, chunk_seed in zip(sizes, seeds)]
+        partials = (future.result() for future in futures)
+    merged = None
+    try:
+        for done, partial in enumerate(partials, 1):
+            merged = partial if merged is None else _merge(merged, partial)
+            yield done, len(sizes), merged
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def run_chunks(task, total, chunk_units, seed, workers=None):
+    for _, _, merged in stream_chunks(task, total, chunk_units, seed, workers):
+        pass
+    return merged
+
+
+# Histogram plus moments of one stream of values
+class Aggregate:
+    __slots__ = ('histogram', 'moments')
+
+    def __init__(self, lower, upper, bins=30):
+        self.histogram = Histogram(lower, upper, bins)
+        self.moments = Moments()
+
+    def update(self, values):
+        self.histogram.update(values)
+        self.moments.update(values)
+        return self
+
+    def merge(self, other):
+        self.histogram.merge(other.histogram)
+        self.moments.merge(other.moments)
+        return self
+
+
+# Per-sample sums in sample order; chunks are contiguous runs of samples
+class SampleSums:
+    __slots__ = ('sums',)
+
+    def __init__(self, sums):
+        self.sums = sums
+
+    def merge(self, other):
+        self.sums = np.concatenate([self.sums, other.sums])
+        return self
+
+
+# Resampled statistics in resample order; chunks are contiguous runs of resamples
+class Resamples:
+    __slots__ = ('stats',)
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def merge(self, other):
+        self.stats = np.concatenate([self.stats, other.stats])
+        return self
+
+
+def _generator(seed_sequence):
+    return np.random.Generator(np.random.PCG64(seed_sequence))
+
+
+# Scratch arrays shared by every chunk and rerun of the process, by dtype. A chunk borrows one
+# for the draws it reduces and hands it back, so steady-state reruns allocate no draw buffers;
+# the pool holds at most one buffer per chunk that ran concurrently.
+_scratch = {}
+_scratch_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def scratch_buffer(size, dtype):
+    dtype = np.dtype(dtype)
+    with _scratch_lock:
+        free = _scratch.setdefault(dtype, [])
+        buffer = free.pop() if free else None
+    if buffer is None or buffer.size < size:
+        buffer = np.empty(size, dtype)
+    try:
+        yield buffer[:size]
+    finally:
+        with _scratch_lock:
+            _scratch[dtype].append(buffer)
+
+
+# Range covering all but about `tail` of the distribution, padded to whole values when discrete
+def support_range(dist, tail):
+    lower, upper = dist.ppf(tail), dist.ppf(1 - tail)
+    if dist.discrete:
+        return lower - 0.5, upper + 0.5
+    return lower, upper
+
+
+# Chunk of independent draws, kept only as their aggregate over a fixed range
+class DrawsTask:
+    def __init__(self, dist, draws_range, bins=30):
+        self.dist = dist
+        self.draws_range = draws_range
+        self.bins = bins
+
+    def __call__(self, num_draws, seed_sequence):
+        return Aggregate(*self.draws_range, self.bins).update(self.dist.rvs(_generator(seed_sequence), num_draws))
+
+
+# CLT chunk: aggregates of the raw draws and of the sample means
+class SampleMeansTask:
+    def __init__(self, dist, sample_size, draws_range, means_range, bins=30, precision="float64"):
+        self.dist = dist
+        self.sample_size = sample_size
+        self.draws_range = draws_range
+        self.means_range = means_range
+        self.bins = bins
+        self.precision = precision
+
+    def __call__(self, num_samples, seed_sequence):
+        rng = _generator(seed_sequence)
+        if self.precision == "float64":
+            draws = self.dist.rvs(rng, num_samples * self.sample_size)
+            return self._aggregate(draws, np.empty(num_samples))
+        # Means are accumulated in float64 whatever the draws' dtype
+        with scratch_buffer(num_samples * self.sample_size, self.dist.compact_dtype) as draws, \
+                scratch_buffer(num_samples, np.float64) as means:
+            return self._aggregate(self.dist.rvs_into(rng, draws), means)
+
+    def _aggregate(self, draws, means):
+        draws_aggregate = Aggregate(*self.draws_range, self.bins).update(draws)
+        draws.reshape(means.size, self.sample_size).mean(axis=1, dtype=np.float64, out=means)
+        means_aggregate = Aggregate(*self.means_range, self.bins).update(means)
+        return draws_aggregate, means_aggregate
+
+
+# Law of large numbers chunk: the sum of each sample
+class SampleSumsTask:
+    def __init__(self, dist, sample_size, precision="float64"):
+        self.dist = dist
+        self.sample_size = sample_size
+        self.precision = precision
+
+    def __call__(self, num_samples, seed_sequence):
+        rng = _generator(seed_sequence)
+        if self.precision == "float64":
+            return SampleSums(sample_sums(lambda size: self.dist.rvs(rng, size), self.sample_size, num_samples))
+        # sample_sums adds each block up in float64
+        with scratch_buffer(num_samples * self.sample_size, self.dist.compact_dtype) as buffer:
+            return SampleSums(sample_sums(lambda size: self.dist.rvs_into(rng, buffer[:size]), self.sample_size,
+                                          num_samples))
+
+
+# Bootstrap chunk: aggregate of the resampled statistics over a fixed range
+class BootstrapTask:
+    def __init__(self, data, reducer, stats_range, bins=30):
+        self.data = data
+        self.reducer = reducer
+        self.stats_range = stats_range
+        self.bins = bins
+
+    def __call__(self, num_resamples, seed_sequence):
+        stats = bootstrap_distribution(self.data, self.reducer, num_resamples, _generator(seed_sequence))
+        return Aggregate(*self.stats_range, self.bins).update(stats)
+
+
+# Correlation chunk: x against this chunk's shuffles of y
+class PermutationTask:
+    def __init__(self, x, y, method):
+        self.x = x
+        self.y = y
+        self.method = method
+
+    def __call__(self, num_permutations, seed_sequence):
+        return Resamples(permutation_distribution(self.x, self.y, self.method, num_permutations,
+                                                  _generator(seed_sequence)))
+
+
+# Correlation chunk: this chunk's resampled (x, y) pairs
+class CorrelationBootstrapTask:
+    def __init__(self, x, y, method):
+        self.x = x
+        self.y = y
+        self.method = method
+
+    def __call__(self, num_resamples, seed_sequence):
+        return Resamples(correlation_bootstrap(self.x, self.y, self.method, num_resamples, _generator(seed_sequence)))
+
+
+# Sample-mean draws and means in parallel chunks; ranges come from the distribution so every
+# chunk bins onto the same grid
+def sample_means_plan(dist, sample_size, num_samples, seed, bins=30, chunk_draws=DEFAULT_CHUNK_DRAWS,
+                      precision="float64"):
+    total_draws = sample_size * num_samples
+    draws_range = support_range(dist, 0.1 / total_draws)
+    half_width = 8 * dist.std / np.sqrt(sample_size)
+    means_range = (max(draws_range[0], dist.mean - half_width), min(draws_range[1], dist.mean + half_width))
+    task = SampleMeansTask(dist, sample_size, draws_range, means_range, bins, precision)
+    return task, num_samples, chunk_draws // sample_size, seed
+
+
+def simulate_sample_means(dist, sample_size, num_samples, seed, bins=30, workers=None,
+                          chunk_draws=DEFAULT_CHUNK_DRAWS, precision="float64"):
+    return run_chunks(*sample_means_plan(dist, sample_size, num_samples, seed, bins, chunk_draws, precision), workers)
+
+
+# Histogram and moments of `num_draws` draws in parallel chunks, without holding the draws
+def simulate_draws(dist, num_draws, seed, draws_range, bins=30, workers=None, chunk_draws=DEFAULT_CHUNK_DRAWS):
+    return run_chunks(DrawsTask(dist, draws_range, bins), num_draws, chunk_draws, seed, workers)
+
+
+def simulate_sample_sums(dist, sample_size, num_samples, seed, workers=None, chunk_draws=DEFAULT_CHUNK_DRAWS,
+                         precision="float64"):
+    task = SampleSumsTask(dist, sample_size, precision)
+    return run_chunks(task, num_samples, chunk_draws // sample_size, seed, workers).sums
+
+
+# Bootstrap statistics binned in parallel chunks. A small pilot run, seeded apart from the
+# chunks, fixes the histogram range; the rare statistics beyond it still count in quantiles.
+def bootstrap_plan(data, reducer, num_resamples, seed, bins=30, chunk_draws=DEFAULT_CHUNK_DRAWS,
+                   pilot_resamples=1000):
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    pilot_seed, chunk_seed = seed.spawn(2)
+    pilot = bootstrap_distribution(data, reducer, pilot_resamples, _generator(pilot_seed))
+    span = pilot.max() - pilot.min()
+    stats_range = (pilot.min() - 0.5 * span, pilot.max() + 0.5 * span)
+    task = BootstrapTask(np.asarray(data, dtype=np.float64), reducer, stats_range, bins)
+    return task, num_resamples, chunk_draws // len(data), chunk_seed
+
+
+def simulate_bootstrap(data, reducer, num_resamples, seed, bins=30, workers=None,
+                       chunk_draws=DEFAULT_CHUNK_DRAWS, pilot_resamples=1000):
+    return run_chunks(*bootstrap_plan(data, reducer, num_resamples, seed, bins, chunk_draws, pilot_resamples), workers)
+
+
+# Permuted correlations in parallel chunks of about `chunk_draws` shuffled values each
+def permutation_plan(x, y, method, num_permutations, seed, chunk_draws=DEFAULT_CHUNK_DRAWS):
+    return PermutationTask(x, y, method), num_permutations, chunk_draws // len(x), seed
+
+
+# Bootstrapped correlations in parallel chunks of about `chunk_draws` resampled pairs each
+def correlation_bootstrap_plan(x, y, method, num_resamples, seed, chunk_draws=DEFAULT_CHUNK_DRAWS):
+    return CorrelationBootstrapTask(x, y, method), num_resamples, chunk_draws // len(x), seed
@@ -0,0 +1,239 @@
+import hashlib
+import io
+import time
+
+import matplotlib.pyplot as plt
+from matplotlib.colors import to_hex
+import numpy as np
+import streamlit as st
+from demos.cache import figure_cache
+from demos.moments import Moments
+from demos.profiling import stage
+from demos.rendering import Histogram, binned_histogram, binned_kde, histplot
+from demos.session import BACKENDS
+
+# Same rasterization settings st.pyplot uses
+DPI = 200
+
+# st.image downsizes anything wider than this on every call, so render no wider than it once
+MAX_WIDTH_PX = 1460
+
+# Points kept from the fine KDE grid when shipping it to the browser
+ALTAIR_KDE_POINTS = 256
+
+
+def _update_hash(digest, value):
+    if isinstance(value, np.ndarray):
+        digest.update(f"ndarray{value.dtype.str}{value.shape}".encode())
+        digest.update(np.ascontiguousarray(value).data)
+    elif isinstance(value, (list, tuple)):
+        digest.update(b"(")
+        for item in value:
+            _update_hash(digest, item)
+        digest.update(b")")
+    elif isinstance(value, dict):
+        _update_hash(digest, sorted(value.items()))
+    elif isinstance(value, (Histogram, Moments)):
+        _update_hash(digest, (type(value).__name__, value.state()))
+    else:
+        digest.update(repr(value).encode())
+        digest.update(b",")
+
+
+# Content hash of everything a plot is drawn from
+def data_hash(*parts):
+    digest = hashlib.blake2b(digest_size=16)
+    _update_hash(digest, parts)
+    return digest.hexdigest()
+
+
+def plot_backend():
+    return st.session_state.get("plot_backend", BACKENDS[0])
+
+
+def _record(name, backend, cache_hit, cpu_seconds, payload_bytes):
+    st.session_state.setdefault("render_log", []).append({
+        "figure": name,
+        "backend": backend,
+        "cache_hit": cache_hit,
+        "cpu_ms": cpu_seconds * 1000,
+        "payload_kb": payload_bytes / 1024,
+    })
+
+
+# PNG bytes of a Matplotlib figure, which is closed afterwards
+def render_png(fig):
+    buffer = io.BytesIO()
+    try:
+        with stage("rasterization"):
+            dpi = min(DPI, 0.95 * MAX_WIDTH_PX / fig.get_figwidth())
+            fig.savefig(buffer, format="png", bbox_inches="tight", dpi=dpi)
+    finally:
+        plt.close(fig)
+    return buffer.getvalue()
+
+
+# Send a rendered figure to the page: PNG bytes from render_png, or an Altair chart
+# `container` (an st.empty() placeholder, say) receives the figure instead of the page
+def show_rendered(name, rendered, cache_hit, cpu_seconds, container=None):
+    container = st if container is None else container
+    start = time.process_time()
+    with stage("rasterization"):
+        if isinstance(rendered, bytes):
+            backend, payload = "Matplotlib", len(rendered)
+            container.image(rendered, use_column_width=True, output_format="PNG")
+        else:
+            # Altair charts are serialized to Vega-Lite JSON rather than rasterized on the server
+            backend, payload = "Altair", len(rendered.to_json())
+            container.altair_chart(rendered, use_container_width=True)
+    _record(name, backend, cache_hit, cpu_seconds + time.process_time() - start, payload)
+
+
+# Figure produced by a StageGraph figure stage; a cache hit there costs nothing to draw
+def show_stage_figure(name, run, stage_name="figure", container=None):
+    show_rendered(name, run[stage_name], stage_name in run.hits, run.cpu_seconds.get(stage_name, 0.0), container)
+
+
+# Rasterize `build()` once per distinct input and serve the cached PNG afterwards
+def show_figure(name, build, *key_parts):
+    start = time.process_time()
+    key = (name, data_hash(*key_parts))
+    png = figure_cache.get(key)
+    cache_hit = png is not None
+    if not cache_hit:
+        with stage("plotting"):
+            fig = build()
+        png = figure_cache.put(key, render_png(fig))
+    show_rendered(name, png, cache_hit, time.process_time() - start)
+
+
+class HistogramPanel:
+    def __init__(self, data, title, bins=30, kde=False, stat='count', color='C0', edgecolor=None,
+                 vlines=(), curves=(), span=None, xlabel=None):
+        self.data = data
+        self.title = title
+        self.bins = bins
+        self.kde = kde
+        self.stat = stat
+        self.color = color
+        self.edgecolor = edgecolor
+        # (x, label, color, linestyle) tuples
+        self.vlines = vlines
+        # (x, y, label, color, kind) tuples; kind is 'line' or 'stem'
+        self.curves = curves
+        # (lower, upper, label, color) or None
+        self.span = span
+        self.xlabel = xlabel
+
+    def key(self):
+        return (self.data, self.title, self.bins, self.kde, self.stat, self.color, self.edgecolor,
+                self.vlines, self.curves, self.span, self.xlabel)
+
+
+def _draw_panel(panel, ax):
+    histplot(panel.data, ax, bins=panel.bins, kde=panel.kde, stat=panel.stat, color=panel.color,
+             edgecolor=panel.edgecolor)
+    for x, y, label, color, kind in panel.curves:
+        if kind == 'stem':
+            ax.stem(x, y, linefmt=f'{color}-', markerfmt=f'{color}o', basefmt=" ", label=label)
+        else:
+            ax.plot(x, y, color=color, lw=2, label=label)
+    for x, label, color, linestyle in panel.vlines:
+        ax.axvline(x, color=color, linestyle=linestyle, label=label)
+    if panel.span is not None:
+        lower, upper, label, color = panel.span
+        ax.axvspan(lower, upper, color=color, alpha=0.2, label=label)
+    ax.set_title(panel.title)
+    if panel.xlabel:
+        ax.set_xlabel(panel.xlabel)
+    if ax.get_legend_handles_labels()[1]:
+        ax.legend()
+
+
+# Factor converting a density into the units of the bars
+def _stat_scale(counts, edges, stat):
+    if stat == 'density':
+        return 1.0
+    if stat == 'probability':
+        return edges[1] - edges[0]
+    return counts.sum() * (edges[1] - edges[0])
+
+
+# Layered Altair chart built only from bin edges, heights and a thinned KDE curve
+def _altair_panel(panel):
+    import altair as alt
+
+    counts, edges, fine_counts, fine_edges = binned_histogram(panel.data, panel.bins)
+    total = counts.sum()
+    scale = _stat_scale(counts, edges, panel.stat)
+    heights = counts / (total * np.diff(edges)) * scale if total else np.zeros(counts.size)
+    bins = [{"left": float(left), "right": float(right), "height": float(height)}
+            for left, right, height in zip(edges[:-1], edges[1:], heights)]
+    y_title = panel.stat.capitalize()
+    layers = [
+        alt.Chart(alt.Data(values=bins)).mark_bar(opacity=0.6, color=to_hex(panel.color), stroke="black").encode(
+            x=alt.X("left:Q", title=panel.xlabel or "Value"), x2="right:Q", y=alt.Y("height:Q", title=y_title))
+    ]
+
+    curves = list(panel.curves)
+    if panel.kde:
+        grid, density = binned_kde(fine_counts, fine_edges)
+        step = max(1, grid.size // ALTAIR_KDE_POINTS)
+        curves.append((grid[::step], density[::step] * scale, "KDE", panel.color, 'line'))
+    for x, y, label, color, kind in curves:
+        points = [{"x": float(a), "y": float(b)} for a, b in zip(x, y)]
+        chart = alt.Chart(alt.Data(values=points))
+        if kind == 'stem':
+            layers.append(chart.mark_rule(color=to_hex(color)).encode(x="x:Q", y="y:Q"))
+            layers.append(chart.mark_point(color=to_hex(color), filled=True).encode(x="x:Q", y="y:Q"))
+        else:
+            layers.append(chart.mark_line(color=to_hex(color)).encode(x="x:Q", y="y:Q"))
+    for x, label, color, linestyle in panel.vlines:
+        rule = alt.Chart(alt.Data(values=[{"x": float(x), "label": label}])).mark_rule(
+            color=to_hex(color), strokeDash=[6, 4] if linestyle == '--' else [1, 0])
+        layers.append(rule.encode(x="x:Q", tooltip="label:N"))
+    if panel.span is not None:
+        lower, upper, label, color = panel.span
+        rect = alt.Chart(alt.Data(values=[{"lower": float(lower), "upper": float(upper), "label": label}]))
+        layers.append(rect.mark_rect(color=to_hex(color), opacity=0.2).encode(x="lower:Q", x2="upper:Q", tooltip="label:N"))
+    return alt.layer(*layers).properties(title=panel.title)
+
+
+def _histogram_figure(panels, figsize, vertical):
+    shape = (len(panels), 1) if vertical else (1, len(panels))
+    fig, axes = plt.subplots(*shape, figsize=figsize, squeeze=False)
+    for panel, ax in zip(panels, axes.ravel()):
+        _draw_panel(panel, ax)
+    return fig
+
+
+def _altair_chart(panels, vertical):
+    import altair as alt
+
+    charts = [_altair_panel(panel) for panel in panels]
+    if len(charts) == 1:
+        return charts[0]
+    return alt.vconcat(*charts) if vertical else alt.hconcat(*charts)
+
+
+# Histogram panels rendered for `backend`: PNG bytes or an Altair chart, for show_rendered
+def render_histograms(panels, backend, figsize=(10, 6), vertical=False):
+    if backend == "Altair":
+        with stage("plotting"):
+            return _altair_chart(panels, vertical)
+    with stage("plotting"):
+        fig = _histogram_figure(panels, figsize, vertical)
+    return render_png(fig)
+
+
+# Histogram panels drawn with the selected backend
+def show_histograms(name, panels, figsize=(10, 6), vertical=False):
+    backend = plot_backend()
+    if backend == "Altair":
+        start = time.process_time()
+        chart = render_histograms(panels, backend, figsize, vertical)
+        show_rendered(name, chart, False, time.process_time() - start)
+        return
+
+    show_figure(name, lambda: _histogram_figure(panels, figsize, vertical),
+                [panel.key() for panel in panels], figsize, vertical)
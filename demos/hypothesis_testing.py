@@ -1,80 +1,200 @@
-import streamlit as st
-import numpy as np
-import matplotlib.pyplot as plt
-from scipy.stats import norm, ttest_1samp, ttest_ind
-
-
-def show():
-    st.title("Hypothesis Testing Demonstration")
-    st.sidebar.title("Settings")
-
-    # User inputs from the sidebar
-    test_type = st.sidebar.selectbox("Choose the test type:", ("One-Sample t-Test", "Two-Sample t-Test"))
-    dist_type = st.sidebar.selectbox("Choose the distribution for sample data:", ("Normal", "Exponential"))
-    sample_size = st.sidebar.slider("Sample size (n):", min_value=1, max_value=1000, value=30)
-    alpha = st.sidebar.slider("Significance level (alpha):", min_value=0.01, max_value=0.10, value=0.05)
-
-    # Parameters for the original distribution
-    if dist_type == "Normal":
-        mean = st.sidebar.number_input("Normal distribution - mean:", value=0.0)
-        std_dev = st.sidebar.number_input("Normal distribution - standard deviation:", value=1.0)
-    elif dist_type == "Exponential":
-        rate = st.sidebar.number_input("Exponential distribution - rate (lambda):", value=1.0)
-
-    # Hypothesis parameters
-    null_mean = st.sidebar.number_input("Null hypothesis mean:", value=0.0)
-
-    if test_type == "Two-Sample t-Test":
-        sample_size2 = st.sidebar.slider("Sample size for second sample (n):", min_value=1, max_value=1000, value=30)
-        if dist_type == "Normal":
-            mean2 = st.sidebar.number_input("Normal distribution for second sample - mean:", value=0.0)
-            std_dev2 = st.sidebar.number_input("Normal distribution for second sample - standard deviation:", value=1.0)
-        elif dist_type == "Exponential":
-            rate2 = st.sidebar.number_input("Exponential distribution for second sample - rate (lambda):", value=1.0)
-
-    # Function to generate the original distribution
-    def generate_distribution(dist_type, size, mean=0, std_dev=1, rate=1):
-        if dist_type == "Normal":
-            return np.random.normal(mean, std_dev, size)
-        elif dist_type == "Exponential":
-            return np.random.exponential(1 / rate, size)
-
-    # Generate sample data
-    data = generate_distribution(dist_type, sample_size, mean, std_dev, rate)
-
-    # Perform the hypothesis test
-    if test_type == "One-Sample t-Test":
-        t_stat, p_value = ttest_1samp(data, null_mean)
-        test_result = "Reject" if p_value < alpha else "Fail to Reject"
-        st.write(f"One-Sample t-Test Results:")
-        st.write(f"T-statistic: {t_stat:.4f}")
-        st.write(f"P-value: {p_value:.4f}")
-        st.write(f"Decision: {test_result} the null hypothesis at alpha = {alpha:.2f}")
-
-        # Plotting
-        fig, ax = plt.subplots(figsize=(10, 6))
-        ax.hist(data, bins=30, alpha=0.6, color='g', edgecolor='black')
-        ax.axvline(null_mean, color='r', linestyle='--', label=f'Null Hypothesis Mean: {null_mean:.2f}')
-        ax.axvline(np.mean(data), color='b', linestyle='-', label=f'Sample Mean: {np.mean(data):.2f}')
-        ax.set_title(f"One-Sample t-Test for {dist_type} Distribution")
-        ax.legend()
-
-    elif test_type == "Two-Sample t-Test":
-        data2 = generate_distribution(dist_type, sample_size2, mean2, std_dev2, rate2)
-        t_stat, p_value = ttest_ind(data, data2)
-        test_result = "Reject" if p_value < alpha else "Fail to Reject"
-        st.write(f"Two-Sample t-Test Results:")
-        st.write(f"T-statistic: {t_stat:.4f}")
-        st.write(f"P-value: {p_value:.4f}")
-        st.write(f"Decision: {test_result} the null hypothesis at alpha = {alpha:.2f}")
-
-        # Plotting
-        fig, ax = plt.subplots(figsize=(10, 6))
-        ax.hist(data, bins=30, alpha=0.6, color='g', edgecolor='black', label='Sample 1')
-        ax.hist(data2, bins=30, alpha=0.6, color='b', edgecolor='black', label='Sample 2')
-        ax.axvline(np.mean(data), color='g', linestyle='-', label=f'Sample 1 Mean: {np.mean(data):.2f}')
-        ax.axvline(np.mean(data2), color='b', linestyle='-', label=f'Sample 2 Mean: {np.mean(data2):.2f}')
-        ax.set_title(f"Two-Sample t-Test for {dist_type} Distribution")
-        ax.legend()
-
-    st.pyplot(fig)
+import streamlit as st
+import numpy as np
+import matplotlib.pyplot as plt
+from scipy.stats import norm, ttest_1samp, ttest_ind
+from demos.cache import cached_sample, seed_input
+from demos.distributions import get_distribution
+from demos.figures import render_png, show_figure, show_stage_figure
+from demos.moments import Moments
+from demos.power_engine import power_surface
+from demos.stages import Stage, StageGraph
+
+
+def show():
+    st.title("Hypothesis Testing Demonstration")
+    st.sidebar.title("Settings")
+
+    # User inputs from the sidebar
+    mode = st.sidebar.selectbox("Mode:", ("Single test", "Power analysis"))
+    test_type = st.sidebar.selectbox("Choose the test type:", ("One-Sample t-Test", "Two-Sample t-Test"))
+    dist_type = st.sidebar.selectbox("Choose the distribution for sample data:", ("Normal", "Exponential"))
+    if mode == "Single test":
+        sample_size = st.sidebar.slider("Sample size (n):", min_value=1, max_value=1000, value=30)
+    elif mode == "Power analysis":
+        max_sample_size = st.sidebar.slider("Largest sample size (n):", min_value=10, max_value=1000, value=200)
+        max_effect = st.sidebar.slider("Largest effect size (standard deviations):", min_value=0.1, max_value=2.0,
+                                       value=1.0)
+        num_replicates = st.sidebar.select_slider("Simulated datasets per grid point:",
+                                                  options=[1000, 10000, 100000], value=10000)
+    alpha = st.sidebar.slider("Significance level (alpha):", min_value=0.01, max_value=0.10, value=0.05)
+
+    # Parameters for the original distribution
+    if dist_type == "Normal":
+        mean = st.sidebar.number_input("Normal distribution - mean:", value=0.0)
+        std_dev = st.sidebar.number_input("Normal distribution - standard deviation:", value=1.0)
+        params = {'mean': mean, 'std_dev': std_dev}
+    elif dist_type == "Exponential":
+        rate = st.sidebar.number_input("Exponential distribution - rate (lambda):", value=1.0)
+        params = {'rate': rate}
+
+    # Hypothesis parameters
+    if mode == "Single test":
+        null_mean = st.sidebar.number_input("Null hypothesis mean:", value=0.0)
+
+    if mode == "Single test" and test_type == "Two-Sample t-Test":
+        sample_size2 = st.sidebar.slider("Sample size for second sample (n):", min_value=1, max_value=1000, value=30)
+        if dist_type == "Normal":
+            mean2 = st.sidebar.number_input("Normal distribution for second sample - mean:", value=0.0)
+            std_dev2 = st.sidebar.number_input("Normal distribution for second sample - standard deviation:", value=1.0)
+            params2 = {'mean': mean2, 'std_dev': std_dev2}
+        elif dist_type == "Exponential":
+            rate2 = st.sidebar.number_input("Exponential distribution for second sample - rate (lambda):", value=1.0)
+            params2 = {'rate': rate2}
+    seed = seed_input()
+
+    # Original distribution from the shared registry
+    dist = get_distribution(dist_type, **params)
+
+    if mode == "Power analysis":
+        show_power(dist, test_type, max_sample_size, max_effect, num_replicates, alpha, seed)
+        return
+
+    # Perform the hypothesis test
+    if test_type == "Two-Sample t-Test":
+        inputs = test_inputs(dist, test_type, sample_size, alpha, seed, dist2=get_distribution(dist_type, **params2),
+                             sample_size2=sample_size2)
+    else:
+        inputs = test_inputs(dist, test_type, sample_size, alpha, seed, null_mean=null_mean)
+    run = TEST_STAGES.run(inputs)
+    result = test_result(run)
+    t_stat, p_value = result['t_stat'], result['p_value']
+    decision = "Reject" if result['reject'] else "Fail to Reject"
+    st.write(f"{test_type} Results:")
+    st.write(f"T-statistic: {t_stat:.4f}")
+    st.write(f"P-value: {p_value:.4f}")
+    st.write(f"Decision: {decision} the null hypothesis at alpha = {alpha:.2f}")
+
+    # Plotting
+    if test_type == "One-Sample t-Test":
+        show_stage_figure("hypothesis_testing.one_sample", run)
+    elif test_type == "Two-Sample t-Test":
+        show_stage_figure("hypothesis_testing.two_sample", run)
+
+
+def draw_sample(dist, sample_size, rng):
+    return dist.rvs(rng, sample_size)
+
+
+def draw_second_sample(dist2, sample_size2, rng):
+    return None if dist2 is None else dist2.rvs(rng, sample_size2)
+
+
+def test_statistic(test_type, null_mean, sample, second_sample):
+    if test_type == "One-Sample t-Test":
+        t_stat, p_value = ttest_1samp(sample, null_mean)
+    elif test_type == "Two-Sample t-Test":
+        t_stat, p_value = ttest_ind(sample, second_sample)
+    else:
+        raise ValueError(f"Unknown test type: {test_type!r}")
+    statistic = {'t_stat': t_stat, 'p_value': p_value, 'sample_mean': Moments.from_array(sample).mean}
+    if second_sample is not None:
+        statistic['sample_mean2'] = Moments.from_array(second_sample).mean
+    return statistic
+
+
+def decide(alpha, statistic):
+    return bool(statistic['p_value'] < alpha)
+
+
+def plot_test(dist, test_type, null_mean, sample, second_sample, statistic):
+    sample_mean = statistic['sample_mean']
+    fig, ax = plt.subplots(figsize=(10, 6))
+    if test_type == "One-Sample t-Test":
+        ax.hist(sample, bins=30, alpha=0.6, color='g', edgecolor='black')
+        ax.axvline(null_mean, color='r', linestyle='--', label=f'Null Hypothesis Mean: {null_mean:.2f}')
+        ax.axvline(sample_mean, color='b', linestyle='-', label=f'Sample Mean: {sample_mean:.2f}')
+    else:
+        sample_mean2 = statistic['sample_mean2']
+        ax.hist(sample, bins=30, alpha=0.6, color='g', edgecolor='black', label='Sample 1')
+        ax.hist(second_sample, bins=30, alpha=0.6, color='b', edgecolor='black', label='Sample 2')
+        ax.axvline(sample_mean, color='g', linestyle='-', label=f'Sample 1 Mean: {sample_mean:.2f}')
+        ax.axvline(sample_mean2, color='b', linestyle='-', label=f'Sample 2 Mean: {sample_mean2:.2f}')
+    ax.set_title(f"{test_type} for {dist.name} Distribution")
+    ax.legend()
+    return render_png(fig)
+
+
+# Sample -> t statistic -> decision -> figure; alpha only reaches the decision, so moving it
+# keeps the data, the test and the figure
+TEST_STAGES = StageGraph("hypothesis_testing", [
+    Stage("sample", draw_sample, reads=("dist", "sample_size"), stream="hypothesis_testing"),
+    Stage("second_sample", draw_second_sample, kind="sample", reads=("dist2", "sample_size2"),
+          stream="hypothesis_testing.second"),
+    Stage("statistic", test_statistic, reads=("test_type", "null_mean"), after=("sample", "second_sample")),
+    Stage("decision", decide, reads=("alpha",), after=("statistic",)),
+    Stage("figure", plot_test, reads=("dist", "test_type", "null_mean"),
+          after=("sample", "second_sample", "statistic")),
+])
+
+
+def test_inputs(dist, test_type, sample_size, alpha, seed, null_mean=0.0, dist2=None, sample_size2=None):
+    return {'dist': dist, 'test_type': test_type, 'sample_size': sample_size, 'alpha': alpha, 'seed': seed,
+            'null_mean': null_mean, 'dist2': dist2, 'sample_size2': sample_size2}
+
+
+def test_result(run):
+    result = dict(run['statistic'], data=run['sample'], reject=run['decision'])
+    if run['second_sample'] is not None:
+        result['data2'] = run['second_sample']
+    return result
+
+
+# One- or two-sample t-test on freshly drawn data; `dist2` and `sample_size2` describe the second sample
+def compute(dist, test_type, sample_size, alpha, seed, null_mean=0.0, dist2=None, sample_size2=None):
+    inputs = test_inputs(dist, test_type, sample_size, alpha, seed, null_mean, dist2, sample_size2)
+    return test_result(TEST_STAGES.run(inputs, targets=("decision",)))
+
+
+# Rejection rates over a log-spaced sample-size x linear effect-size grid; row 0 has no effect
+def compute_power(dist, test_type, max_sample_size, max_effect, num_replicates, alpha, seed):
+    sample_sizes = np.unique(np.geomspace(5, max_sample_size, 10).astype(int))
+    effect_sizes = np.linspace(0, max_effect, 5)
+    power = cached_sample(
+        "hypothesis_testing.power",
+        (dist.key, test_type, sample_sizes, effect_sizes, num_replicates, alpha), seed,
+        lambda rng: power_surface(dist, sample_sizes, effect_sizes, num_replicates, alpha, rng, test_type))
+    return {'sample_sizes': sample_sizes, 'effect_sizes': effect_sizes, 'power': power}
+
+
+# Power and type I error of the t-test over a sample-size x effect-size grid
+def show_power(dist, test_type, max_sample_size, max_effect, num_replicates, alpha, seed):
+    result = compute_power(dist, test_type, max_sample_size, max_effect, num_replicates, alpha, seed)
+    sample_sizes, effect_sizes, power = result['sample_sizes'], result['effect_sizes'], result['power']
+
+    # Plotting
+    def plot():
+        fig, axes = plt.subplots(1, 2, figsize=(14, 6))
+        for effect, row in zip(effect_sizes, power):
+            label = "Type I error (no effect)" if effect == 0 else f"Effect = {effect:.2f} SD"
+            axes[0].plot(sample_sizes, row, 'o-', label=label)
+        axes[0].axhline(alpha, color='r', linestyle='--', label=f'Alpha = {alpha:.2f}')
+        axes[0].set_xscale('log')
+        axes[0].set_xlabel("Sample Size (n)")
+        axes[0].set_ylabel("Rejection Rate")
+        axes[0].set_title(f"Power Curves: {test_type} on {dist.name} Data")
+        axes[0].legend()
+
+        mesh = axes[1].pcolormesh(sample_sizes, effect_sizes, power, shading='nearest', vmin=0, vmax=1)
+        axes[1].set_xscale('log')
+        axes[1].set_xlabel("Sample Size (n)")
+        axes[1].set_ylabel("Effect Size (standard deviations)")
+        axes[1].set_title("Power Surface")
+        fig.colorbar(mesh, ax=axes[1], label="Rejection Rate")
+        return fig
+
+    show_figure("hypothesis_testing.power", plot, power, sample_sizes, effect_sizes, alpha, test_type, dist.key)
+
+    # Display results
+    st.write(f"Simulated datasets per grid point: {num_replicates:,}")
+    st.write(f"Empirical type I error at alpha = {alpha:.2f}: "
+             f"{power[0].min():.3f} to {power[0].max():.3f} across sample sizes")
@@ -1,49 +1,84 @@
-import streamlit as st
-import numpy as np
-import matplotlib.pyplot as plt
-
-def show():
-    st.title("Law of Large Numbers Demonstration")
-    st.sidebar.title("Settings")
-
-    # User inputs from the sidebar
-    dist_type = st.sidebar.selectbox("Choose the distribution:", ("Uniform", "Exponential", "Binomial"))
-    sample_size = st.sidebar.slider("Sample size (n):", min_value=1, max_value=1000, value=30)
-    num_samples = st.sidebar.slider("Number of samples:", min_value=1, max_value=10000, value=1000)
-
-    # Parameters for the original distribution
-    if dist_type == "Uniform":
-        low = st.sidebar.number_input("Uniform distribution - lower bound:", value=0)
-        high = st.sidebar.number_input("Uniform distribution - upper bound:", value=10)
-    elif dist_type == "Exponential":
-        rate = st.sidebar.number_input("Exponential distribution - rate (lambda):", value=1.0)
-    elif dist_type == "Binomial":
-        n = st.sidebar.number_input("Binomial distribution - number of trials:", value=10)
-        p = st.sidebar.number_input("Binomial distribution - probability of success:", value=0.5)
-
-    # Function to generate the original distribution
-    def generate_distribution(dist_type, size):
-        if dist_type == "Uniform":
-            return np.random.uniform(low, high, size)
-        elif dist_type == "Exponential":
-            return np.random.exponential(1/rate, size)
-        elif dist_type == "Binomial":
-            return np.random.binomial(n, p, size)
-
-    # Generate samples and compute sample means
-    sample_means = []
-    for i in range(1, num_samples + 1):
-        sample = generate_distribution(dist_type, sample_size)
-        sample_mean = np.mean(sample)
-        sample_means.append(sample_mean)
-
-    # Plotting
-    fig, ax = plt.subplots(figsize=(10, 6))
-    ax.plot(range(1, num_samples + 1), sample_means, label='Sample Mean')
-    ax.axhline(np.mean(sample_means), color='r', linestyle='--', label='Population Mean')
-    ax.set_title("Law of Large Numbers")
-    ax.set_xlabel("Number of Samples")
-    ax.set_ylabel("Sample Mean")
-    ax.legend()
-
-    st.pyplot(fig)
+import streamlit as st
+import matplotlib.pyplot as plt
+from demos.cache import seed_input
+from demos.distributions import get_distribution
+from demos.executor import PRECISIONS, simulate_sample_sums
+from demos.figures import render_png, show_stage_figure
+from demos.rendering import minmax_downsample
+from demos.running_mean_engine import cumulative_means
+from demos.stages import Stage, StageGraph
+
+def show():
+    st.title("Law of Large Numbers Demonstration")
+    st.sidebar.title("Settings")
+
+    # User inputs from the sidebar
+    dist_type = st.sidebar.selectbox("Choose the distribution:", ("Uniform", "Exponential", "Binomial"))
+    sample_size = st.sidebar.slider("Sample size (n):", min_value=1, max_value=1000, value=30)
+    num_samples = st.sidebar.slider("Number of samples:", min_value=1, max_value=100000, value=1000)
+    # compact draws float32, or the smallest integer type that holds Binomial counts
+    precision = st.sidebar.selectbox("Precision:", PRECISIONS)
+
+    # Parameters for the original distribution
+    if dist_type == "Uniform":
+        low = st.sidebar.number_input("Uniform distribution - lower bound:", value=0)
+        high = st.sidebar.number_input("Uniform distribution - upper bound:", value=10)
+        params = {'low': low, 'high': high}
+    elif dist_type == "Exponential":
+        rate = st.sidebar.number_input("Exponential distribution - rate (lambda):", value=1.0)
+        params = {'rate': rate}
+    elif dist_type == "Binomial":
+        n = st.sidebar.number_input("Binomial distribution - number of trials:", value=10)
+        p = st.sidebar.number_input("Binomial distribution - probability of success:", value=0.5)
+        params = {'n': n, 'p': p}
+    seed = seed_input()
+
+    # Original distribution from the shared registry
+    dist = get_distribution(dist_type, **params)
+
+    run = LLN_STAGES.run(lln_inputs(dist, sample_size, num_samples, seed, precision))
+    sample_means = run['sample']
+
+    # Plotting
+    show_stage_figure("law_of_large_numbers", run)
+
+    # Display results
+    st.write(f"Total draws: {sample_size * num_samples:,}")
+    st.write(f"Final Sample Mean: {sample_means[-1]:.4f}")
+    st.write(f"Population Mean: {dist.mean:.4f}")
+
+
+# Sum each sample in parallel chunks and track the running mean after each sample
+def simulate(dist, sample_size, num_samples, precision, rng):
+    sums = simulate_sample_sums(dist, sample_size, num_samples, rng.bit_generator.seed_seq, precision=precision)
+    return cumulative_means(sums, sample_size)
+
+
+def plot_running_mean(dist, sample):
+    plot_x, plot_y = minmax_downsample(sample)
+    fig, ax = plt.subplots(figsize=(10, 6))
+    ax.plot(plot_x, plot_y, label='Sample Mean')
+    ax.axhline(dist.mean, color='r', linestyle='--', label='Population Mean')
+    ax.set_title("Law of Large Numbers")
+    ax.set_xlabel("Number of Samples")
+    ax.set_ylabel("Sample Mean")
+    ax.legend()
+    return render_png(fig)
+
+
+LLN_STAGES = StageGraph("law_of_large_numbers", [
+    Stage("sample", simulate, reads=("dist", "sample_size", "num_samples", "precision"),
+          stream="law_of_large_numbers"),
+    Stage("figure", plot_running_mean, reads=("dist",), after=("sample",)),
+])
+
+
+def lln_inputs(dist, sample_size, num_samples, seed, precision="float64"):
+    return {'dist': dist, 'sample_size': sample_size, 'num_samples': num_samples, 'seed': seed,
+            'precision': precision}
+
+
+def compute(dist, sample_size, num_samples, seed, precision="float64"):
+    inputs = lln_inputs(dist, sample_size, num_samples, seed, precision)
+    running_means = LLN_STAGES.run(inputs, targets=("sample",))['sample']
+    return {'running_means': running_means, 'population_mean': dist.mean, 'final_mean': running_means[-1]}
@@ -0,0 +1,103 @@
+import argparse
+import importlib
+import os
+import subprocess
+import sys
+import threading
+import time
+
+# Sidebar label -> module, imported only when the demo is selected
+DEMOS = {
+    "Central Limit Theorem": "demos.central_limit_theorem",
+    "Law of Large Numbers": "demos.law_of_large_numbers",
+    "Confidence Intervals": "demos.confidence_intervals",
+    "Hypothesis Testing": "demos.hypothesis_testing",
+    "Correlation and Regression": "demos.correlation_regression",
+    "ANOVA": "demos.anova",
+    "Probability Distributions": "demos.probability_distributions",
+    "Bootstrap Sampling": "demos.bootstrap_sampling",
+    "Bayesian Inference": "demos.bayesian_inference",
+    "Sampling Methods": "demos.sampling_methods",
+    "Time Series Analysis": "demos.time_series_analysis",
+}
+
+PREWARM_ENABLED = os.environ.get("STATS_APP_PREWARM", "0") == "1"
+
+# Seconds spent on the first import of each demo module in this process
+import_times = {}
+
+_prewarm_lock = threading.Lock()
+_prewarm_thread = None
+
+
+def load_demo(name):
+    module_name = DEMOS[name]
+    # A module is in sys.modules before its body has run, so always go through import_module,
+    # which waits while the prewarm thread is still importing it; only a first import is timed
+    imported = module_name in sys.modules
+    start = time.perf_counter()
+    module = importlib.import_module(module_name)
+    if not imported:
+        import_times.setdefault(module_name, time.perf_counter() - start)
+    return module
+
+
+def _prewarm(names):
+    for name in names:
+        try:
+            load_demo(name)
+        except Exception:
+            # A broken demo must not take the server down; it fails again, visibly, when selected
+            pass
+
+
+# Import the remaining demos on a daemon thread, at most once per process
+def prewarm(names=None):
+    global _prewarm_thread
+    with _prewarm_lock:
+        if _prewarm_thread is None:
+            names = list(DEMOS) if names is None else list(names)
+            _prewarm_thread = threading.Thread(target=_prewarm, args=(names,), name="demo-prewarm", daemon=True)
+            _prewarm_thread.start()
+    return _prewarm_thread
+
+
+# Cold-start breakdown of one module from `python -X importtime`, slowest first
+def importtime_breakdown(module_name, top=15, max_depth=1):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module_name}"],
+        cwd=root, capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, package = line[len("import time:"):].split("|")
+        if not self_us.strip().isdigit():
+            continue
+        # Nesting is encoded as two spaces of indentation per level
+        depth = (len(package) - len(package.lstrip())) // 2
+        if depth <= max_depth:
+            rows.append((package.strip(), int(self_us), int(cumulative_us)))
+    rows.sort(key=lambda row: row[2], reverse=True)
+    return rows[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report the cold-start import time of each demo.")
+    parser.add_argument("demos", nargs="*", default=list(DEMOS), help="demo labels (default: all)")
+    parser.add_argument("--top", type=int, default=10, help="number of imports listed per demo")
+    args = parser.parse_args()
+
+    for name in args.demos:
+        module_name = DEMOS[name]
+        rows = importtime_breakdown(module_name, top=args.top)
+        total = next((cumulative for package, _, cumulative in rows if package == module_name), 0)
+        print(f"{name} ({module_name}): {total / 1000:.1f} ms")
+        for package, self_us, cumulative_us in rows:
+            print(f"    {cumulative_us / 1000:>9.1f} ms  {self_us / 1000:>8.1f} ms self  {package}")
+
+
+if __name__ == "__main__":
+    main()
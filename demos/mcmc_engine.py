@@ -0,0 +1,158 @@
+import numpy as np
+from demos.moments import Moments
+from demos.rendering import Histogram
+
+# Draws held between histogram/moment flushes, per chain
+FLUSH_STEPS = 256
+
+# Acceptance rate targeted during warmup; optimal for one-dimensional random-walk Metropolis
+TARGET_ACCEPTANCE = 0.44
+
+
+# Unnormalised log posterior of a normal mean with known likelihood standard deviation.
+# The data enter only through their count and mean, so each step costs O(chains) for any n.
+class NormalMeanPosterior:
+    def __init__(self, prior, likelihood_std_dev, data_moments=None):
+        self.prior = prior
+        self.likelihood_std_dev = likelihood_std_dev
+        self.data_moments = Moments() if data_moments is None else data_moments
+
+    def log_density(self, mu):
+        count = self.data_moments.count
+        log_likelihood = -count * (mu - self.data_moments.mean) ** 2 / (2 * self.likelihood_std_dev ** 2)
+        return self.prior.logpdf(mu) + log_likelihood
+
+    # Rough posterior scale used to size the first proposals
+    def scale_guess(self):
+        precision = self.data_moments.count / self.likelihood_std_dev ** 2 + 1 / self.prior.var
+        return 1 / np.sqrt(precision)
+
+
+# Streaming split-R-hat and batch-means ESS over all chains. Each chain keeps Welford
+# accumulators for the two halves of its draws and for its batch means, so no draws are stored.
+class ChainMonitor:
+    __slots__ = ('num_draws', 'batch_size', 'step', 'half_count', 'half_mean', 'half_m2',
+                 'batch_sum', 'batch_count', 'batch_mean', 'batch_m2')
+
+    def __init__(self, num_chains, num_draws):
+        self.num_draws = num_draws
+        self.batch_size = max(1, int(np.sqrt(num_draws)))
+        self.step = 0
+        self.half_count = np.zeros(2)
+        self.half_mean = np.zeros((2, num_chains))
+        self.half_m2 = np.zeros((2, num_chains))
+        self.batch_sum = np.zeros(num_chains)
+        self.batch_count = 0
+        self.batch_mean = np.zeros(num_chains)
+        self.batch_m2 = np.zeros(num_chains)
+
+    def update(self, draws):
+        half = 0 if self.step < self.num_draws // 2 else 1
+        self.half_count[half] += 1
+        delta = draws - self.half_mean[half]
+        self.half_mean[half] += delta / self.half_count[half]
+        self.half_m2[half] += delta * (draws - self.half_mean[half])
+
+        self.step += 1
+        self.batch_sum += draws
+        if self.step % self.batch_size == 0:
+            self.batch_count += 1
+            batch_means = self.batch_sum / self.batch_size
+            delta = batch_means - self.batch_mean
+            self.batch_mean += delta / self.batch_count
+            self.batch_m2 += delta * (batch_means - self.batch_mean)
+            self.batch_sum[:] = 0
+
+    # Split-R-hat (Gelman et al., BDA3): the chain halves are treated as separate chains
+    def r_hat(self):
+        length = self.half_count.min()
+        if length < 2:
+            return np.nan
+        within = np.mean(self.half_m2 / (self.half_count[:, None] - 1))
+        between = length * np.var(self.half_mean, ddof=1)
+        pooled = (length - 1) / length * within + between / length
+        return np.sqrt(pooled / within)
+
+    # Batch-means ESS: chains * draws * posterior variance / (batch size * variance of batch means)
+    def ess(self):
+        if self.batch_count < 2:
+            return np.nan
+        num_chains = self.batch_mean.size
+        variance = np.mean(np.sum(self.half_m2, axis=0) / (self.half_count.sum() - 1))
+        batch_variance = self.batch_size * np.mean(self.batch_m2 / (self.batch_count - 1))
+        if batch_variance <= 0:
+            return np.nan
+        return num_chains * self.step * variance / batch_variance
+
+
+# Random-walk Metropolis on all chains at once: one proposal, one log-density call and one
+# accept/reject per step as array operations. Warmup adapts each chain's step size towards
+# TARGET_ACCEPTANCE; its draws are only used to fix the histogram range of the kept draws.
+def sample_chains(posterior, num_chains, num_draws, rng, warmup=500, start=None, step_sizes=None, bins=30):
+    if start is None:
+        start = posterior.prior.rvs(rng, num_chains)
+    if step_sizes is None:
+        step_sizes = np.full(num_chains, 2.4 * posterior.scale_guess())
+    position = np.array(start, dtype=np.float64)
+    log_step = np.log(step_sizes)
+    log_density = posterior.log_density(position)
+
+    def advance(log_step):
+        nonlocal position, log_density
+        proposal = position + np.exp(log_step) * rng.standard_normal(num_chains)
+        proposal_density = posterior.log_density(proposal)
+        accept = np.log(rng.random(num_chains)) < proposal_density - log_density
+        position = np.where(accept, proposal, position)
+        log_density = np.where(accept, proposal_density, log_density)
+        return accept
+
+    low, high = np.inf, -np.inf
+    for iteration in range(warmup):
+        accept = advance(log_step)
+        log_step = log_step + (accept - TARGET_ACCEPTANCE) / (iteration + 1) ** 0.6
+        if iteration >= warmup // 2:
+            low, high = min(low, position.min()), max(high, position.max())
+    if not np.isfinite(low):
+        low, high = position.min(), position.max()
+    span = high - low
+
+    draws = Histogram(low - 0.5 * span, high + 0.5 * span, bins)
+    moments = Moments()
+    monitor = ChainMonitor(num_chains, num_draws)
+    buffer = np.empty((min(FLUSH_STEPS, num_draws), num_chains))
+    accepted = 0
+    for iteration in range(num_draws):
+        accepted += np.count_nonzero(advance(log_step))
+        monitor.update(position)
+        buffer[iteration % buffer.shape[0]] = position
+        if (iteration + 1) % buffer.shape[0] == 0 or iteration + 1 == num_draws:
+            filled = buffer[:iteration % buffer.shape[0] + 1]
+            draws.update(filled)
+            moments.update(filled)
+
+    return {
+        'histogram': draws,
+        'moments': moments,
+        'r_hat': monitor.r_hat(),
+        'ess': monitor.ess(),
+        'acceptance': accepted / (num_chains * num_draws),
+        'position': position,
+        'step_sizes': np.exp(log_step),
+    }
+
+
+# Sequential updating: fold one more batch into the data summary and continue the chains from
+# where the previous posterior left them, with a short re-adaptation instead of a full warmup
+def update_chains(previous, batch, prior, likelihood_std_dev, num_chains, num_draws, rng, warmup=200, bins=30):
+    data_moments = Moments() if previous is None else Moments.from_state(previous['data_moments'].state())
+    data_moments.update(batch)
+    posterior = NormalMeanPosterior(prior, likelihood_std_dev, data_moments)
+    if previous is None:
+        result = sample_chains(posterior, num_chains, num_draws, rng, bins=bins)
+    else:
+        # The posterior narrows like 1 / sqrt(n), so narrow the adapted steps with it
+        shrink = np.sqrt(max(previous['data_moments'].count, 1) / data_moments.count)
+        result = sample_chains(posterior, num_chains, num_draws, rng, warmup, previous['position'],
+                               previous['step_sizes'] * shrink, bins)
+    result['data_moments'] = data_moments
+    return result
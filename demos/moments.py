@@ -0,0 +1,115 @@
+import numpy as np
+
+# Values reduced per chunk when streaming a large array
+DEFAULT_CHUNK_SIZE = 1 << 20
+
+# Compact values (float32, small integers) are widened to float64 this many at a time
+WIDEN_BLOCK_SIZE = 1 << 16
+
+
+# One-pass count, mean, central moment sums (M2..M4), min and max.
+# Chunks are reduced with numpy and folded in with the pairwise update of Chan et al.
+# (extended to M3/M4 by Pebay), so partial results from separate workers merge exactly.
+class Moments:
+    __slots__ = ('count', 'mean', 'm2', 'm3', 'm4', 'min', 'max')
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.m3 = 0.0
+        self.m4 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    @classmethod
+    def from_array(cls, values, chunk_size=DEFAULT_CHUNK_SIZE):
+        moments = cls()
+        values = np.ravel(values)
+        for start in range(0, values.size, chunk_size):
+            moments.update(values[start:start + chunk_size])
+        return moments
+
+    @classmethod
+    def from_state(cls, state):
+        moments = cls()
+        for name, value in zip(cls.__slots__, state):
+            setattr(moments, name, value)
+        return moments
+
+    def state(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    # Fold one chunk of values into the running totals. Sums always run in float64; values
+    # narrower than that are widened a block at a time rather than copied whole.
+    def update(self, values):
+        values = np.asarray(values).ravel()
+        if values.dtype.itemsize < 8 and values.size > WIDEN_BLOCK_SIZE:
+            for start in range(0, values.size, WIDEN_BLOCK_SIZE):
+                self.update(values[start:start + WIDEN_BLOCK_SIZE])
+            return self
+        values = values.astype(np.float64, copy=False)
+        if values.size == 0:
+            return self
+        chunk = Moments()
+        chunk.count = values.size
+        chunk.mean = float(values.mean())
+        deviations = values - chunk.mean
+        squared = deviations * deviations
+        chunk.m2 = float(squared.sum())
+        chunk.m3 = float(np.dot(squared, deviations))
+        chunk.m4 = float(np.dot(squared, squared))
+        chunk.min = float(values.min())
+        chunk.max = float(values.max())
+        return self.merge(chunk)
+
+    # Combine with the moments of a disjoint set of values
+    def merge(self, other):
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            for name in self.__slots__:
+                setattr(self, name, getattr(other, name))
+            return self
+
+        n_a, n_b = self.count, other.count
+        n = n_a + n_b
+        delta = other.mean - self.mean
+        delta_n = delta / n
+
+        m4 = (self.m4 + other.m4
+              + delta * delta_n ** 3 * n_a * n_b * (n_a * n_a - n_a * n_b + n_b * n_b)
+              + 6 * delta_n ** 2 * (n_a * n_a * other.m2 + n_b * n_b * self.m2)
+              + 4 * delta_n * (n_a * other.m3 - n_b * self.m3))
+        m3 = (self.m3 + other.m3
+              + delta * delta_n ** 2 * n_a * n_b * (n_a - n_b)
+              + 3 * delta_n * (n_a * other.m2 - n_b * self.m2))
+        m2 = self.m2 + other.m2 + delta * delta_n * n_a * n_b
+
+        self.count = n
+        self.mean = self.mean + delta_n * n_b
+        self.m2, self.m3, self.m4 = m2, m3, m4
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def var(self, ddof=0):
+        if self.count - ddof <= 0:
+            return np.nan
+        return self.m2 / (self.count - ddof)
+
+    def std(self, ddof=0):
+        return np.sqrt(self.var(ddof))
+
+    # Moment-based (biased) skewness and excess kurtosis, as scipy.stats computes by default
+    @property
+    def skewness(self):
+        if self.m2 == 0:
+            return np.nan
+        return np.sqrt(self.count) * self.m3 / self.m2 ** 1.5
+
+    @property
+    def kurtosis(self):
+        if self.m2 == 0:
+            return np.nan
+        return self.count * self.m4 / self.m2 ** 2 - 3
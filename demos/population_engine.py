@@ -0,0 +1,262 @@
+import atexit
+import contextlib
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from demos.cache import remove_files
+from demos.moments import Moments
+
+# Each process writes its populations into its own directory under this one, removed on exit
+POPULATION_DIR = os.environ.get("STATS_APP_POPULATION_DIR",
+                                os.path.join(tempfile.gettempdir(), "stats_app_populations"))
+
+# Disk budget for population files; the least recently opened ones are deleted to make room
+MAX_POPULATION_BYTES = int(os.environ.get("STATS_APP_POPULATION_BYTES", 16 * 1024 ** 3))
+
+# Rows read or generated per chunk; bounds peak memory independently of the population size
+DEFAULT_CHUNK_ROWS = 2 ** 22
+
+# Rows sampled to place the strata cuts
+PILOT_ROWS = 2 ** 20
+
+_lock = threading.Lock()
+_directory = None
+# Finished population files (path -> bytes), least recently opened first
+_populations = OrderedDict()
+# Deleted files a session still has mapped (path -> bytes), retried until they are gone
+_deleting = {}
+# Bytes of finished files, of those being written and of those waiting to be deleted
+_population_bytes = 0
+
+
+def iter_chunks(population, chunk_rows=DEFAULT_CHUNK_ROWS):
+    for start in range(0, len(population), chunk_rows):
+        yield start, np.asarray(population[start:start + chunk_rows])
+
+
+def population_nbytes(population_size):
+    return population_size * np.dtype(np.float64).itemsize
+
+
+def _population_dir():
+    global _directory
+    with _lock:
+        if _directory is None:
+            os.makedirs(POPULATION_DIR, exist_ok=True)
+            _directory = tempfile.mkdtemp(prefix=f"{os.getpid()}-", dir=POPULATION_DIR)
+            atexit.register(shutil.rmtree, _directory, True)
+        return _directory
+
+
+# File of a population; its content depends only on (dist, size, seed), as each chunk has its own child seed
+def population_path(dist, population_size, seed, chunk_rows=DEFAULT_CHUNK_ROWS):
+    name = hashlib.blake2b(repr((dist.key, population_size, seed, chunk_rows)).encode(), digest_size=8).hexdigest()
+    return os.path.join(_population_dir(), f"population-{name}.npy")
+
+
+# Whether the file at `path` is finished; counts as a use for the disk LRU
+def population_ready(path):
+    with _lock:
+        if path not in _populations:
+            return False
+        _populations.move_to_end(path)
+        return True
+
+
+# Make room for `size` more bytes by deleting the least recently opened populations. A deleted file
+# counts against the budget until it is really gone, which on Windows waits for every session
+# mapping it to let go.
+def _reserve(size):
+    global _population_bytes
+    if size > MAX_POPULATION_BYTES:
+        raise ValueError(f"A population of {size / 1024 ** 3:.1f} GB exceeds the "
+                         f"{MAX_POPULATION_BYTES / 1024 ** 3:.1f} GB disk budget")
+    while True:
+        removed = []
+        with _lock:
+            if _population_bytes + size <= MAX_POPULATION_BYTES:
+                _population_bytes += size
+                return
+            while _populations and _population_bytes + size > MAX_POPULATION_BYTES:
+                path, old_size = _populations.popitem(last=False)
+                _deleting[path] = old_size
+                removed.append(path)
+            held = _population_bytes
+        waiting = remove_files([removed])
+        with _lock:
+            for path in [path for path in _deleting if path not in waiting]:
+                _population_bytes -= _deleting.pop(path)
+            if not removed and _population_bytes >= held:
+                raise ValueError(f"The {MAX_POPULATION_BYTES / 1024 ** 3:.1f} GB disk budget is taken by "
+                                 "populations still being written or still in use")
+
+
+# Write the population to `path` chunk by chunk, yielding (chunks done, number of chunks, path) like
+# a chunked stage, so the page can run it as a background job; closing the generator early (a
+# cancelled job) deletes the partial file
+def write_population(dist, population_size, seed, path, chunk_rows=DEFAULT_CHUNK_ROWS):
+    global _population_bytes
+    size = population_nbytes(population_size)
+    _reserve(size)
+    partial = f"{path}.{threading.get_ident()}.partial"
+    finished = False
+    try:
+        population = np.lib.format.open_memmap(partial, mode='w+', dtype=np.float64, shape=(population_size,))
+        try:
+            num_chunks = -(-population_size // chunk_rows)
+            for index, child in enumerate(np.random.SeedSequence(seed).spawn(num_chunks)):
+                start = index * chunk_rows
+                stop = min(start + chunk_rows, population_size)
+                population[start:stop] = dist.rvs(np.random.Generator(np.random.PCG64(child)), stop - start)
+                yield index + 1, num_chunks, path
+            population.flush()
+        finally:
+            del population
+        try:
+            os.replace(partial, path)
+        except OSError:
+            # Windows will not replace a file a session has mapped, which is another writer's finished copy
+            with _lock:
+                if path not in _populations:
+                    raise
+            remove_files([[partial]])
+        finished = True
+    finally:
+        with _lock:
+            # Another writer finished the same file first, or this one failed: give back the reservation
+            if not finished or path in _populations:
+                _population_bytes -= size
+            else:
+                _populations[path] = size
+        if not finished:
+            remove_files([[partial]])
+
+
+# Memory-mapped .npy population, generated chunk by chunk on first use and reused afterwards
+def open_population(dist, population_size, seed, chunk_rows=DEFAULT_CHUNK_ROWS):
+    path = population_path(dist, population_size, seed, chunk_rows)
+    while True:
+        if not population_ready(path):
+            for _ in write_population(dist, population_size, seed, path, chunk_rows):
+                pass
+        # Deleted by another session's reservation in between: write it again
+        with contextlib.suppress(FileNotFoundError):
+            return np.load(path, mmap_mode='r')
+
+
+# Sorted row indices for a simple random sample; gathers from a memmap touch only those pages
+def simple_random_sample(population, sample_size, rng):
+    indices = np.sort(rng.choice(len(population), sample_size, replace=False))
+    return np.asarray(population[indices])
+
+
+def systematic_sample(population, sample_size, rng):
+    interval = max(1, len(population) // sample_size)
+    start = int(rng.integers(0, interval))
+    # Copied, so the cached sample does not keep the population file mapped
+    return np.array(population[start::interval][:sample_size])
+
+
+# k - 1 equal-frequency cuts from np.argpartition; on a large population they come from a
+# random pilot of PILOT_ROWS rows, so only the pilot is ever sorted (partially)
+def strata_cuts(population, num_strata, rng, pilot_rows=PILOT_ROWS):
+    if len(population) > pilot_rows:
+        values = simple_random_sample(population, pilot_rows, rng)
+    else:
+        values = np.array(population, dtype=np.float64)
+    positions = (np.arange(1, num_strata) * len(values)) // num_strata
+    partitioned = values[np.argpartition(values, positions)]
+    return partitioned[positions]
+
+
+# Size and moments of every stratum of one chunk, from one np.bincount per moment sum rather than one
+# boolean mask per stratum; each is merged into the running totals with Moments.merge
+def _stratum_moments(chunk, labels, num_strata):
+    counts = np.bincount(labels, minlength=num_strata)
+    means = np.bincount(labels, weights=chunk, minlength=num_strata) / np.maximum(counts, 1)
+    deviations = chunk - means[labels]
+    squared = deviations * deviations
+    m2 = np.bincount(labels, weights=squared, minlength=num_strata)
+    m3 = np.bincount(labels, weights=squared * deviations, minlength=num_strata)
+    m4 = np.bincount(labels, weights=squared * squared, minlength=num_strata)
+    minima = np.full(num_strata, np.inf)
+    np.minimum.at(minima, labels, chunk)
+    maxima = np.full(num_strata, -np.inf)
+    np.maximum.at(maxima, labels, chunk)
+    return [Moments.from_state((int(state[0]),) + tuple(float(value) for value in state[1:]))
+            for state in zip(counts, means, m2, m3, m4, minima, maxima)]
+
+
+# One streamed pass: stratum of every row, with the size and moments of each stratum
+def strata_summary(population, cuts, chunk_rows=DEFAULT_CHUNK_ROWS):
+    summaries = [Moments() for _ in range(len(cuts) + 1)]
+    for _, chunk in iter_chunks(population, chunk_rows):
+        labels = np.searchsorted(cuts, chunk, side='right')
+        for summary, part in zip(summaries, _stratum_moments(chunk, labels, len(summaries))):
+            summary.merge(part)
+    return summaries
+
+
+# Proportional (n_h ~ N_h) or Neyman (n_h ~ N_h S_h) allocation, rounded by largest remainder
+# and capped at each stratum's size
+def allocate(summaries, sample_size, method="Proportional"):
+    sizes = np.array([summary.count for summary in summaries], dtype=np.float64)
+    if method == "Proportional":
+        weights = sizes
+    elif method == "Neyman":
+        weights = sizes * np.array([summary.std(ddof=1) if summary.count > 1 else 0.0 for summary in summaries])
+    else:
+        raise ValueError(f"Unknown allocation: {method!r}")
+    if weights.sum() == 0:
+        weights = sizes
+    exact = sample_size * weights / weights.sum()
+    allocation = np.floor(exact).astype(np.int64)
+    remainder = sample_size - allocation.sum()
+    allocation[np.argsort(allocation - exact)[:remainder]] += 1
+    return np.minimum(allocation, sizes.astype(np.int64))
+
+
+# Second streamed pass: within each stratum take the rows whose within-stratum rank was drawn
+def stratified_sample(population, cuts, allocation, summaries, rng, chunk_rows=DEFAULT_CHUNK_ROWS):
+    targets = [np.sort(rng.choice(summary.count, size, replace=False)) if size else np.empty(0, dtype=np.int64)
+               for summary, size in zip(summaries, allocation)]
+    seen = np.zeros(len(targets), dtype=np.int64)
+    picked = [[] for _ in targets]
+    for _, chunk in iter_chunks(population, chunk_rows):
+        labels = np.searchsorted(cuts, chunk, side='right')
+        for stratum, wanted in enumerate(targets):
+            rows = np.flatnonzero(labels == stratum)
+            lower, upper = np.searchsorted(wanted, [seen[stratum], seen[stratum] + rows.size])
+            picked[stratum].append(chunk[rows[wanted[lower:upper] - seen[stratum]]])
+            seen[stratum] += rows.size
+    return [np.concatenate(parts) if parts else np.empty(0) for parts in picked]
+
+
+# Algorithm L (Li, 1994): a uniform sample of k rows from a stream of unknown length in one pass.
+# After the reservoir fills, the gap to the next replacement is drawn directly, so only
+# O(k log(N / k)) random numbers are needed and skipped rows are never touched individually.
+def reservoir_sample(chunks, k, rng):
+    reservoir = np.empty(k)
+    filled = 0
+    weight = np.exp(np.log(rng.random()) / k)
+    next_index = None
+    offset = 0
+    for chunk in chunks:
+        chunk = np.asarray(chunk)
+        if filled < k:
+            take = min(k - filled, chunk.size)
+            reservoir[filled:filled + take] = chunk[:take]
+            filled += take
+            if filled == k:
+                next_index = offset + take + int(np.floor(np.log(rng.random()) / np.log1p(-weight)))
+        while next_index is not None and next_index < offset + chunk.size:
+            reservoir[rng.integers(0, k)] = chunk[next_index - offset]
+            weight *= np.exp(np.log(rng.random()) / k)
+            next_index += int(np.floor(np.log(rng.random()) / np.log1p(-weight))) + 1
+        offset += chunk.size
+    return reservoir[:filled]
@@ -0,0 +1,48 @@
+import numpy as np
+from scipy.stats import t
+
+# Working-set size for one (replicates, n) block of draws
+DEFAULT_MEMORY_BUDGET = 64 * 1024 ** 2
+
+
+# Per-replicate means and unbiased variances of `num_replicates` samples of size n, in blocks
+def _replicate_moments(dist, sample_size, num_replicates, rng, memory_budget):
+    means = np.empty(num_replicates)
+    variances = np.empty(num_replicates)
+    rows = max(1, int(memory_budget // (2 * sample_size * np.dtype(np.float64).itemsize)))
+    for start in range(0, num_replicates, rows):
+        stop = min(start + rows, num_replicates)
+        samples = dist.rvs(rng, (stop - start, sample_size))
+        means[start:stop] = samples.mean(axis=1)
+        variances[start:stop] = samples.var(axis=1, ddof=1)
+    return means, variances
+
+
+# Rejection rate of the two-sided t-test over a sample-size x effect-size grid.
+# Effects are true-mean shifts in units of the population standard deviation; the
+# data are drawn once per sample size and every shift is applied to the reduced moments,
+# so one vectorised t.sf call covers all effects and replicates. Row 0 of an effect grid
+# starting at 0 is the empirical type I error.
+def power_surface(dist, sample_sizes, effect_sizes, num_replicates, alpha, rng, test="One-Sample t-Test",
+                  memory_budget=DEFAULT_MEMORY_BUDGET):
+    effect_sizes = np.asarray(effect_sizes, dtype=np.float64)
+    shifts = effect_sizes[:, None] * dist.std
+    power = np.empty((effect_sizes.size, len(sample_sizes)))
+
+    for column, n in enumerate(sample_sizes):
+        means, variances = _replicate_moments(dist, n, num_replicates, rng, memory_budget)
+        if test == "One-Sample t-Test":
+            # H0: mean == dist.mean, truth: dist.mean + shift
+            t_stats = (means - dist.mean + shifts) / np.sqrt(variances / n)
+            df = n - 1
+        elif test == "Two-Sample t-Test":
+            # Equal-size second sample from the same family, shifted by `shift` (pooled-variance test)
+            means2, variances2 = _replicate_moments(dist, n, num_replicates, rng, memory_budget)
+            pooled = ((n - 1) * variances + (n - 1) * variances2) / (2 * n - 2)
+            t_stats = (means2 + shifts - means) / np.sqrt(pooled * 2 / n)
+            df = 2 * n - 2
+        else:
+            raise ValueError(f"Unknown test: {test!r}")
+        p_values = 2 * t.sf(np.abs(t_stats), df)
+        power[:, column] = np.mean(p_values < alpha, axis=1)
+    return power
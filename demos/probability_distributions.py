@@ -1,76 +1,134 @@
-import streamlit as st
-import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-from scipy.stats import norm, expon, binom, poisson
-
-def show():
-    st.title("Probability Distributions Demonstration")
-    st.sidebar.title("Settings")
-
-    # User inputs from the sidebar
-    dist_type = st.sidebar.selectbox("Choose the distribution:", ("Normal", "Exponential", "Binomial", "Poisson"))
-
-    # Parameters for the selected distribution
-    if dist_type == "Normal":
-        mean = st.sidebar.number_input("Mean:", value=0.0)
-        std_dev = st.sidebar.number_input("Standard Deviation:", value=1.0)
-    elif dist_type == "Exponential":
-        rate = st.sidebar.number_input("Rate (lambda):", value=1.0)
-    elif dist_type == "Binomial":
-        n = st.sidebar.number_input("Number of trials:", value=10)
-        p = st.sidebar.number_input("Probability of success:", value=0.5)
-    elif dist_type == "Poisson":
-        lam = st.sidebar.number_input("Lambda (rate of events):", value=3.0)
-
-    # Function to generate the data and theoretical PDF
-    def generate_data(dist_type, size=1000):
-        if dist_type == "Normal":
-            data = np.random.normal(mean, std_dev, size)
-            x = np.linspace(min(data), max(data), 100)
-            pdf = norm.pdf(x, mean, std_dev)
-        elif dist_type == "Exponential":
-            data = np.random.exponential(1/rate, size)
-            x = np.linspace(min(data), max(data), 100)
-            pdf = expon.pdf(x, scale=1/rate)
-        elif dist_type == "Binomial":
-            data = np.random.binomial(n, p, size)
-            x = np.arange(0, n+1)
-            pdf = binom.pmf(x, n, p)
-        elif dist_type == "Poisson":
-            data = np.random.poisson(lam, size)
-            x = np.arange(0, max(data)+1)
-            pdf = poisson.pmf(x, lam)
-        return data, x, pdf
-
-    # Generate data
-    data, x, pdf = generate_data(dist_type)
-
-    # Plotting
-    fig, ax = plt.subplots(figsize=(10, 6))
-    sns.histplot(data, bins=30, kde=False, stat='density', ax=ax, edgecolor='black')
-    if dist_type in ["Normal", "Exponential"]:
-        ax.plot(x, pdf, 'r-', lw=2)
-    else:
-        ax.stem(x, pdf, 'r-', basefmt=" ", use_line_collection=True)
-    ax.set_title(f"{dist_type} Distribution")
-    ax.set_xlabel("Value")
-    ax.set_ylabel("Density")
-
-    st.pyplot(fig)
-
-    # Display summary statistics
-    st.write("Summary Statistics:")
-    st.write(f"Mean: {np.mean(data):.2f}")
-    st.write(f"Standard Deviation: {np.std(data):.2f}")
-    st.write(f"Variance: {np.var(data):.2f}")
-
-    # Display distribution specific information
-    if dist_type == "Normal":
-        st.write(f"Theoretical PDF: Mean = {mean}, Std Dev = {std_dev}")
-    elif dist_type == "Exponential":
-        st.write(f"Theoretical PDF: Rate (lambda) = {rate}")
-    elif dist_type == "Binomial":
-        st.write(f"Theoretical PMF: Number of trials (n) = {n}, Probability of success (p) = {p}")
-    elif dist_type == "Poisson":
-        st.write(f"Theoretical PMF: Lambda (rate of events) = {lam}")
+import streamlit as st
+import numpy as np
+from demos.cache import seed_input
+from demos.distributions import get_distribution
+from demos.executor import simulate_draws, support_range
+from demos.figures import HistogramPanel, plot_backend, render_histograms, show_stage_figure
+from demos.rendering import Histogram
+from demos.stages import Stage, StageGraph
+
+# Draw counts on offer; 0 shows the exact curve and moments alone
+DRAW_OPTIONS = (0, 1000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+# Points of the density curve, and the widest discrete support still drawn as stems
+CURVE_POINTS = 200
+MAX_STEMS = 60
+
+def show():
+    st.title("Probability Distributions Demonstration")
+    st.sidebar.title("Settings")
+
+    # User inputs from the sidebar
+    dist_type = st.sidebar.selectbox("Choose the distribution:", ("Normal", "Exponential", "Binomial", "Poisson"))
+
+    # Parameters for the selected distribution
+    if dist_type == "Normal":
+        mean = st.sidebar.number_input("Mean:", value=0.0)
+        std_dev = st.sidebar.number_input("Standard Deviation:", value=1.0)
+        params = {'mean': mean, 'std_dev': std_dev}
+    elif dist_type == "Exponential":
+        rate = st.sidebar.number_input("Rate (lambda):", value=1.0)
+        params = {'rate': rate}
+    elif dist_type == "Binomial":
+        n = st.sidebar.number_input("Number of trials:", value=10)
+        p = st.sidebar.number_input("Probability of success:", value=0.5)
+        params = {'n': n, 'p': p}
+    elif dist_type == "Poisson":
+        lam = st.sidebar.number_input("Lambda (rate of events):", value=3.0)
+        params = {'lam': lam}
+    num_draws = st.sidebar.select_slider("Number of draws:", options=DRAW_OPTIONS, value=1000,
+                                         format_func=lambda n: "None (exact only)" if n == 0 else f"{n:,}")
+    seed = seed_input()
+
+    # Selected distribution from the shared registry
+    dist = get_distribution(dist_type, **params)
+
+    run = DISTRIBUTION_STAGES.run(distribution_inputs(dist, seed, num_draws, backend=plot_backend()))
+
+    # Plotting
+    show_stage_figure("probability_distributions", run)
+
+    # Display exact moments, and those of the draws next to them
+    exact = run['statistic']['exact']
+    st.write("Exact Moments:")
+    st.write(f"Mean: {exact['mean']:.4f}")
+    st.write(f"Standard Deviation: {exact['std']:.4f}")
+    st.write(f"Variance: {exact['var']:.4f}")
+    st.write(f"Skewness: {exact['skewness']:.4f}")
+    st.write(f"Excess Kurtosis: {exact['kurtosis']:.4f}")
+    if run['sample'] is not None:
+        moments = run['sample'].moments
+        st.write(f"Summary Statistics of {moments.count:,} Draws:")
+        st.write(f"Mean: {moments.mean:.4f}")
+        st.write(f"Standard Deviation: {moments.std():.4f}")
+        st.write(f"Variance: {moments.var():.4f}")
+        st.write(f"Skewness: {moments.skewness:.4f}")
+        st.write(f"Excess Kurtosis: {moments.kurtosis:.4f}")
+
+    # Display distribution specific information
+    if dist_type == "Normal":
+        st.write(f"Theoretical PDF: Mean = {mean}, Std Dev = {std_dev}")
+    elif dist_type == "Exponential":
+        st.write(f"Theoretical PDF: Rate (lambda) = {rate}")
+    elif dist_type == "Binomial":
+        st.write(f"Theoretical PMF: Number of trials (n) = {n}, Probability of success (p) = {p}")
+    elif dist_type == "Poisson":
+        st.write(f"Theoretical PMF: Lambda (rate of events) = {lam}")
+
+
+# Histogram range and bin count: all but about 0.1 expected draws beyond each end (as for 1,000
+# draws when there are none), with a whole number of values per bin for discrete families
+def histogram_layout(dist, num_draws, bins=30):
+    lower, upper = support_range(dist, 0.1 / max(num_draws, 1000))
+    if dist.discrete:
+        values_per_bin = max(1, int(np.ceil((upper - lower) / bins)))
+        bins = int(np.ceil((upper - lower) / values_per_bin))
+        upper = lower + bins * values_per_bin
+    return (lower, upper), bins
+
+
+# Draws are binned chunk by chunk, so up to 10^7 of them never sit in memory at once
+def draw_sample(dist, size, rng):
+    if size == 0:
+        return None
+    draws_range, bins = histogram_layout(dist, size)
+    return simulate_draws(dist, size, rng.bit_generator.seed_seq, draws_range, bins)
+
+
+# Theoretical density or mass over the ppf-based support, and the exact moments; no draws needed
+def density_curve(dist, size):
+    x = dist.grid(CURVE_POINTS, 0.1 / max(size, 1000))
+    mean, var, skewness, kurtosis = dist.exact_moments()
+    return {'x': x, 'density': dist.density(x), 'stems': dist.discrete and x.size <= MAX_STEMS,
+            'exact': {'mean': mean, 'var': var, 'std': np.sqrt(var), 'skewness': skewness, 'kurtosis': kurtosis}}
+
+
+def plot_distribution(dist, backend, size, sample, statistic):
+    # Without draws the histogram is empty and only the exact curve shows
+    draws_range, bins = histogram_layout(dist, size)
+    histogram = Histogram(*draws_range, bins) if sample is None else sample.histogram
+    curve_kind = 'stem' if statistic['stems'] else 'line'
+    return render_histograms([HistogramPanel(
+        histogram, f"{dist.name} Distribution", bins=bins, stat='density', edgecolor='black',
+        curves=[(statistic['x'], statistic['density'], None, 'r', curve_kind)], xlabel="Value",
+    )], backend)
+
+
+DISTRIBUTION_STAGES = StageGraph("probability_distributions", [
+    Stage("sample", draw_sample, reads=("dist", "size"), stream="probability_distributions"),
+    Stage("statistic", density_curve, reads=("dist", "size")),
+    Stage("figure", plot_distribution, reads=("dist", "backend", "size"), after=("sample", "statistic")),
+])
+
+
+def distribution_inputs(dist, seed, size=1000, backend=None):
+    return {'dist': dist, 'size': size, 'seed': seed, 'backend': backend}
+
+
+# Exact density or mass and moments of `dist`, with the histogram and moments of `size` draws
+def compute(dist, seed, size=1000):
+    run = DISTRIBUTION_STAGES.run(distribution_inputs(dist, seed, size), targets=("sample", "statistic"))
+    result = dict(run['statistic'])
+    if run['sample'] is not None:
+        result.update(histogram=run['sample'].histogram, moments=run['sample'].moments)
+    return result
@@ -0,0 +1,348 @@
+import argparse
+import contextlib
+import json
+import math
+import numbers
+import os
+import threading
+import time
+import tracemalloc
+
+import streamlit as st
+
+# Profile every rerun (for production logging) rather than only when the sidebar checkbox is ticked.
+# Production profiles record wall and CPU timers only; allocation tracing is a per-session debug option.
+PROFILE_ALL = os.environ.get("STATS_APP_PROFILE", "0") == "1"
+
+# One JSON record per profiled rerun is appended here
+LOG_PATH = os.environ.get("STATS_APP_PROFILE_LOG")
+
+# Prometheus text-format file rewritten after every profiled rerun (node_exporter textfile collector)
+METRICS_PATH = os.environ.get("STATS_APP_PROFILE_METRICS")
+
+# Stage the time outside every timed stage is reported under: scipy tests, NumPy reductions, page code
+REMAINDER_STAGE = "statistics"
+
+# Prometheus' default latency buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Each Streamlit session reruns its script on its own thread, so the active profile is per thread
+_local = threading.local()
+
+_lock = threading.Lock()
+# Reruns in progress in any session, and the one profile allowed to trace allocations at a time
+_running_reruns = 0
+_tracer = None
+
+# (demo, bucket, stage) -> [bucket counts..., sum of seconds, count, sum of CPU seconds] since start-up
+_histograms = {}
+
+
+# Timing and allocation frame of one stage; `peak` is the highest traced memory seen inside it so far.
+# CPU time is that of the rerun's own thread, so other sessions' work is not counted.
+class _Frame:
+    __slots__ = ('stage', 'start', 'start_cpu', 'start_bytes', 'peak', 'child_seconds', 'child_cpu_seconds')
+
+    def __init__(self, stage):
+        self.stage = stage
+        self.start = time.perf_counter()
+        self.start_cpu = time.thread_time()
+        self.start_bytes = 0
+        self.peak = 0
+        self.child_seconds = 0.0
+        self.child_cpu_seconds = 0.0
+
+
+class Profile:
+    __slots__ = ('demo', 'stages', 'num_values', 'frames', 'total_seconds', 'total_cpu_seconds', 'peak_bytes',
+                 'traced', 'tracing_refused', 'shared')
+
+    def __init__(self, demo):
+        self.demo = demo
+        # stage -> {'calls', 'seconds', 'cpu_seconds', 'peak_bytes'}; times exclude nested stages
+        self.stages = {}
+        self.num_values = 0
+        self.frames = []
+        self.total_seconds = 0.0
+        self.total_cpu_seconds = 0.0
+        self.peak_bytes = 0
+        # Allocation tracing: on for this rerun, asked for but refused, and whether other reruns
+        # allocated while it was on (tracemalloc counts every thread of the process)
+        self.traced = False
+        self.tracing_refused = False
+        self.shared = False
+
+    def enter(self, stage):
+        frame = _Frame(stage)
+        if self.traced:
+            current, peak = tracemalloc.get_traced_memory()
+            if self.frames:
+                self.frames[-1].peak = max(self.frames[-1].peak, peak)
+            tracemalloc.reset_peak()
+            frame.start_bytes = frame.peak = current
+        self.frames.append(frame)
+        return frame
+
+    def exit(self):
+        frame = self.frames.pop()
+        seconds = time.perf_counter() - frame.start
+        cpu_seconds = time.thread_time() - frame.start_cpu
+        peak = frame.peak
+        if self.traced:
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+        if self.frames:
+            self.frames[-1].child_seconds += seconds
+            self.frames[-1].child_cpu_seconds += cpu_seconds
+            self.frames[-1].peak = max(self.frames[-1].peak, peak)
+        entry = self.stages.setdefault(frame.stage, {'calls': 0, 'seconds': 0.0, 'cpu_seconds': 0.0, 'peak_bytes': 0})
+        entry['calls'] += 1
+        entry['seconds'] += seconds - frame.child_seconds
+        entry['cpu_seconds'] += cpu_seconds - frame.child_cpu_seconds
+        entry['peak_bytes'] = max(entry['peak_bytes'], peak - frame.start_bytes)
+        return seconds, cpu_seconds
+
+    # Order of magnitude of the values the rerun sampled, e.g. "1e5"; groups reruns of similar size
+    def bucket(self):
+        if not self.num_values:
+            return "0"
+        return f"1e{int(math.log10(self.num_values))}"
+
+    def record(self):
+        return {
+            'time': time.strftime("%Y-%m-%dT%H:%M:%S"),
+            'demo': self.demo,
+            'bucket': self.bucket(),
+            'total_ms': self.total_seconds * 1000,
+            'cpu_ms': self.total_cpu_seconds * 1000,
+            'stages': {stage: {'calls': entry['calls'], 'ms': entry['seconds'] * 1000,
+                               'cpu_ms': entry['cpu_seconds'] * 1000}
+                       for stage, entry in self.stages.items()},
+        }
+
+
+def active_profile():
+    return getattr(_local, "profile", None)
+
+
+# Time the enclosed block as `stage` of the active profile; does nothing when no rerun is profiled
+@contextlib.contextmanager
+def stage(name):
+    profile = active_profile()
+    if profile is None:
+        yield
+        return
+    profile.enter(name)
+    try:
+        yield
+    finally:
+        profile.exit()
+
+
+# Count the values behind a cached sample towards the rerun's size bucket: array elements, or the
+# count of the Moments that streamed simulations (Aggregate) keep instead of the draws
+def note_values(value):
+    profile = active_profile()
+    if profile is None:
+        return
+    if hasattr(value, 'dtype') and isinstance(getattr(value, 'size', None), int):
+        profile.num_values += value.size
+    elif isinstance(value, (tuple, list)):
+        for item in value:
+            note_values(item)
+    elif isinstance(value, dict):
+        for item in value.values():
+            note_values(item)
+    elif hasattr(value, 'moments'):
+        note_values(value.moments)
+    elif isinstance(getattr(value, 'count', None), numbers.Integral):
+        profile.num_values += int(value.count)
+
+
+def profile_input():
+    if st.sidebar.checkbox("Profile reruns", key="profile_reruns") or PROFILE_ALL:
+        st.sidebar.checkbox("Trace allocations (debug)", key="trace_allocations")
+
+
+def profiling_enabled():
+    return PROFILE_ALL or st.session_state.get("profile_reruns", False)
+
+
+# tracemalloc is process-wide and slows every thread, so only one rerun at a time may trace; the
+# others are refused rather than resetting its peak
+def _start_tracing(profile):
+    global _tracer
+    with _lock:
+        if _tracer is not None or tracemalloc.is_tracing():
+            return False
+        _tracer = profile
+        profile.shared = _running_reruns > 1
+        tracemalloc.start()
+        return True
+
+
+def _stop_tracing():
+    global _tracer
+    with _lock:
+        _tracer = None
+        tracemalloc.stop()
+
+
+# Profile one rerun of `demo`: yields the Profile, or None when profiling is off. Reruns that
+# Streamlit interrupts (or that raise) are dropped rather than logged with a partial breakdown,
+# as are traced reruns, whose timings tracemalloc inflates.
+@contextlib.contextmanager
+def profiled_run(demo):
+    global _running_reruns
+    with _lock:
+        _running_reruns += 1
+        # Allocations of this rerun also show up in the traced rerun's numbers
+        if _tracer is not None:
+            _tracer.shared = True
+    try:
+        if not profiling_enabled():
+            yield None
+            return
+        profile = Profile(demo)
+        if st.session_state.get("trace_allocations", False):
+            profile.traced = _start_tracing(profile)
+            profile.tracing_refused = not profile.traced
+        _local.profile = profile
+        root = profile.enter(REMAINDER_STAGE)
+        completed = False
+        try:
+            yield profile
+            completed = True
+        finally:
+            profile.total_seconds, profile.total_cpu_seconds = profile.exit()
+            if profile.traced:
+                profile.peak_bytes = max(root.peak, tracemalloc.get_traced_memory()[1]) - root.start_bytes
+                _stop_tracing()
+            _local.profile = None
+        if completed and not profile.traced:
+            publish(profile)
+    finally:
+        with _lock:
+            _running_reruns -= 1
+
+
+def publish(profile):
+    record = profile.record()
+    with _lock:
+        for name, entry in profile.stages.items():
+            _observe((profile.demo, record['bucket'], name), entry['seconds'], entry['cpu_seconds'])
+        _observe((profile.demo, record['bucket'], "total"), profile.total_seconds, profile.total_cpu_seconds)
+        if LOG_PATH:
+            with open(LOG_PATH, "a") as handle:
+                handle.write(json.dumps(record) + "\n")
+        if METRICS_PATH:
+            # Written next to the target and renamed, so a scrape never sees half a file
+            temporary = f"{METRICS_PATH}.tmp"
+            with open(temporary, "w") as handle:
+                handle.write(metrics_text())
+            os.replace(temporary, METRICS_PATH)
+
+
+def _observe(key, seconds, cpu_seconds):
+    series = _histograms.setdefault(key, [0] * len(LATENCY_BUCKETS) + [0.0, 0, 0])
+    for index, upper in enumerate(LATENCY_BUCKETS):
+        if seconds <= upper:
+            series[index] += 1
+    series[-3] += seconds
+    series[-2] += 1
+    series[-1] += cpu_seconds
+
+
+def _labels(demo, bucket, stage_name, **extra):
+    labels = dict(demo=demo, bucket=bucket, stage=stage_name, **extra)
+    return ",".join(f'{name}="{value}"' for name, value in labels.items())
+
+
+# Prometheus exposition text of the stage latency histograms and CPU time totals
+def metrics_text():
+    lines = [
+        "# HELP stats_app_stage_seconds Seconds per rerun spent in each demo stage.",
+        "# TYPE stats_app_stage_seconds histogram",
+    ]
+    for (demo, bucket, stage_name), series in sorted(_histograms.items()):
+        for upper, count in zip(LATENCY_BUCKETS, series):
+            lines.append(f"stats_app_stage_seconds_bucket{{{_labels(demo, bucket, stage_name, le=upper)}}} {count}")
+        lines.append(f"stats_app_stage_seconds_bucket{{{_labels(demo, bucket, stage_name, le='+Inf')}}} {series[-2]}")
+        lines.append(f"stats_app_stage_seconds_sum{{{_labels(demo, bucket, stage_name)}}} {series[-3]:.6f}")
+        lines.append(f"stats_app_stage_seconds_count{{{_labels(demo, bucket, stage_name)}}} {series[-2]}")
+    lines += [
+        "# HELP stats_app_stage_cpu_seconds_total CPU seconds of the rerun thread spent in each demo stage.",
+        "# TYPE stats_app_stage_cpu_seconds_total counter",
+    ]
+    for (demo, bucket, stage_name), series in sorted(_histograms.items()):
+        lines.append(f"stats_app_stage_cpu_seconds_total{{{_labels(demo, bucket, stage_name)}}} {series[-1]:.6f}")
+    return "\n".join(lines + cache_metric_lines()) + "\n"
+
+
+# Counters and sizes of the shared sample store, which is process-wide rather than per demo
+def cache_metric_lines():
+    from demos.cache import sample_cache
+
+    stats = sample_cache.stats()
+    lines = []
+    for name in ("hits", "misses", "evictions", "spills", "spill_hits"):
+        lines += [
+            f"# HELP stats_app_cache_{name}_total Shared sample store {name.replace('_', ' ')} since start-up.",
+            f"# TYPE stats_app_cache_{name}_total counter",
+            f"stats_app_cache_{name}_total {stats[name]}",
+        ]
+    for name, where in (("bytes", "memory"), ("spilled_bytes", "spill files")):
+        lines += [
+            f"# HELP stats_app_cache_{name} Bytes of cached arrays held in {where}.",
+            f"# TYPE stats_app_cache_{name} gauge",
+            f"stats_app_cache_{name} {stats[name]}",
+        ]
+    return lines
+
+
+def show_profile(profile):
+    if profile is None:
+        return
+    with st.sidebar.expander("Rerun profile", expanded=True):
+        st.write(f"{profile.demo}, {profile.num_values:,} sampled values (bucket {profile.bucket()})")
+        for name, entry in sorted(profile.stages.items(), key=lambda item: -item[1]['seconds']):
+            peak = f", peak {entry['peak_bytes'] / 1024 ** 2:.1f} MB" if profile.traced else ""
+            st.write(f"{name}: {entry['seconds'] * 1000:.1f} ms ({entry['cpu_seconds'] * 1000:.1f} ms CPU) "
+                     f"in {entry['calls']} call(s){peak}")
+        peak = f", peak {profile.peak_bytes / 1024 ** 2:.1f} MB" if profile.traced else ""
+        st.write(f"Total: {profile.total_seconds * 1000:.1f} ms ({profile.total_cpu_seconds * 1000:.1f} ms CPU){peak}")
+        if profile.tracing_refused:
+            st.caption("Allocations not traced: another session is tracing them.")
+        elif profile.traced:
+            st.caption("Traced rerun: times include tracemalloc's overhead and are not logged."
+                       + (" Peaks are shared: other sessions ran during it." if profile.shared else ""))
+
+
+# Latency percentiles per demo, bucket and stage from a STATS_APP_PROFILE_LOG file
+def summarize(path, percentiles=(50, 90, 99)):
+    # Only the command line needs NumPy; app.py imports this module before any demo
+    import numpy as np
+
+    samples = {}
+    with open(path) as handle:
+        for line in handle:
+            record = json.loads(line)
+            samples.setdefault((record['demo'], record['bucket'], "total"), []).append(record['total_ms'])
+            for name, entry in record['stages'].items():
+                samples.setdefault((record['demo'], record['bucket'], name), []).append(entry['ms'])
+    return [(key, len(values), np.percentile(values, percentiles)) for key, values in sorted(samples.items())]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency percentiles from a rerun profile log.")
+    parser.add_argument("log", help="file written through STATS_APP_PROFILE_LOG")
+    parser.add_argument("--percentiles", type=float, nargs="+", default=[50, 90, 99])
+    args = parser.parse_args()
+
+    print(f"{'demo':>28} {'bucket':>6} {'stage':>14} {'reruns':>7} "
+          + " ".join(f"{f'p{value:g} ms':>10}" for value in args.percentiles))
+    for (demo, bucket, name), count, values in summarize(args.log, args.percentiles):
+        print(f"{demo:>28} {bucket:>6} {name:>14} {count:>7} " + " ".join(f"{value:>10.1f}" for value in values))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+import copy
+import threading
+import time
+
+import streamlit as st
+from streamlit import runtime
+from demos.figures import show_rendered
+from demos.profiling import stage
+from demos.session import PROGRESSIVE_DEFAULT
+from demos.stages import PROFILE_STAGES
+
+# A stage finishing within this budget is drawn once, complete; a longer one shows its first
+# partial figure as soon as a chunk is in after it
+FIRST_CHART_SECONDS = 0.25
+
+# Least time between partial redraws, each of which is a full figure render
+UPDATE_SECONDS = 0.75
+
+# Slow figures are redrawn less often, so partial redraws take at most this share of the wall time
+MAX_REDRAW_SHARE = 0.2
+
+# How often the page checks on a running job; every check updates the progress bar, which is also
+# where Streamlit stops a stale rerun
+POLL_SECONDS = 0.1
+
+# Running jobs by stage key, shared by every session asking for the same stage
+_jobs = {}
+_lock = threading.Lock()
+
+
+# Background computation of one chunked stage. `progress` is (chunks done, number of chunks, copy of
+# the value so far), replaced whole by the worker so the page always reads a consistent snapshot.
+class Job:
+    __slots__ = ('key', 'cache', 'watchers', 'cancelled', 'finished', 'progress', 'thread')
+
+    def __init__(self, key, chunks, cache=None):
+        self.key = key
+        # Store the finished value goes into, or None for work that keeps its result elsewhere
+        self.cache = cache
+        # Sessions whose current rerun still wants the result; the last one leaving cancels the job
+        self.watchers = 0
+        self.cancelled = threading.Event()
+        self.finished = threading.Event()
+        self.progress = (0, 0, None)
+        self.thread = threading.Thread(target=self._run, args=(chunks,), name="progressive-stage", daemon=True)
+
+    # Checked between chunks only, so a cancelled job stops after the chunk in flight
+    def _run(self, chunks):
+        try:
+            for done, total, value in chunks:
+                if self.cancelled.is_set():
+                    return
+                self.progress = (done, total, copy.deepcopy(value))
+            # The page's own run of the stage then finds the finished value in the store
+            if self.cache is not None:
+                self.cache.get_or_compute(self.key, lambda: value)
+        finally:
+            chunks.close()
+            with _lock:
+                if _jobs.get(self.key) is self:
+                    del _jobs[self.key]
+            self.finished.set()
+
+
+# Headless callers (sweeps, benchmarks) always compute in one go
+def progressive_enabled():
+    return runtime.exists() and st.session_state.get("progressive_rendering", PROGRESSIVE_DEFAULT)
+
+
+def _detach(job):
+    with _lock:
+        job.watchers -= 1
+        if job.watchers == 0:
+            job.cancelled.set()
+
+
+# Jobs this session watches (key -> job), and the keys asked for by the current rerun
+def _watching():
+    return st.session_state.setdefault("progressive_jobs", {})
+
+
+# Let go of the jobs no longer asked for; a rerun stopped halfway is settled by the next one
+def release_stale_jobs():
+    watching, wanted = _watching(), st.session_state.get("progressive_keys", set())
+    for key in [key for key in watching if key not in wanted]:
+        _detach(watching.pop(key))
+
+
+def _attach(key, start, cache=None):
+    st.session_state.setdefault("progressive_keys", set()).add(key)
+    release_stale_jobs()
+    watching = _watching()
+    with _lock:
+        job = _jobs.get(key)
+        # A cancelled job may still be finishing its last chunk; it stores nothing, so start afresh
+        if job is None or job.cancelled.is_set():
+            job = _jobs[key] = Job(key, start(), cache)
+            job.thread.start()
+        if watching.get(key) is not job:
+            job.watchers += 1
+            watching[key] = job
+    return job
+
+
+# Compute stage `name` of `graph` on a background thread, drawing `render(value so far)` into
+# `placeholder` while it runs; the page's own run of the graph afterwards finds the value in the
+# store. `previous` is an earlier run of the same inputs holding the stages upstream of it. Does
+# nothing when progressive rendering is off or the value is already stored.
+def stream_stage(graph, inputs, name, placeholder, render, previous=None):
+    if not progressive_enabled():
+        return
+    step = graph.stages[name]
+    key, arguments = graph.prepare(inputs, name, previous)
+    cache = graph.cache(name)
+    if key in cache:
+        return
+    job = _attach(key, lambda: step.chunks(**arguments), cache)
+    progress = st.empty()
+    shown = 0
+    redraw_at = time.perf_counter() + FIRST_CHART_SECONDS
+    # Quiet until the first-chart budget is spent, so a quick stage is drawn once and without a bar
+    with stage(PROFILE_STAGES[step.kind]):
+        job.finished.wait(FIRST_CHART_SECONDS)
+    while not job.finished.is_set():
+        done, total, value = job.progress
+        progress.progress(done / total if total else 0.0,
+                          text=f"Simulating: {done:,} of {total:,} chunks" if total else "Simulating...")
+        if done > shown and time.perf_counter() >= redraw_at:
+            start, cpu_start = time.perf_counter(), time.process_time()
+            with stage("plotting"):
+                rendered = render(value)
+            show_rendered(graph.demo, rendered, False, time.process_time() - cpu_start, placeholder)
+            shown = done
+            seconds = time.perf_counter() - start
+            redraw_at = time.perf_counter() + max(UPDATE_SECONDS, seconds * (1 / MAX_REDRAW_SHARE - 1))
+        with stage(PROFILE_STAGES[step.kind]):
+            job.finished.wait(POLL_SECONDS)
+    progress.empty()
+
+
+# Run the chunked generator from `start()` as a background job under `key`, with a progress bar
+# until it finishes; for work whose result lives outside the store, such as a population file.
+# Headless callers skip this and do the work in one go when they need the result.
+def run_job(key, start, text):
+    if not runtime.exists():
+        return
+    job = _attach(key, start)
+    progress = st.empty()
+    while not job.finished.is_set():
+        done, total, _ = job.progress
+        progress.progress(done / total if total else 0.0, text=f"{text}: {done:,} of {total:,} chunks")
+        job.finished.wait(POLL_SECONDS)
+    progress.empty()
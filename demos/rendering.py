@@ -0,0 +1,157 @@
+import numpy as np
+from scipy.signal import fftconvolve
+
+# Roughly one bucket per horizontal pixel of a 10-inch figure
+DEFAULT_BUCKETS = 1000
+
+
+# Keep the first-occurring minimum and maximum of each bucket so peaks survive downsampling
+def minmax_downsample(y, x=None, num_buckets=DEFAULT_BUCKETS):
+    y = np.asarray(y)
+    x = np.arange(1, y.size + 1) if x is None else np.asarray(x)
+    if y.size <= 2 * num_buckets:
+        return x, y
+
+    bucket_size = -(-y.size // num_buckets)
+    num_full = -(-y.size // bucket_size)
+    # Pad with the last value so the final partial bucket keeps its own extremes
+    padded = np.pad(y, (0, num_full * bucket_size - y.size), mode='edge').reshape(num_full, bucket_size)
+    offsets = np.arange(num_full) * bucket_size
+    lows = np.minimum(padded.argmin(axis=1) + offsets, y.size - 1)
+    highs = np.minimum(padded.argmax(axis=1) + offsets, y.size - 1)
+    # Always keep both endpoints; np.unique also restores the in-bucket order
+    indices = np.unique(np.concatenate([[0], lows, highs, [y.size - 1]]))
+    return x[indices], y[indices]
+
+
+# Fine grid cells used for the KDE; display bins are sums of whole groups of cells
+DEFAULT_GRID_SIZE = 1024
+
+
+# Fixed-range fine-grid histogram filled chunk by chunk; partial histograms with the same
+# range merge by adding counts. Values outside the range are only counted, so quantiles stay
+# exact in the share of data they cover.
+class Histogram:
+    __slots__ = ('bins', 'fine_edges', 'fine_counts', 'below', 'above')
+
+    def __init__(self, lower, upper, bins=30, grid_size=DEFAULT_GRID_SIZE):
+        lower, upper = float(lower), float(upper)
+        if not lower < upper:
+            lower, upper = lower - 0.5, lower + 0.5
+        cells_per_bin = max(1, -(-grid_size // bins))
+        self.bins = bins
+        self.fine_edges = np.linspace(lower, upper, bins * cells_per_bin + 1)
+        self.fine_counts = np.zeros(bins * cells_per_bin, dtype=np.int64)
+        self.below = 0
+        self.above = 0
+
+    def state(self):
+        return (self.bins, self.fine_edges, self.fine_counts, self.below, self.above)
+
+    @property
+    def total(self):
+        return self.below + int(self.fine_counts.sum()) + self.above
+
+    def update(self, values):
+        values = np.asarray(values).ravel()
+        lower, upper = self.fine_edges[0], self.fine_edges[-1]
+        counts, _ = np.histogram(values, bins=self.fine_counts.size, range=(lower, upper))
+        self.fine_counts += counts
+        self.below += int(np.count_nonzero(values < lower))
+        self.above += int(np.count_nonzero(values > upper))
+        return self
+
+    def merge(self, other):
+        if not np.array_equal(self.fine_edges, other.fine_edges):
+            raise ValueError("Cannot merge histograms with different edges")
+        self.fine_counts += other.fine_counts
+        self.below += other.below
+        self.above += other.above
+        return self
+
+    # Display bins and fine cells in the layout binned_histogram returns
+    def binned(self):
+        cells_per_bin = self.fine_counts.size // self.bins
+        counts = self.fine_counts.reshape(self.bins, cells_per_bin).sum(axis=1)
+        return counts, self.fine_edges[::cells_per_bin], self.fine_counts, self.fine_edges
+
+    # Cumulative counts at the fine edges, with out-of-range values piled on the end edges
+    def _cumulative(self):
+        return self.below + np.concatenate([[0], np.cumsum(self.fine_counts)])
+
+    # Share of values below x, interpolated linearly within a cell
+    def cdf(self, x):
+        cumulative = self._cumulative()
+        cumulative[-1] += self.above
+        return np.interp(x, self.fine_edges, cumulative) / self.total
+
+    def quantile(self, q):
+        cumulative = self._cumulative()
+        cumulative[-1] += self.above
+        return np.interp(np.asarray(q) * self.total, cumulative, self.fine_edges)
+
+
+# One O(N) binning pass; everything drawn afterwards is O(bins).
+# A pre-filled Histogram is returned as is, with its own bin count.
+def binned_histogram(data, bins=30, grid_size=DEFAULT_GRID_SIZE):
+    if isinstance(data, Histogram):
+        return data.binned()
+    data = np.asarray(data).ravel()
+    lower, upper = (float(data.min()), float(data.max())) if data.size else (0.0, 1.0)
+    if lower == upper:
+        lower, upper = lower - 0.5, upper + 0.5
+    cells_per_bin = max(1, -(-grid_size // bins))
+    fine_counts, fine_edges = np.histogram(data, bins=bins * cells_per_bin, range=(lower, upper))
+    counts = fine_counts.reshape(bins, cells_per_bin).sum(axis=1)
+    edges = fine_edges[::cells_per_bin]
+    return counts, edges, fine_counts, fine_edges
+
+
+# Gaussian KDE of pre-binned data via FFT convolution, with Scott's bandwidth from the binned moments
+def binned_kde(fine_counts, fine_edges, bw_adjust=1.0, cut=3):
+    total = fine_counts.sum()
+    width = fine_edges[1] - fine_edges[0]
+    centers = fine_edges[:-1] + width / 2
+    if total < 2:
+        return centers, np.zeros(centers.size)
+
+    mean = np.dot(fine_counts, centers) / total
+    std = np.sqrt(np.dot(fine_counts, (centers - mean) ** 2) / (total - 1))
+    bandwidth = bw_adjust * std * total ** (-1 / 5)
+    if bandwidth <= 0:
+        return centers, np.zeros(centers.size)
+
+    # Pad so the tails can extend `cut` bandwidths beyond the data, as seaborn does
+    sigma = bandwidth / width
+    pad = int(np.ceil(cut * sigma))
+    padded = np.pad(fine_counts.astype(np.float64), pad)
+    offsets = np.arange(-pad, pad + 1)
+    kernel = np.exp(-0.5 * (offsets / sigma) ** 2)
+    kernel /= kernel.sum()
+    density = np.clip(fftconvolve(padded, kernel, mode='same'), 0, None) / (total * width)
+    grid = centers[0] + width * np.arange(-pad, centers.size + pad)
+    return grid, density
+
+
+# Drop-in replacement for the sns.histplot calls in the demos, drawing only aggregated arrays
+def histplot(data, ax, bins=30, kde=False, stat='count', color='C0', alpha=0.6, edgecolor=None, label=None):
+    counts, edges, fine_counts, fine_edges = binned_histogram(data, bins)
+    widths = np.diff(edges)
+    total = counts.sum()
+    if stat == 'count':
+        scale = np.ones_like(widths)
+    elif stat == 'density':
+        scale = 1 / (total * widths) if total else np.zeros_like(widths)
+    elif stat == 'probability':
+        scale = np.full_like(widths, 1 / total if total else 0.0)
+    else:
+        raise ValueError(f"Unsupported stat: {stat!r}")
+
+    ax.bar(edges[:-1], counts * scale, width=widths, align='edge', color=color, alpha=alpha,
+           edgecolor=edgecolor, label=label)
+    if kde:
+        grid, density = binned_kde(fine_counts, fine_edges)
+        # Rescale the density to the units of the bars
+        ax.plot(grid, density * (total * widths[0] * scale[0]), color=color)
+    ax.set_ylabel(stat.capitalize())
+    return ax
@@ -0,0 +1,25 @@
+import numpy as np
+
+# Number of draws generated per block; bounds peak memory independently of the total
+DEFAULT_CHUNK_DRAWS = 2 ** 22
+
+
+# Sum of each sample of `sample_size` draws, generated block by block
+def sample_sums(generate, sample_size, num_samples, chunk_draws=DEFAULT_CHUNK_DRAWS):
+    sums = np.empty(num_samples, dtype=np.float64)
+    rows = max(1, chunk_draws // sample_size)
+    for start in range(0, num_samples, rows):
+        stop = min(start + rows, num_samples)
+        block = generate((stop - start) * sample_size).reshape(stop - start, sample_size)
+        block.sum(axis=1, dtype=np.float64, out=sums[start:stop])
+    return sums
+
+
+# Running mean after each sample, given the per-sample sums in order
+def cumulative_means(sums, sample_size):
+    draws_seen = np.arange(1, sums.size + 1, dtype=np.float64) * sample_size
+    return np.cumsum(sums) / draws_seen
+
+
+def running_means(generate, sample_size, num_samples, chunk_draws=DEFAULT_CHUNK_DRAWS):
+    return cumulative_means(sample_sums(generate, sample_size, num_samples, chunk_draws), sample_size)
@@ -1,75 +1,226 @@
-import streamlit as st
-import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-
-
-def show():
-    st.title("Sampling Methods Demonstration")
-    st.sidebar.title("Settings")
-
-    # User inputs from the sidebar
-    population_size = st.sidebar.slider("Population size:", min_value=100, max_value=10000, value=1000)
-    sample_size = st.sidebar.slider("Sample size:", min_value=10, max_value=500, value=100)
-    dist_type = st.sidebar.selectbox("Choose the population distribution:", ("Normal", "Uniform"))
-
-    # Parameters for the population distribution
-    if dist_type == "Normal":
-        pop_mean = st.sidebar.number_input("Population mean:", value=0.0)
-        pop_std_dev = st.sidebar.number_input("Population standard deviation:", value=1.0)
-    elif dist_type == "Uniform":
-        pop_low = st.sidebar.number_input("Population lower bound:", value=0.0)
-        pop_high = st.sidebar.number_input("Population upper bound:", value=1.0)
-
-    # Generate population data
-    if dist_type == "Normal":
-        population = np.random.normal(pop_mean, pop_std_dev, population_size)
-    elif dist_type == "Uniform":
-        population = np.random.uniform(pop_low, pop_high, population_size)
-
-    # Simple Random Sampling
-    srs_sample = np.random.choice(population, sample_size, replace=False)
-
-    # Stratified Sampling
-    if dist_type == "Normal":
-        strata_1 = population[population < np.median(population)]
-        strata_2 = population[population >= np.median(population)]
-    elif dist_type == "Uniform":
-        strata_1 = population[population < (pop_low + pop_high) / 2]
-        strata_2 = population[population >= (pop_low + pop_high) / 2]
-
-    stratified_sample = np.concatenate([
-        np.random.choice(strata_1, sample_size // 2, replace=False),
-        np.random.choice(strata_2, sample_size // 2, replace=False)
-    ])
-
-    # Systematic Sampling
-    interval = population_size // sample_size
-    start_point = np.random.randint(0, interval)
-    systematic_sample = population[start_point::interval]
-
-    # Plotting
-    fig, ax = plt.subplots(3, 1, figsize=(10, 18))
-
-    sns.histplot(srs_sample, bins=30, kde=True, ax=ax[0], color='blue', edgecolor='black')
-    ax[0].set_title("Simple Random Sampling")
-
-    sns.histplot(stratified_sample, bins=30, kde=True, ax=ax[1], color='green', edgecolor='black')
-    ax[1].set_title("Stratified Sampling")
-
-    sns.histplot(systematic_sample, bins=30, kde=True, ax=ax[2], color='red', edgecolor='black')
-    ax[2].set_title("Systematic Sampling")
-
-    st.pyplot(fig)
-
-    # Display sample statistics
-    def display_statistics(sample, method_name):
-        st.write(f"### {method_name} Sample Statistics")
-        st.write(f"Mean: {np.mean(sample):.2f}")
-        st.write(f"Standard Deviation: {np.std(sample):.2f}")
-        st.write(f"Variance: {np.var(sample):.2f}")
-
-    display_statistics(srs_sample, "Simple Random Sampling")
-    display_statistics(stratified_sample, "Stratified Sampling")
-    display_statistics(systematic_sample, "Systematic Sampling")
-
+import streamlit as st
+import numpy as np
+from demos.cache import cached_sample, seed_input
+from demos.distributions import get_distribution
+from demos.figures import HistogramPanel, plot_backend, render_histograms, show_histograms, show_stage_figure
+from demos.moments import Moments
+from demos.population_engine import (MAX_POPULATION_BYTES, allocate, iter_chunks, open_population,
+                                     population_nbytes, population_path, population_ready, reservoir_sample,
+                                     simple_random_sample, strata_cuts, strata_summary, stratified_sample,
+                                     systematic_sample, write_population)
+from demos.progressive import run_job
+from demos.stages import Stage, StageGraph
+
+
+def show():
+    st.title("Sampling Methods Demonstration")
+    st.sidebar.title("Settings")
+
+    # User inputs from the sidebar
+    mode = st.sidebar.selectbox("Mode:", ("In-memory population", "Out-of-core population"))
+    if mode == "In-memory population":
+        population_size = st.sidebar.slider("Population size:", min_value=100, max_value=10000, value=1000)
+    elif mode == "Out-of-core population":
+        population_size = st.sidebar.select_slider("Population size:", options=[10 ** 6, 10 ** 7, 10 ** 8, 10 ** 9],
+                                                    value=10 ** 7, format_func=lambda size: f"{size:,}")
+        num_strata = st.sidebar.slider("Number of strata:", min_value=2, max_value=20, value=4)
+        allocation_method = st.sidebar.selectbox("Stratum allocation:", ("Proportional", "Neyman"))
+    sample_size = st.sidebar.slider("Sample size:", min_value=10, max_value=500, value=100)
+    dist_type = st.sidebar.selectbox("Choose the population distribution:", ("Normal", "Uniform"))
+
+    # Parameters for the population distribution
+    if dist_type == "Normal":
+        pop_mean = st.sidebar.number_input("Population mean:", value=0.0)
+        pop_std_dev = st.sidebar.number_input("Population standard deviation:", value=1.0)
+    elif dist_type == "Uniform":
+        pop_low = st.sidebar.number_input("Population lower bound:", value=0.0)
+        pop_high = st.sidebar.number_input("Population upper bound:", value=1.0)
+    seed = seed_input()
+
+    # Generate population data
+    if dist_type == "Normal":
+        dist = get_distribution(dist_type, mean=pop_mean, std_dev=pop_std_dev)
+    elif dist_type == "Uniform":
+        dist = get_distribution(dist_type, low=pop_low, high=pop_high)
+
+    if mode == "Out-of-core population":
+        show_out_of_core(dist, population_size, sample_size, num_strata, allocation_method, seed)
+        return
+
+    run = SAMPLING_STAGES.run(sampling_inputs(dist, population_size, sample_size, seed, plot_backend()))
+
+    # Plotting
+    show_stage_figure("sampling_methods", run)
+
+    # Display sample statistics
+    statistic = run['statistic']
+    display_statistics(statistic['srs'], "Simple Random Sampling")
+    display_statistics(statistic['stratified'], "Stratified Sampling")
+    display_statistics(statistic['systematic'], "Systematic Sampling")
+
+
+def draw_population(dist, population_size, rng):
+    return dist.rvs(rng, population_size)
+
+
+# Simple Random Sampling
+def draw_srs(sample_size, population, rng):
+    return rng.choice(population, sample_size, replace=False)
+
+
+# Stratified Sampling from two strata split at the population median (or the Uniform midpoint)
+def draw_stratified(dist, sample_size, population, rng):
+    if dist.name == "Normal":
+        cut = np.median(population)
+    elif dist.name == "Uniform":
+        cut = (dist.params['low'] + dist.params['high']) / 2
+    else:
+        raise ValueError(f"Unsupported population distribution: {dist.name!r}")
+    below = population < cut
+    strata_1 = population[below]
+    strata_2 = population[~below]
+    return np.concatenate([
+        rng.choice(strata_1, sample_size // 2, replace=False),
+        rng.choice(strata_2, sample_size // 2, replace=False)
+    ]), cut
+
+
+# Systematic Sampling
+def draw_systematic(sample_size, population, rng):
+    interval = population.size // sample_size
+    start_point = int(rng.integers(0, interval))
+    return population[start_point::interval]
+
+
+def sample_moments(srs, stratified, systematic):
+    return {'srs': Moments.from_array(srs), 'stratified': Moments.from_array(stratified[0]),
+            'systematic': Moments.from_array(systematic)}
+
+
+def plot_samples(backend, srs, stratified, systematic):
+    return render_histograms([
+        HistogramPanel(srs, "Simple Random Sampling", bins=30, kde=True, color='blue', edgecolor='black'),
+        HistogramPanel(stratified[0], "Stratified Sampling", bins=30, kde=True, color='green', edgecolor='black'),
+        HistogramPanel(systematic, "Systematic Sampling", bins=30, kde=True, color='red', edgecolor='black'),
+    ], backend, figsize=(10, 18), vertical=True)
+
+
+# Population -> three samples -> their moments -> figure; the sample size reaches the samples but
+# not the population, which is only drawn again for a new distribution or population size
+SAMPLING_STAGES = StageGraph("sampling_methods", [
+    Stage("population", draw_population, kind="sample", reads=("dist", "population_size"),
+          stream="sampling_methods"),
+    Stage("srs", draw_srs, kind="sample", reads=("sample_size",), after=("population",),
+          stream="sampling_methods.srs"),
+    Stage("stratified", draw_stratified, kind="sample", reads=("dist", "sample_size"), after=("population",),
+          stream="sampling_methods.stratified"),
+    Stage("systematic", draw_systematic, kind="sample", reads=("sample_size",), after=("population",),
+          stream="sampling_methods.systematic"),
+    Stage("statistic", sample_moments, after=("srs", "stratified", "systematic")),
+    Stage("figure", plot_samples, reads=("backend",), after=("srs", "stratified", "systematic")),
+])
+
+
+def sampling_inputs(dist, population_size, sample_size, seed, backend=None):
+    return {'dist': dist, 'population_size': population_size, 'sample_size': sample_size, 'seed': seed,
+            'backend': backend}
+
+
+# Simple random, two-strata stratified and systematic samples from an in-memory population
+def compute(dist, population_size, sample_size, seed):
+    run = SAMPLING_STAGES.run(sampling_inputs(dist, population_size, sample_size, seed),
+                              targets=("srs", "stratified", "systematic"))
+    stratified, cut = run['stratified']
+    return {'srs': run['srs'], 'stratified': stratified, 'systematic': run['systematic'], 'cut': cut}
+
+
+def display_statistics(sample, method_name):
+    moments = sample if isinstance(sample, Moments) else Moments.from_array(sample)
+    st.write(f"### {method_name} Sample Statistics")
+    st.write(f"Mean: {moments.mean:.2f}")
+    st.write(f"Standard Deviation: {moments.std():.2f}")
+    st.write(f"Variance: {moments.var():.2f}")
+
+
+def show_out_of_core(dist, population_size, sample_size, num_strata, allocation_method, seed):
+    if population_nbytes(population_size) > MAX_POPULATION_BYTES:
+        st.error(f"A population of {population_size:,} rows does not fit the "
+                 f"{MAX_POPULATION_BYTES / 1024 ** 3:.1f} GB disk budget for population files.")
+        return
+
+    # The file is written on a background thread, which a new rerun cancels between chunks
+    path = population_path(dist, population_size, seed)
+    if not population_ready(path):
+        run_job(("sampling_methods.out_of_core.population", path),
+                lambda: write_population(dist, population_size, seed, path),
+                f"Writing a population of {population_size:,} rows")
+    with st.spinner(f"Sampling a population of {population_size:,} rows from disk..."):
+        result = compute_out_of_core(dist, population_size, sample_size, num_strata, allocation_method, seed)
+    srs_sample, stratified, systematic = result['srs'], result['stratified'], result['systematic']
+    reservoir, cuts, summaries = result['reservoir'], result['cuts'], result['summaries']
+
+    # Plotting
+    show_histograms("sampling_methods.out_of_core", [
+        HistogramPanel(srs_sample, "Simple Random Sampling", bins=30, kde=True, color='blue', edgecolor='black'),
+        HistogramPanel(stratified, f"Stratified Sampling ({num_strata} strata, {allocation_method} allocation)",
+                       bins=30, kde=True, color='green', edgecolor='black', vlines=[
+                           (cut, None, 'k', ':') for cut in cuts]),
+        HistogramPanel(systematic, "Systematic Sampling", bins=30, kde=True, color='red', edgecolor='black'),
+        HistogramPanel(reservoir, "Reservoir Sampling (Algorithm L)", bins=30, kde=True, color='purple',
+                       edgecolor='black'),
+    ], figsize=(10, 24), vertical=True)
+
+    # Display population and sample statistics
+    population_moments = result['population_moments']
+    st.write(f"### Population ({population_size:,} rows, streamed from disk)")
+    st.write(f"Mean: {population_moments.mean:.2f}")
+    st.write(f"Standard Deviation: {population_moments.std():.2f}")
+    st.write("Stratum sizes: " + ", ".join(f"{summary.count:,}" for summary in summaries))
+    st.write("Allocated sample sizes: " + ", ".join(str(size) for size in result['allocation']))
+
+    display_statistics(srs_sample, "Simple Random Sampling")
+    display_statistics(stratified, "Stratified Sampling")
+    st.write(f"Stratum-weighted estimate of the population mean: {result['stratified_mean']:.2f}")
+    display_statistics(systematic, "Systematic Sampling")
+    display_statistics(reservoir, "Reservoir Sampling")
+
+
+# Population in a memory-mapped .npy file, read in fixed-size chunks so peak memory does not
+# grow with the population; strata and reservoir samples each take one streamed pass
+def compute_out_of_core(dist, population_size, sample_size, num_strata, allocation_method, seed):
+    population = open_population(dist, population_size, seed)
+    population_key = (dist.key, population_size)
+    sample_key = (population_key, sample_size)
+
+    srs_sample = cached_sample("sampling_methods.out_of_core.srs", sample_key, seed,
+                               lambda rng: simple_random_sample(population, sample_size, rng))
+    systematic = cached_sample("sampling_methods.out_of_core.systematic", sample_key, seed,
+                               lambda rng: systematic_sample(population, sample_size, rng))
+
+    # Strata cuts and per-stratum sizes and moments, from one pass over the file
+    cuts, summaries = cached_sample("sampling_methods.out_of_core.strata", (population_key, num_strata), seed,
+                                    lambda rng: strata_summary_with_cuts(population, num_strata, rng))
+    allocation = allocate(summaries, sample_size, allocation_method)
+    strata_samples = cached_sample(
+        "sampling_methods.out_of_core.stratified", (sample_key, num_strata, allocation_method), seed,
+        lambda rng: stratified_sample(population, cuts, allocation, summaries, rng))
+
+    # Reservoir sampling treats the file as a stream of chunks of unknown total length
+    reservoir = cached_sample("sampling_methods.out_of_core.reservoir", sample_key, seed,
+                              lambda rng: reservoir_sample((chunk for _, chunk in iter_chunks(population)),
+                                                           sample_size, rng))
+
+    population_moments = Moments()
+    for summary in summaries:
+        population_moments.merge(summary)
+    # Neyman allocation over-samples the wide strata, so weight each stratum mean by its share
+    stratified_mean = sum(summary.count * part.mean() for summary, part in zip(summaries, strata_samples)
+                          if part.size) / population_size
+    return {'srs': srs_sample, 'systematic': systematic, 'cuts': cuts, 'summaries': summaries,
+            'allocation': allocation, 'strata_samples': strata_samples, 'stratified': np.concatenate(strata_samples),
+            'reservoir': reservoir, 'population_moments': population_moments, 'stratified_mean': stratified_mean}
+
+
+def strata_summary_with_cuts(population, num_strata, rng):
+    cuts = strata_cuts(population, num_strata, rng)
+    return cuts, strata_summary(population, cuts)
@@ -0,0 +1,71 @@
+import os
+
+import streamlit as st
+
+# Sidebar inputs and per-rerun logs that app.py needs before any demo is imported. This module must
+# not import NumPy, SciPy or Matplotlib, so the sidebar draws before the numerical stack loads.
+
+BACKENDS = ("Matplotlib", "Altair")
+
+# Default of the progressive rendering toggle, for deployments that want it on from the first rerun
+PROGRESSIVE_DEFAULT = os.environ.get("STATS_APP_PROGRESSIVE", "0") == "1"
+
+
+def backend_input():
+    return st.sidebar.radio("Plot backend:", BACKENDS, key="plot_backend")
+
+
+def progressive_input():
+    return st.sidebar.checkbox("Progressive rendering", value=PROGRESSIVE_DEFAULT, key="progressive_rendering")
+
+
+# Per-rerun records of what each figure and stage cost, and the progressive jobs the rerun asks for
+def begin_run():
+    st.session_state["render_log"] = []
+    st.session_state["stage_log"] = []
+    st.session_state["progressive_keys"] = set()
+
+
+def finish_run():
+    # Imported once the demo has run, by which time its page has loaded the job runner's modules
+    from demos.progressive import release_stale_jobs
+
+    release_stale_jobs()
+
+
+def show_render_stats():
+    log = st.session_state.get("render_log", [])
+    if not log:
+        return
+    with st.sidebar.expander("Rendering cost"):
+        for entry in log:
+            source = "cached" if entry["cache_hit"] else "rendered"
+            st.write(f"{entry['figure']} ({entry['backend']}, {source}): "
+                     f"{entry['cpu_ms']:.1f} ms CPU, {entry['payload_kb']:.1f} KB")
+        st.write(f"Total: {sum(entry['cpu_ms'] for entry in log):.1f} ms CPU, "
+                 f"{sum(entry['payload_kb'] for entry in log):.1f} KB")
+
+
+def show_stage_stats():
+    log = st.session_state.get("stage_log", [])
+    if not log:
+        return
+    with st.sidebar.expander("Stage cache"):
+        for entry in log:
+            source = "cached" if entry["cache_hit"] else f"recomputed in {entry['ms']:.1f} ms"
+            st.write(f"{entry['stage']} ({entry['kind']}): {source}; "
+                     f"hit ratio {entry['hit_ratio']:.0%} of {entry['lookups']} lookups")
+
+
+# Process-wide counters of the shared sample store, summed over every session
+def show_cache_stats():
+    from demos.cache import sample_cache
+
+    stats = sample_cache.stats()
+    lookups = stats["hits"] + stats["misses"]
+    with st.sidebar.expander("Shared sample store"):
+        st.write(f"In memory: {stats['entries']} arrays, {stats['bytes'] / 1024 ** 2:.1f} of "
+                 f"{stats['max_bytes'] / 1024 ** 2:.0f} MB")
+        st.write(f"Spilled to disk: {stats['spilled_entries']} arrays, {stats['spilled_bytes'] / 1024 ** 2:.1f} MB")
+        st.write(f"Hits: {stats['hits']:,} of {lookups:,} lookups ({stats['spill_hits']:,} from disk), "
+                 f"evictions: {stats['evictions']:,}, spills: {stats['spills']:,}")
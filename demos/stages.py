@@ -0,0 +1,175 @@
+import threading
+import time
+
+import streamlit as st
+from streamlit import runtime
+from demos.cache import figure_cache, freeze_key, sample_cache
+from demos.distributions import Distribution, stream
+from demos.profiling import note_values, stage
+
+KINDS = ("sample", "statistic", "decision", "figure")
+
+# Profiling stage each kind of step is timed under
+PROFILE_STAGES = {"sample": "sampling", "statistic": "statistics", "decision": "statistics", "figure": "plotting"}
+
+
+# One step of a demo: `compute` is called with the widget values named in `reads`, the outputs of
+# the stages named in `after` (as keyword arguments under those names) and, when `stream` is set,
+# an `rng` from that named stream of the seed input. `chunks`, taking the same arguments, may give
+# a generator of (chunks done, number of chunks, value so far) ending in the value `compute` returns,
+# which lets a page draw the stage while it runs.
+class Stage:
+    __slots__ = ('name', 'compute', 'kind', 'reads', 'after', 'stream', 'chunks')
+
+    def __init__(self, name, compute, kind=None, reads=(), after=(), stream=None, chunks=None):
+        kind = name if kind is None else kind
+        if kind not in KINDS:
+            raise ValueError(f"Unknown stage kind: {kind!r}")
+        self.name = name
+        self.compute = compute
+        self.kind = kind
+        self.reads = tuple(reads)
+        self.after = tuple(after)
+        self.stream = stream
+        self.chunks = chunks
+
+
+class StageRun:
+    __slots__ = ('keys', 'outputs', 'hits', 'seconds', 'cpu_seconds')
+
+    def __init__(self):
+        self.keys = {}
+        self.outputs = {}
+        # Names of the stages served from the cache on this run
+        self.hits = set()
+        # Wall and CPU seconds of the stages that were recomputed
+        self.seconds = {}
+        self.cpu_seconds = {}
+
+    def __getitem__(self, name):
+        return self.outputs[name]
+
+
+# Widget values as they appear in stage keys; distributions are identified by their parameters
+def _input_key(value):
+    if isinstance(value, Distribution):
+        return value.key
+    if isinstance(value, (list, tuple)):
+        return tuple(_input_key(item) for item in value)
+    return freeze_key(value)
+
+
+# Declared stages of one demo. A stage's cache key is the values it reads plus the keys of the
+# stages it runs after, so a widget change invalidates only the stages downstream of its readers:
+# moving alpha re-decides and redraws, but reuses the sample and the test statistic.
+class StageGraph:
+    def __init__(self, demo, stages):
+        self.demo = demo
+        self.stages = {}
+        for step in stages:
+            unknown = [name for name in step.after if name not in self.stages]
+            if unknown:
+                raise ValueError(f"Stage {step.name!r} of {demo} runs after undeclared stages {unknown}")
+            self.stages[step.name] = step
+        self.hits = dict.fromkeys(self.stages, 0)
+        self.misses = dict.fromkeys(self.stages, 0)
+        self._lock = threading.Lock()
+
+    # The targets plus every stage they depend on, in declaration order
+    def _required(self, targets):
+        required = set()
+        pending = list(self.stages if targets is None else targets)
+        while pending:
+            name = pending.pop()
+            if name not in required:
+                required.add(name)
+                pending.extend(self.stages[name].after)
+        return [name for name in self.stages if name in required]
+
+    # Run the `targets` (every stage by default) and whatever they depend on. Stages already in
+    # `previous`, a run of the same inputs earlier in the rerun, are taken from it as they are, so
+    # a page can read a widget halfway down and carry on from there.
+    def run(self, inputs, targets=None, previous=None):
+        result = StageRun()
+        keys = result.keys
+        for name in self._required(targets):
+            if previous is not None and name in previous.outputs:
+                keys[name] = previous.keys[name]
+                result.outputs[name] = previous.outputs[name]
+                continue
+            step = self.stages[name]
+            key, arguments = self._prepare(step, inputs, result)
+            cache = self.cache(name)
+            hit = key in cache
+            start, cpu_start = time.perf_counter(), time.process_time()
+
+            def compute():
+                with stage(PROFILE_STAGES[step.kind]):
+                    return step.compute(**arguments)
+
+            value = cache.get_or_compute(key, compute)
+            with self._lock:
+                if hit:
+                    self.hits[name] += 1
+                else:
+                    self.misses[name] += 1
+            if hit:
+                result.hits.add(name)
+            else:
+                result.seconds[name] = time.perf_counter() - start
+                result.cpu_seconds[name] = time.process_time() - cpu_start
+            if step.kind == "sample":
+                note_values(value)
+            keys[name] = key
+            result.outputs[name] = value
+        _log_run(self, result)
+        return result
+
+    def _prepare(self, step, inputs, upstream):
+        reads = {read: inputs[read] for read in step.reads}
+        read_keys = tuple((read, _input_key(value)) for read, value in reads.items())
+        # A stage drawing from a stream of the seed reads the seed too
+        if step.stream is not None:
+            read_keys += (("seed", _input_key(inputs['seed'])),)
+        key = ("stage", self.demo, step.name, read_keys, tuple(upstream.keys[name] for name in step.after))
+        arguments = dict(reads, **{name: upstream.outputs[name] for name in step.after})
+        if step.stream is not None:
+            arguments['rng'] = stream(step.stream, inputs['seed'])
+        return key, arguments
+
+    # Store of stage `name`'s outputs: rendered figures are kept apart from samples and statistics
+    def cache(self, name):
+        return figure_cache if self.stages[name].kind == "figure" else sample_cache
+
+    # Cache key and arguments of stage `name`, running only the stages upstream of it
+    def prepare(self, inputs, name, previous=None):
+        step = self.stages[name]
+        upstream = self.run(inputs, targets=step.after, previous=previous) if step.after else StageRun()
+        return self._prepare(step, inputs, upstream)
+
+    # Process-wide hits and lookups per stage, across every session
+    def stats(self):
+        with self._lock:
+            return {name: (self.hits[name], self.hits[name] + self.misses[name]) for name in self.stages}
+
+
+def _log_run(graph, result):
+    # Headless callers (sweeps, benchmarks) have no session to report to
+    if not runtime.exists():
+        return
+    stats = graph.stats()
+    log = st.session_state.setdefault("stage_log", [])
+    for name in result.outputs:
+        if name not in result.hits and name not in result.seconds:
+            # Carried over from an earlier run of this rerun, and already logged there
+            continue
+        hits, lookups = stats[name]
+        log.append({
+            "demo": graph.demo,
+            "stage": name,
+            "kind": graph.stages[name].kind,
+            "cache_hit": name in result.hits,
+            "ms": result.seconds.get(name, 0.0) * 1000,
+            "hit_ratio": hits / lookups,
+            "lookups": lookups,
+        })
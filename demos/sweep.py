@@ -0,0 +1,165 @@
+import argparse
+import ast
+import importlib
+import inspect
+import itertools
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# Scenario -> headless compute function ("module:function") behind one demo mode
+SCENARIOS = {
+    "central_limit_theorem": "demos.central_limit_theorem:compute",
+    "law_of_large_numbers": "demos.law_of_large_numbers:compute",
+    "confidence_intervals": "demos.confidence_intervals:compute",
+    "confidence_intervals.coverage": "demos.confidence_intervals:compute_coverage",
+    "hypothesis_testing": "demos.hypothesis_testing:compute",
+    "hypothesis_testing.power": "demos.hypothesis_testing:compute_power",
+    "correlation_regression": "demos.correlation_regression:compute",
+    "correlation_regression.resampling": "demos.correlation_regression:compute_resampling",
+    "anova.design": "demos.anova:compute_design",
+    "probability_distributions": "demos.probability_distributions:compute",
+    "bootstrap_sampling": "demos.bootstrap_sampling:compute",
+    "bayesian_inference": "demos.bayesian_inference:compute",
+    "bayesian_inference.mcmc": "demos.bayesian_inference:compute_mcmc",
+    "bayesian_inference.sequential": "demos.bayesian_inference:compute_sequential",
+    "sampling_methods": "demos.sampling_methods:compute",
+    "sampling_methods.out_of_core": "demos.sampling_methods:compute_out_of_core",
+    "time_series_analysis": "demos.time_series_analysis:compute",
+    "time_series_analysis.long": "demos.time_series_analysis:compute_long",
+}
+
+# Arguments given as a registry name plus `name.param=value` settings, e.g. dist=Normal dist.std_dev=2
+DISTRIBUTION_ARGUMENTS = ("dist", "dist2", "dist_x", "dist_y", "noise", "prior")
+
+
+def load_scenario(name):
+    module_name, function_name = SCENARIOS[name].split(":")
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+# "1,2,3" -> [1, 2, 3]; "[5,10],[30]" -> [[5, 10], [30]]; bare words such as Normal,Uniform stay strings
+def parse_values(text):
+    try:
+        values = ast.literal_eval(f"[{text}]")
+    except (ValueError, SyntaxError):
+        values = [item.strip() for item in text.split(",")]
+    return values
+
+
+def parse_grid(assignments):
+    grid = {}
+    for assignment in assignments:
+        name, separator, text = assignment.partition("=")
+        if not separator:
+            raise ValueError(f"Expected NAME=VALUES, got {assignment!r}")
+        grid[name.strip()] = parse_values(text)
+    return grid
+
+
+# Cartesian product of the grid, one dict per point, with the seed varying fastest
+def expand_grid(grid, seeds):
+    names = list(grid) + ["seed"]
+    return [dict(zip(names, values)) for values in itertools.product(*grid.values(), seeds)]
+
+
+# Keyword arguments for the compute function: dotted settings are folded into their distribution
+def build_arguments(point):
+    from demos.distributions import get_distribution
+
+    arguments = {name: value for name, value in point.items() if "." not in name}
+    for name in DISTRIBUTION_ARGUMENTS:
+        if name in arguments:
+            params = {key.split(".", 1)[1]: value for key, value in point.items() if key.startswith(f"{name}.")}
+            arguments[name] = get_distribution(arguments[name], **params)
+    return arguments
+
+
+# Flatten a result into name -> array. Dicts, lists of unequal parts and objects with __slots__
+# (Moments, Histogram, Aggregate) are walked; anything that is not numeric or text is dropped.
+def flatten(value, prefix="", out=None):
+    out = {} if out is None else out
+    if value is None:
+        return out
+    if isinstance(value, dict):
+        for name, item in value.items():
+            flatten(item, f"{prefix}.{name}" if prefix else str(name), out)
+        return out
+    if hasattr(type(value), "__slots__") and not isinstance(value, (np.ndarray, np.generic)):
+        for name in type(value).__slots__:
+            flatten(getattr(value, name), f"{prefix}.{name}", out)
+        return out
+    try:
+        array = np.asarray(value)
+    except ValueError:
+        array = None
+    if array is not None and array.dtype.kind in "biufcUS":
+        out[prefix] = array
+    elif isinstance(value, (list, tuple)):
+        for index, item in enumerate(value):
+            flatten(item, f"{prefix}.{index}", out)
+    return out
+
+
+# One grid point: compute, write every array to its own .npz, return the scalars as a summary row
+def run_point(scenario, index, point, output_dir):
+    function = load_scenario(scenario)
+    start = time.perf_counter()
+    result = function(**build_arguments(point))
+    seconds = time.perf_counter() - start
+    arrays = flatten(result)
+    file_name = f"point-{index:05d}.npz"
+    np.savez_compressed(os.path.join(output_dir, file_name), **arrays)
+    row = dict(point, file=file_name, seconds=seconds)
+    row.update((name, array.item()) for name, array in arrays.items() if array.ndim == 0)
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run a demo's compute function over a parameter grid and save the results.",
+        epilog="Example: python -m demos.sweep central_limit_theorem -p dist=Exponential -p dist.rate=0.5,1,2 "
+               "-p sample_size=5,30,100 -p num_samples=10000 --seeds 0 1 2")
+    parser.add_argument("scenario", choices=sorted(SCENARIOS))
+    parser.add_argument("-p", "--param", action="append", default=[], metavar="NAME=VALUES",
+                        help="comma-separated values for one argument of the compute function (repeatable)")
+    parser.add_argument("--seeds", type=int, nargs="+", default=[0])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="grid points computed in parallel; 1 runs in-process")
+    parser.add_argument("--output", default="sweeps", help="directory for the .npz files and summary.parquet")
+    args = parser.parse_args()
+
+    try:
+        grid = parse_grid(args.param)
+    except ValueError as error:
+        parser.error(str(error))
+    points = expand_grid(grid, args.seeds)
+    signature = inspect.signature(load_scenario(args.scenario))
+    try:
+        signature.bind(**{name: None for name in points[0] if "." not in name})
+    except TypeError as error:
+        parser.error(f"{args.scenario}{signature}: {error}")
+
+    output_dir = os.path.join(args.output, args.scenario)
+    os.makedirs(output_dir, exist_ok=True)
+    start = time.perf_counter()
+    if args.workers <= 1 or len(points) == 1:
+        rows = [run_point(args.scenario, index, point, output_dir) for index, point in enumerate(points)]
+    else:
+        # Each worker already runs a whole grid point, so keep the simulations inside it single-process
+        os.environ["STATS_APP_WORKERS"] = "1"
+        with ProcessPoolExecutor(args.workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            rows = list(pool.map(run_point, itertools.repeat(args.scenario), range(len(points)), points,
+                                 itertools.repeat(output_dir)))
+
+    summary_path = os.path.join(output_dir, "summary.parquet")
+    pd.DataFrame(rows).to_parquet(summary_path, index=False)
+    print(f"{len(points)} points in {time.perf_counter() - start:.1f} s -> {summary_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,106 +1,303 @@
-import streamlit as st
-import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
-from statsmodels.tsa.seasonal import seasonal_decompose
-from statsmodels.tsa.holtwinters import ExponentialSmoothing
-import seaborn as sns
-
-
-def show():
-    st.title("Time Series Analysis Demonstration")
-    st.sidebar.title("Settings")
-
-    # User inputs from the sidebar
-    num_periods = st.sidebar.slider("Number of periods:", min_value=50, max_value=500, value=200)
-    noise_level = st.sidebar.slider("Noise level:", min_value=0.0, max_value=5.0, value=1.0)
-    trend_type = st.sidebar.selectbox("Trend type:", ["None", "Linear", "Exponential"])
-    seasonality_type = st.sidebar.selectbox("Seasonality type:", ["None", "Additive", "Multiplicative"])
-    seasonality_period = st.sidebar.slider("Seasonality period:", min_value=2, max_value=50, value=12)
-
-    # Generate time series data
-    np.random.seed(42)
-    time = np.arange(num_periods)
-    noise = np.random.normal(scale=noise_level, size=num_periods)
-
-    if trend_type == "None":
-        trend = np.zeros(num_periods)
-    elif trend_type == "Linear":
-        trend = time * 0.1
-    elif trend_type == "Exponential":
-        trend = np.exp(time * 0.01)
-
-    if seasonality_type == "None":
-        seasonality = np.zeros(num_periods)
-    else:
-        seasonality = 10 * np.sin(2 * np.pi * time / seasonality_period)
-        if seasonality_type == "Multiplicative":
-            seasonality = 1 + seasonality / 100
-
-    if seasonality_type == "None":
-        data = trend + noise
-    else:
-        if seasonality_type == "Additive":
-            data = trend + seasonality + noise
-        elif seasonality_type == "Multiplicative":
-            data = trend * seasonality + noise
-
-    time_series = pd.Series(data, index=pd.date_range(start='1/1/2000', periods=num_periods, freq='M'))
-
-    # Decompose time series
-    if seasonality_type != "None":
-        decomposition = seasonal_decompose(time_series, model=seasonality_type.lower(), period=seasonality_period)
-        trend_component = decomposition.trend
-        seasonal_component = decomposition.seasonal
-        residual_component = decomposition.resid
-    else:
-        trend_component = None
-        seasonal_component = None
-        residual_component = None
-
-    # Plotting
-    fig, ax = plt.subplots(4, 1, figsize=(10, 18))
-    time_series.plot(ax=ax[0], title="Original Time Series", color='blue')
-    ax[0].set_ylabel("Value")
-
-    if trend_component is not None:
-        trend_component.plot(ax=ax[1], title="Trend Component", color='green')
-        ax[1].set_ylabel("Value")
-
-    if seasonal_component is not None:
-        seasonal_component.plot(ax=ax[2], title="Seasonal Component", color='red')
-        ax[2].set_ylabel("Value")
-
-    if residual_component is not None:
-        residual_component.plot(ax=ax[3], title="Residual Component", color='orange')
-        ax[3].set_ylabel("Value")
-
-    st.pyplot(fig)
-
-    # Forecasting
-    st.header("Forecasting")
-    forecast_periods = st.slider("Forecast periods:", min_value=10, max_value=100, value=24)
-    model = ExponentialSmoothing(time_series, trend="add", seasonal=seasonality_type.lower(),
-                                 seasonal_periods=seasonality_period)
-    fit = model.fit()
-    forecast = fit.forecast(forecast_periods)
-
-    # Plot forecasting
-    fig2, ax2 = plt.subplots(figsize=(10, 6))
-    time_series.plot(ax=ax2, label='Observed', color='blue')
-    forecast.plot(ax=ax2, label='Forecast', color='red')
-    ax2.fill_between(
-        forecast.index,
-        fit.conf_int(alpha=0.05)["lower time_series"],
-        fit.conf_int(alpha=0.05)["upper time_series"],
-        color='pink',
-        alpha=0.3
-    )
-    ax2.set_title("Forecasting with Exponential Smoothing")
-    ax2.set_ylabel("Value")
-    ax2.legend()
-
-    st.pyplot(fig2)
-
-    # Display model summary
-    st.write(f"Model Summary:\n{fit.summary()}")
+import time as timer
+
+import streamlit as st
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+from statsmodels.tsa.seasonal import seasonal_decompose
+from statsmodels.tsa.holtwinters import ExponentialSmoothing
+from demos.cache import cached_sample, seed_input
+from demos.decomposition_engine import IncrementalDecomposition, decompose
+from demos.distributions import get_distribution
+from demos.figures import render_png, show_figure, show_stage_figure
+from demos.rendering import minmax_downsample
+from demos.stages import Stage, StageGraph
+
+# Largest horizon offered by the slider; the prediction interval is simulated once up to it
+MAX_FORECAST_PERIODS = 100
+
+# Simulated paths behind the prediction interval
+INTERVAL_REPETITIONS = 1000
+
+# Lengths offered in the long-series mode, decomposed with demos.decomposition_engine
+LONG_SERIES_SIZES = [10 ** 5, 10 ** 6, 10 ** 7]
+
+# Points per append when the long series is streamed through the incremental decomposition
+APPEND_POINTS = 10 ** 5
+
+
+def show():
+    st.title("Time Series Analysis Demonstration")
+    st.sidebar.title("Settings")
+
+    # User inputs from the sidebar
+    mode = st.sidebar.selectbox("Mode:", ("Model and forecast", "Long series decomposition"))
+    if mode == "Model and forecast":
+        num_periods = st.sidebar.slider("Number of periods:", min_value=50, max_value=500, value=200)
+    elif mode == "Long series decomposition":
+        num_points = st.sidebar.select_slider("Number of points:", options=LONG_SERIES_SIZES, value=10 ** 6,
+                                              format_func=lambda size: f"{size:,}")
+        precision = st.sidebar.selectbox("Precision:", ("float64", "float32"))
+        method = st.sidebar.selectbox("Moving average:", ("Cumulative sum", "FFT convolution"))
+    noise_level = st.sidebar.slider("Noise level:", min_value=0.0, max_value=5.0, value=1.0)
+    trend_type = st.sidebar.selectbox("Trend type:", ["None", "Linear", "Exponential"])
+    seasonality_type = st.sidebar.selectbox("Seasonality type:", ["None", "Additive", "Multiplicative"])
+    seasonality_period = st.sidebar.slider("Seasonality period:", min_value=2, max_value=50, value=12)
+    seed = seed_input()
+
+    if mode == "Long series decomposition":
+        show_long_series(num_points, precision, method, noise_level, trend_type, seasonality_type,
+                         seasonality_period, seed)
+        return
+
+    # Series, decomposition and model fit; the forecast horizon is read further down the page
+    inputs = series_inputs(num_periods, noise_level, trend_type, seasonality_type, seasonality_period, seed)
+    run = SERIES_STAGES.run(inputs, targets=("decomposition_figure", "model"))
+    fit_cached = "model" in run.hits
+    if seasonality_type == "Multiplicative" and run['series']['model_type'] == "additive":
+        st.warning("The series has non-positive values, so an additive model is used instead of a multiplicative one.")
+
+    # Plotting
+    show_stage_figure("time_series_analysis.decomposition", run, "decomposition_figure")
+
+    # Forecasting
+    st.header("Forecasting")
+    inputs['forecast_periods'] = st.slider("Forecast periods:", min_value=10, max_value=MAX_FORECAST_PERIODS, value=24)
+    run = SERIES_STAGES.run(inputs, targets=("forecast_figure",), previous=run)
+    model, horizon = run['model'], run['forecast']
+    fit = model['fit']
+
+    # Plot forecasting
+    show_stage_figure("time_series_analysis.forecast", run, "forecast_figure")
+    st.caption(f"Model fit: {model['fit_seconds'] * 1000:.0f} ms "
+               f"({'cached' if fit_cached else 'this run'}), "
+               f"prediction interval: {model['interval_seconds'] * 1000:.0f} ms, "
+               f"forecast: {horizon['forecast_seconds'] * 1000:.1f} ms")
+
+    # Display model summary
+    st.write(f"Model Summary:\n{fit.summary()}")
+
+
+def draw_noise(noise_level, num_periods, rng):
+    return get_distribution("Normal", mean=0.0, std_dev=noise_level).rvs(rng, num_periods)
+
+
+def build_series(trend_type, seasonality_type, seasonality_period, sample):
+    data = generate_series(sample, trend_type, seasonality_type, seasonality_period)
+    time_series = pd.Series(data, index=pd.date_range(start='1/1/2000', periods=data.size, freq='ME'))
+
+    # Multiplicative models need a strictly positive series
+    model_type = seasonality_type.lower()
+    if seasonality_type == "Multiplicative" and time_series.min() <= 0:
+        model_type = "additive"
+    return {'time_series': time_series, 'model_type': model_type}
+
+
+def decompose_series(seasonality_type, seasonality_period, series):
+    if seasonality_type == "None":
+        return None
+    return seasonal_decompose(series['time_series'], model=series['model_type'], period=seasonality_period)
+
+
+def fit_series(seasonality_type, seasonality_period, series, rng):
+    seasonal = None if seasonality_type == "None" else series['model_type']
+    return fit_model(series['time_series'], seasonal, seasonality_period, rng)
+
+
+def forecast_series(forecast_periods, model):
+    return forecast(model, forecast_periods)
+
+
+def plot_decomposition(series, decomposition):
+    fig, ax = plt.subplots(4, 1, figsize=(10, 18))
+    series['time_series'].plot(ax=ax[0], title="Original Time Series", color='blue')
+    ax[0].set_ylabel("Value")
+
+    if decomposition is not None:
+        decomposition.trend.plot(ax=ax[1], title="Trend Component", color='green')
+        ax[1].set_ylabel("Value")
+        decomposition.seasonal.plot(ax=ax[2], title="Seasonal Component", color='red')
+        ax[2].set_ylabel("Value")
+        decomposition.resid.plot(ax=ax[3], title="Residual Component", color='orange')
+        ax[3].set_ylabel("Value")
+    return render_png(fig)
+
+
+def plot_forecast(series, model, forecast):
+    forecast_values = forecast['forecast']
+    fig, ax = plt.subplots(figsize=(10, 6))
+    series['time_series'].plot(ax=ax, label='Observed', color='blue')
+    forecast_values.plot(ax=ax, label='Forecast', color='red')
+    ax.fill_between(forecast_values.index, forecast['lower'], forecast['upper'], color='pink', alpha=0.3,
+                    label='95% Prediction Interval')
+    ax.set_title("Forecasting with Exponential Smoothing")
+    ax.set_ylabel("Value")
+    ax.legend()
+    return render_png(fig)
+
+
+# Noise -> series -> decomposition and Holt-Winters fit -> forecast -> figures. The horizon only
+# reaches the forecast and its figure, so moving it reuses the fit and its simulated interval.
+SERIES_STAGES = StageGraph("time_series_analysis", [
+    Stage("sample", draw_noise, reads=("noise_level", "num_periods"), stream="time_series_analysis"),
+    Stage("series", build_series, kind="sample", reads=("trend_type", "seasonality_type", "seasonality_period"),
+          after=("sample",)),
+    Stage("decomposition", decompose_series, kind="statistic", reads=("seasonality_type", "seasonality_period"),
+          after=("series",)),
+    Stage("model", fit_series, kind="statistic", reads=("seasonality_type", "seasonality_period"),
+          after=("series",), stream="time_series_analysis.fit"),
+    Stage("forecast", forecast_series, kind="decision", reads=("forecast_periods",), after=("model",)),
+    Stage("decomposition_figure", plot_decomposition, kind="figure", after=("series", "decomposition")),
+    Stage("forecast_figure", plot_forecast, kind="figure", after=("series", "model", "forecast")),
+])
+
+
+def series_inputs(num_periods, noise_level, trend_type, seasonality_type, seasonality_period, seed,
+                  forecast_periods=None):
+    return {'num_periods': num_periods, 'noise_level': noise_level, 'trend_type': trend_type,
+            'seasonality_type': seasonality_type, 'seasonality_period': seasonality_period, 'seed': seed,
+            'forecast_periods': forecast_periods}
+
+
+# Synthetic series with its decomposition and a cached Holt-Winters fit; `forecast_periods` adds a forecast
+def compute(num_periods, noise_level, trend_type, seasonality_type, seasonality_period, seed, forecast_periods=None):
+    inputs = series_inputs(num_periods, noise_level, trend_type, seasonality_type, seasonality_period, seed,
+                           forecast_periods)
+    targets = ("decomposition", "model", "forecast") if forecast_periods else ("decomposition", "model")
+    run = SERIES_STAGES.run(inputs, targets=targets)
+    decomposition = run['decomposition']
+    result = dict(run['series'], model=run['model'], fit_cached="model" in run.hits, trend=None, seasonal=None,
+                  resid=None)
+    if decomposition is not None:
+        result.update(trend=decomposition.trend, seasonal=decomposition.seasonal, resid=decomposition.resid)
+    if forecast_periods:
+        result.update(run['forecast'])
+    return result
+
+
+# A horizon change only reaches this point: one forecast call and a slice of the interval
+def forecast(model, forecast_periods):
+    start = timer.perf_counter()
+    values = model['fit'].forecast(forecast_periods)
+    return {'forecast': values, 'lower': model['lower'][:forecast_periods], 'upper': model['upper'][:forecast_periods],
+            'forecast_seconds': timer.perf_counter() - start}
+
+
+# Fit once per series and spec, and simulate the 95% prediction interval once up to the largest
+# horizon; every horizon shorter than that is a slice of it
+def fit_model(time_series, seasonal, seasonality_period, rng):
+    start = timer.perf_counter()
+    fit = ExponentialSmoothing(time_series, trend="add", seasonal=seasonal,
+                               seasonal_periods=seasonality_period if seasonal else None).fit()
+    fit_seconds = timer.perf_counter() - start
+
+    start = timer.perf_counter()
+    paths = fit.simulate(MAX_FORECAST_PERIODS, repetitions=INTERVAL_REPETITIONS, error="add", rng=rng)
+    lower, upper = np.quantile(np.asarray(paths), [0.025, 0.975], axis=1)
+    interval_seconds = timer.perf_counter() - start
+    return {'fit': fit, 'lower': lower, 'upper': upper, 'fit_seconds': fit_seconds,
+            'interval_seconds': interval_seconds}
+
+
+# Synthetic series around `noise`. `trend_scale` stretches the trend over longer series so it
+# keeps the shape it has over the short demo's periods.
+def generate_series(noise, trend_type, seasonality_type, seasonality_period, trend_scale=1.0):
+    num_periods = len(noise)
+    time = np.arange(num_periods)
+
+    if trend_type == "None":
+        trend = np.zeros(num_periods)
+    elif trend_type == "Linear":
+        trend = time * trend_scale * 0.1
+    elif trend_type == "Exponential":
+        trend = np.exp(time * trend_scale * 0.01)
+
+    if seasonality_type == "None":
+        seasonality = np.zeros(num_periods)
+    else:
+        seasonality = 10 * np.sin(2 * np.pi * time / seasonality_period)
+        if seasonality_type == "Multiplicative":
+            seasonality = 1 + seasonality / 100
+
+    if seasonality_type == "None":
+        data = trend + noise
+    else:
+        if seasonality_type == "Additive":
+            data = trend + seasonality + noise
+        elif seasonality_type == "Multiplicative":
+            data = trend * seasonality + noise
+    return data
+
+
+# Sensor-length series: plain NumPy buffers decomposed by the vectorised engine, with the
+# same series optionally streamed through the incremental decomposition for comparison
+def show_long_series(num_points, precision, method, noise_level, trend_type, seasonality_type,
+                     seasonality_period, seed):
+    result = compute_long(num_points, precision, method, noise_level, trend_type, seasonality_type,
+                          seasonality_period, seed)
+    values, components, model_type = result['values'], result['components'], result['model_type']
+    if seasonality_type == "Multiplicative" and model_type == "additive":
+        st.warning("The series has non-positive values, so an additive model is used instead of a multiplicative one.")
+    params = (num_points, precision, noise_level, trend_type, seasonality_type, seasonality_period)
+
+    def plot_components():
+        fig, ax = plt.subplots(4, 1, figsize=(10, 18))
+        panels = [("Original Time Series", values, 'blue'), ("Trend Component", components['trend'], 'green'),
+                  ("Seasonal Component", components['seasonal'], 'red'),
+                  ("Residual Component", components['resid'], 'orange')]
+        for axis, (title, series, color) in zip(ax, panels):
+            plot_x, plot_y = minmax_downsample(series, np.arange(series.size))
+            axis.plot(plot_x, plot_y, color=color, linewidth=0.8)
+            axis.set_title(title)
+            axis.set_ylabel("Value")
+        ax[-1].set_xlabel("Index")
+        return fig
+
+    show_figure("time_series_analysis.long", plot_components, params, seed, model_type, method)
+    st.caption(f"Decomposed {num_points:,} {precision} points in {result['batch_seconds'] * 1000:.0f} ms")
+
+    st.header("Seasonal Indices")
+    st.write(pd.DataFrame({"Phase": np.arange(seasonality_period),
+                           "Index": components['seasonal_indices']}).set_index("Phase").T)
+
+    if st.checkbox(f"Stream the series in appends of {APPEND_POINTS:,} points"):
+        streamed = stream_decomposition(values, seasonality_period, model_type, components['trend'])
+        st.write(f"Incremental decomposition: {streamed['stream_seconds'] * 1000:.0f} ms over "
+                 f"{-(-num_points // APPEND_POINTS)} appends, largest trend difference from the batch result "
+                 f"{streamed['stream_difference']:.2e}")
+
+
+# Long synthetic series decomposed by the vectorised engine; with `stream_appends` the same
+# series is also fed through the incremental decomposition and compared with the batch result
+def compute_long(num_points, precision, method, noise_level, trend_type, seasonality_type, seasonality_period, seed,
+                 stream_appends=False):
+    noise_dist = get_distribution("Normal", mean=0.0, std_dev=noise_level)
+    params = (noise_dist.key, num_points, trend_type, seasonality_type, seasonality_period, precision)
+    values = cached_sample("time_series_analysis.long", params, seed,
+                           lambda rng: generate_series(noise_dist.rvs(rng, num_points), trend_type, seasonality_type,
+                                                       seasonality_period, 500 / num_points).astype(precision))
+
+    model_type = "multiplicative" if seasonality_type == "Multiplicative" else "additive"
+    if model_type == "multiplicative" and values.min() <= 0:
+        model_type = "additive"
+
+    start = timer.perf_counter()
+    components = decompose(values, seasonality_period, model_type,
+                           "cumsum" if method == "Cumulative sum" else "fft")
+    result = {'values': values, 'model_type': model_type, 'components': components,
+              'batch_seconds': timer.perf_counter() - start}
+
+    if stream_appends:
+        result.update(stream_decomposition(values, seasonality_period, model_type, components['trend']))
+    return result
+
+
+# Feed the series through the incremental decomposition and compare its trend with the batch one
+def stream_decomposition(values, seasonality_period, model_type, batch_trend):
+    start = timer.perf_counter()
+    incremental = IncrementalDecomposition(seasonality_period, model_type, values.dtype)
+    for offset in range(0, values.size, APPEND_POINTS):
+        incremental.append(values[offset:offset + APPEND_POINTS])
+    streamed = incremental.components()
+    return {'streamed': streamed, 'stream_seconds': timer.perf_counter() - start,
+            'stream_difference': np.nanmax(np.abs(streamed['trend'] - batch_trend))}
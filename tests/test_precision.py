@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+
+from demos.distributions import get_distribution
+from demos.executor import simulate_sample_means, simulate_sample_sums
+
+# Small enough to run in a second, large enough for the Monte Carlo bounds below to be tight
+SAMPLE_SIZE = 100
+NUM_SAMPLES = 2000
+SEED = 20240
+
+# A simulated statistic must lie within this many standard errors of its exact value. The two
+# precisions draw different float streams, so their results may differ by sqrt(2) times as much.
+MAX_STANDARD_ERRORS = 5
+
+# Binomial draws are the same integers in both precisions, so their statistics agree to rounding
+EXACT_TOLERANCE = 1e-12
+
+DISTRIBUTIONS = [
+    ("Normal", {'mean': 3.0, 'std_dev': 2.0}),
+    ("Uniform", {'low': 0, 'high': 10}),
+    ("Exponential", {'rate': 1.0}),
+    ("Binomial", {'n': 10, 'p': 0.5}),
+    ("Binomial", {'n': 1000, 'p': 0.3}),
+]
+
+
+def simulate(dist, precision):
+    return simulate_sample_means(dist, SAMPLE_SIZE, NUM_SAMPLES, SEED, workers=1, precision=precision)
+
+
+def sums(dist, precision):
+    return simulate_sample_sums(dist, SAMPLE_SIZE, NUM_SAMPLES, SEED, workers=1, precision=precision)
+
+
+def assert_close(compact, exact, standard_error, label):
+    assert abs(compact - exact) <= MAX_STANDARD_ERRORS * standard_error, f"{label}: {compact!r} vs {exact!r}"
+
+
+@pytest.fixture(params=DISTRIBUTIONS, ids=lambda case: f"{case[0]}{case[1]}")
+def dist(request):
+    name, params = request.param
+    return get_distribution(name, **params)
+
+
+def test_compact_dtype_is_narrower(dist):
+    assert dist.compact_dtype.itemsize < 8
+    if dist.discrete:
+        assert np.iinfo(dist.compact_dtype).max >= dist.params['n']
+
+
+def test_sample_means_within_bounds(dist):
+    compact_draws, compact_means = simulate(dist, "compact")
+    float_draws, float_means = simulate(dist, "float64")
+    mean, var, _, excess_kurtosis = dist.exact_moments()
+    num_draws = SAMPLE_SIZE * NUM_SAMPLES
+
+    # Mean of the draws, against the exact mean and the float64 run
+    draws_error = np.sqrt(var / num_draws)
+    assert_close(compact_draws.moments.mean, mean, draws_error, "mean of draws")
+    assert_close(compact_draws.moments.mean, float_draws.moments.mean, np.sqrt(2) * draws_error,
+                 "mean of draws against float64")
+
+    # Variance of the draws; its standard error depends on the kurtosis
+    var_error = var * np.sqrt((excess_kurtosis + 2) / num_draws)
+    assert_close(compact_draws.moments.var(ddof=1), var, var_error, "variance of draws")
+    assert_close(compact_draws.moments.var(ddof=1), float_draws.moments.var(ddof=1), np.sqrt(2) * var_error,
+                 "variance of draws against float64")
+
+    # Spread of the sample means, which are accumulated in float64 in both modes
+    expected_std = np.sqrt(var / SAMPLE_SIZE)
+    std_error = expected_std / np.sqrt(2 * NUM_SAMPLES)
+    assert_close(compact_means.moments.std(ddof=1), expected_std, std_error, "std of means")
+    assert_close(compact_means.moments.std(ddof=1), float_means.moments.std(ddof=1), np.sqrt(2) * std_error,
+                 "std of means against float64")
+    assert compact_means.moments.count == NUM_SAMPLES
+
+
+def test_sample_sums_within_bounds(dist):
+    compact, exact = sums(dist, "compact"), sums(dist, "float64")
+    assert compact.dtype == np.float64
+    assert compact.shape == exact.shape == (NUM_SAMPLES,)
+    mean, var, _, _ = dist.exact_moments()
+    sums_error = np.sqrt(var * SAMPLE_SIZE / NUM_SAMPLES)
+    assert_close(compact.mean(), SAMPLE_SIZE * mean, sums_error, "mean of sample sums")
+    assert_close(compact.mean(), exact.mean(), np.sqrt(2) * sums_error, "mean of sample sums against float64")
+
+
+def test_discrete_compact_mode_is_lossless():
+    dist = get_distribution("Binomial", n=1000, p=0.3)
+    compact_draws, compact_means = simulate(dist, "compact")
+    float_draws, float_means = simulate(dist, "float64")
+    for compact, exact in ((compact_draws.moments, float_draws.moments), (compact_means.moments, float_means.moments)):
+        assert compact.count == exact.count
+        np.testing.assert_allclose(compact.state()[1:], exact.state()[1:], rtol=EXACT_TOLERANCE, atol=EXACT_TOLERANCE)
+    np.testing.assert_array_equal(sums(dist, "compact"), sums(dist, "float64"))